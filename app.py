@@ -1,97 +1,103 @@
 import streamlit as st
 import os, sys
-import re
+import time
 import zipfile
 from io import BytesIO
-from docx import Document
 from tempfile import NamedTemporaryFile, TemporaryDirectory
 
 # Ensure the `src` directory is in the Python path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import src.translation_agent.utils as ta
-
-def read_word_file(file_path):
-    doc = Document(file_path)
-    text_paragraphs = [para for para in doc.paragraphs if para.text.strip()]
-    return text_paragraphs
-
-def translate_table(input_file_path, output_file_path, source_lang, target_lang, country):
-    doc = Document(input_file_path)
-    for table in doc.tables:
-        for row in table.rows:
-            for cell in row.cells:
-                if cell.text.strip():
-                    if re.search(r'\w', cell.text):
-                        translated_text = ta.translate(
-                            source_lang=source_lang,
-                            target_lang=target_lang,
-                            source_text=cell.text,
-                            country=country,
-                        )
-                        translated_contents = translated_text.split('\n')
-                        translated_contents = [text for text in translated_contents if "TRANSLATION" not in text and "TRANSLATE" not in text]
-                        translated_text = '\n'.join(translated_contents)
-                    cell.text = translated_text
-    doc.save(output_file_path)
-
-def preserve_format_and_replace_text(file_path, translated_paragraphs, start_paragraph_num, chunk_size):
-    doc = Document(file_path)
-    original_paragraphs = doc.paragraphs
-    translated_index = 0
-    end_paragraph_num = start_paragraph_num + chunk_size
-    for i in range(start_paragraph_num, min(end_paragraph_num, len(original_paragraphs))):
-        original_paragraph = original_paragraphs[i]
-        if not original_paragraph.text.strip():
-            continue
-        while (translated_index < len(translated_paragraphs) and not translated_paragraphs[translated_index].strip()):
-            translated_index += 1
-        if translated_index >= len(translated_paragraphs):
-            break
-        translated_paragraph_text = translated_paragraphs[translated_index]
-        if not original_paragraph.runs:
-            original_paragraph.add_run("")
-        first_run_format = original_paragraph.runs[0]
-        for run in original_paragraph.runs:
-            run.text = ""
-        for run in translated_paragraph_text.split('\n'):
-            new_run = original_paragraph.add_run(run)
-            new_run.bold = first_run_format.bold
-            new_run.italic = first_run_format.italic
-            new_run.underline = first_run_format.underline
-            if first_run_format.font.size:
-                new_run.font.size = first_run_format.font.size
-            if first_run_format.font.name:
-                new_run.font.name = first_run_format.font.name
-        translated_index += 1
-    doc.save(file_path)
-
-def process_file(input_file_path, output_file_path, source_lang, target_lang, country, progress_callback=None):
-    doc = Document(input_file_path)
-    doc.save(output_file_path)
+from src.translation_agent.docx_pipeline import DocumentPipeline
+from src.translation_agent.prefilter import prefilter_stats
+from src.translation_agent.segment_ids import find_ids, join_with_ids, split_by_ids, strip_ids
+from src.translation_agent.segments import deduplicate, translate_segments
+
+def translate_table(pipeline, source_lang, target_lang, country):
+    # Translate each distinct cell once and fan the translations back out
+    cells = pipeline.segments("cell")
+    deduplicated = deduplicate([cell.text for cell in cells])
+    translations = deduplicated.expand(translate_segments(
+        source_lang=source_lang,
+        target_lang=target_lang,
+        segments=deduplicated.unique,
+        country=country,
+    ))
+    pipeline.replace_all({
+        cell.id: translated_text
+        for cell, translated_text in zip(cells, translations)
+    })
+    return deduplicated
+
+def process_file(input_file_path, output_file_path, source_lang, target_lang, country, progress_callback=None, chunk_callback=None):
+    # Parse the document once, edit it in memory and save it once
+    pipeline = DocumentPipeline(input_file_path, output_file_path)
+    dedup_ratios = {}
     try:
-        paragraphs = read_word_file(input_file_path)
-        total_paragraphs = len(paragraphs)
-        chunk_size = 25    #number of paragraph per translation 
-        for i in range(0, total_paragraphs, chunk_size):
-            translated_paragraphs = []
-            chunk = [para.text for para in paragraphs[i:min(i + chunk_size, total_paragraphs)]]
-            source_text = "\n".join(chunk)
-            translation = ta.translate(
+        # Translate each distinct paragraph once; repeats get the same translation
+        paragraphs = pipeline.segments("paragraph")
+        deduplicated = deduplicate([paragraph.text for paragraph in paragraphs])
+        dedup_ratios["paragraphs"] = deduplicated.ratio
+        unique_paragraphs = [paragraphs[i] for i in deduplicated.first]
+        total_paragraphs = len(unique_paragraphs)
+        translated = {}
+        if unique_paragraphs:
+            # Paragraphs are sent behind their segment ids and matched back by id
+            ids = [paragraph.id for paragraph in unique_paragraphs]
+            source_text = join_with_ids(ids, [paragraph.text for paragraph in unique_paragraphs])
+            # Stream the whole document through one call: its chunks are
+            # translated concurrently and each one is shown as soon as it and
+            # the chunks before it are ready
+            translation = ""
+            for translated_chunk in ta.translate_stream(
                 source_lang=source_lang,
                 target_lang=target_lang,
                 source_text=source_text,
                 country=country
-            )
-            translated_paragraphs.extend(
-                para for para in translation.split("\n") if "TRANSLATION" not in para and "TRANSLATE" not in para
-            )
-            preserve_format_and_replace_text(output_file_path, translated_paragraphs, i, chunk_size)
-            # Update the progress bar
-            if progress_callback:
-                progress_callback(i + chunk_size, total_paragraphs)
-        translate_table(output_file_path, output_file_path, source_lang, target_lang, country)
+            ):
+                translation += translated_chunk
+                if chunk_callback:
+                    chunk_callback(translated_chunk)
+                # Update the progress bar with the paragraphs translated so far
+                if progress_callback:
+                    progress_callback(len(find_ids(translation)), total_paragraphs)
+            translated = split_by_ids(translation, ids)
+        # Paragraphs without a translation keep their original text
+        pipeline.replace_all({
+            paragraph.id: translated[unique_paragraphs[i].id]
+            for paragraph, i in zip(paragraphs, deduplicated.index)
+            if unique_paragraphs[i].id in translated
+        })
+        dedup_ratios["cells"] = translate_table(pipeline, source_lang, target_lang, country).ratio
     except Exception as e:
         print(f"An error occurred while processing {input_file_path}: {e}")
+    pipeline.save()
+    return dedup_ratios
+
+def live_view(start_time):
+    # Placeholders for the progress bar and the translation streamed so far,
+    # and the callbacks process_file reports to
+    progress_bar = st.progress(0)
+    progress_text = st.empty()
+    first_chunk_text = st.empty()
+    live_translation = st.empty()
+    streamed = {"text": "", "first_chunk": None}
+
+    def update_progress(current, total):
+        progress = min((current / total),0.9)
+        progress_bar.progress(progress)
+        progress_text.text(f"Translation progress... ({int(progress * 100)}%)")
+
+    # Render the translated text live, chunk by chunk
+    def show_chunk(translated_chunk):
+        if streamed["first_chunk"] is None:
+            streamed["first_chunk"] = time.perf_counter() - start_time
+            first_chunk_text.caption(f"Time to first chunk: {streamed['first_chunk']:.1f}s")
+        streamed["text"] += translated_chunk
+        # The segment id markers are only for matching paragraphs back
+        live_translation.text(strip_ids(streamed["text"]))
+
+    return progress_bar, progress_text, update_progress, show_chunk
 
 # The translation app
 st.title("Translate Word File")
@@ -136,20 +142,23 @@ if st.button("Start Translate") and uploaded_files:
 
             st.write(f"Translating document: {input_file_name}")
 
-            # Initialize progress bar and text
-            progress_bar = st.progress(0)
-            progress_text = st.empty()
-
-            def update_progress(current, total):
-                progress = min((current / total),0.9)
-                progress_bar.progress(progress)
-                progress_text.text(f"Translation progress... ({int(progress * 100)}%)")
+            # Initialize progress bar, text and live translation
+            start_time = time.perf_counter()
+            progress_bar, progress_text, update_progress, show_chunk = live_view(start_time)
 
-            process_file(temp_input_file_path, temp_output_file_path, source_lang, target_lang, country, update_progress)
+            skipped_before = prefilter_stats.counts()
+            dedup_ratios = process_file(temp_input_file_path, temp_output_file_path, source_lang, target_lang, country, update_progress, show_chunk)
+            if dedup_ratios:
+                st.caption("Repeated text translated once: " + ", ".join(f"{ratio:.0%} of {name}" for name, ratio in dedup_ratios.items()))
+            # Texts passed through unchanged, without LLM calls
+            skipped = {reason: n - skipped_before.get(reason, 0) for reason, n in prefilter_stats.counts().items()}
+            skipped = {reason: n for reason, n in skipped.items() if n}
+            if skipped:
+                st.caption("Passed through without translation: " + ", ".join(f"{n} {reason}" for reason, n in skipped.items()))
 
             # Mark progress as complete and show completion message
             progress_bar.progress(1.0)
-            progress_text.text("Translation has completed.")
+            progress_text.text(f"Translation has completed in {time.perf_counter() - start_time:.1f}s.")
 
             translated_files.append(temp_output_file_path)
         
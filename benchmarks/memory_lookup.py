@@ -0,0 +1,125 @@
+"""
+Lookup latency of the translation memory as it grows.
+
+Fills a TranslationMemory with synthetic sentences, then times exact hits,
+fuzzy hits (one word changed) and misses. Each size is filled on top of the
+previous one, so one run shows whether lookups stay flat as the memory
+grows.
+
+    python benchmarks/memory_lookup.py
+    python benchmarks/memory_lookup.py --sizes 10000,100000,1000000
+
+The run exits with status 1 if the p99 latency of any kind of lookup
+exceeds --max-ms.
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from typing import Dict
+from typing import List
+from typing import Optional
+
+
+DEFAULT_SIZES = "10000,100000"
+DEFAULT_MAX_MS = 1.0
+LOOKUPS = 500  # timed lookups per kind and size
+VOCABULARY = 5000
+
+
+def _sentence_factory(rng: random.Random):
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    words = [
+        "".join(rng.choice(letters) for _ in range(rng.randint(3, 9)))
+        for _ in range(VOCABULARY)
+    ]
+
+    def sentence() -> str:
+        length = rng.randint(6, 20)
+        return " ".join(rng.choice(words) for _ in range(length)) + "."
+
+    return sentence
+
+
+def _latencies_ms(memory, queries: List[str]) -> Dict[str, float]:
+    latencies = []
+    for query in queries:
+        started = time.perf_counter()
+        memory.lookup(query, "English", "Spanish")
+        latencies.append((time.perf_counter() - started) * 1000)
+    latencies.sort()
+    return {
+        "p50": latencies[len(latencies) // 2],
+        "p99": latencies[int(len(latencies) * 0.99)],
+    }
+
+
+def run(sizes: List[int], path: str, seed: int = 0) -> Dict[int, dict]:
+    from translation_agent.memory import TranslationMemory
+
+    rng = random.Random(seed)
+    sentence = _sentence_factory(rng)
+    memory = TranslationMemory(path)
+    stored: List[str] = []
+    results = {}
+    for size in sizes:
+        while len(stored) < size:
+            source = sentence()
+            memory.add(source, source.upper(), "English", "Spanish")
+            stored.append(source)
+        sample = rng.sample(stored, LOOKUPS)
+        results[size] = {
+            "exact": _latencies_ms(memory, sample),
+            "fuzzy": _latencies_ms(
+                memory, [source[:-1] + " again." for source in sample]
+            ),
+            "miss": _latencies_ms(
+                memory, [sentence() for _ in range(LOOKUPS)]
+            ),
+        }
+        print(
+            f"{size:>9} segments  "
+            + "  ".join(
+                f"{kind} p50 {stats['p50']:.3f} ms p99 {stats['p99']:.3f} ms"
+                for kind, stats in results[size].items()
+            )
+        )
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--sizes",
+        default=DEFAULT_SIZES,
+        help="comma-separated numbers of stored segments",
+    )
+    parser.add_argument(
+        "--max-ms",
+        type=float,
+        default=DEFAULT_MAX_MS,
+        help="fail if a p99 lookup latency exceeds this",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    sizes = sorted(int(size) for size in args.sizes.split(","))
+    with tempfile.TemporaryDirectory() as directory:
+        results = run(sizes, os.path.join(directory, "tm.sqlite3"), args.seed)
+
+    slow = [
+        f"{kind} lookups at {size} segments: p99 {stats['p99']:.3f} ms"
+        for size, kinds in results.items()
+        for kind, stats in kinds.items()
+        if stats["p99"] > args.max_ms
+    ]
+    for line in slow:
+        print(f"SLOW {line}")
+    return 1 if slow else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,317 @@
+"""
+End-to-end benchmarks of the translation workflow against a simulated LLM.
+
+Every case runs in a fresh process with translation_agent's completion cache
+and translation memory disabled and a FakeBackend in place of the OpenAI
+API, so results are repeatable and need no API key. For each case the
+suite reports wall time, LLM calls, prompt/completion tokens and peak RSS.
+
+    python benchmarks/run.py                      # compare with the baseline
+    python benchmarks/run.py --save-baseline      # record a new baseline
+    python benchmarks/run.py --scales 1,10 --latency lognormal:0.05,0.5
+
+With a baseline present, any metric that grows by more than its tolerance
+fails the run with exit code 1.
+"""
+
+import argparse
+import concurrent.futures
+import json
+import multiprocessing
+import os
+import sys
+import time
+from typing import Dict
+from typing import List
+from typing import Optional
+
+
+SAMPLE_TEXTS = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "examples",
+    "sample-texts",
+)
+BASELINE_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "baseline.json"
+)
+DEFAULT_SCALES = "1,10,100,1000"
+# Above this many tokens the whole document no longer fits the model's
+# context window, so "auto" context sends a token budget around each chunk.
+FULL_CONTEXT_LIMIT = 32_000
+AUTO_CONTEXT_BUDGET = 8_000
+
+# (case, corpus) pairs: which function runs on which corpus
+CASES = (
+    ("translate", "long"),
+    ("translate", "data_points"),
+    ("one_chunk", "data_points"),
+    ("multichunk", "long"),
+)
+# Growth allowed before a metric counts as a regression: (relative,
+# absolute), so tiny cases do not fail on timer or allocator noise.
+TOLERANCES = {
+    "wall_time": (0.25, 0.1),
+    "peak_rss_mb": (0.25, 10.0),
+    "llm_calls": (0.0, 0),
+    "prompt_tokens": (0.01, 0),
+    "completion_tokens": (0.01, 0),
+}
+
+
+def load_corpus(name: str, scale: int) -> str:
+    """Return a sample text repeated scale times."""
+    if name == "long":
+        path = os.path.join(SAMPLE_TEXTS, "sample-long1.txt")
+        with open(path, encoding="utf-8") as file:
+            text = file.read().strip()
+    else:
+        path = os.path.join(SAMPLE_TEXTS, "data_points_samples.json")
+        with open(path, encoding="utf-8") as file:
+            text = "\n\n".join(item["text"] for item in json.load(file))
+    return "\n\n".join([text] * scale)
+
+
+def _context_policy(spec: str, num_tokens: int, layout: str = "tagged"):
+    from translation_agent import ContextPolicy
+
+    if spec == "auto":
+        if num_tokens <= FULL_CONTEXT_LIMIT:
+            return ContextPolicy.full(layout)
+        return ContextPolicy.token_budget(AUTO_CONTEXT_BUDGET, layout)
+    mode, _, value = spec.partition(":")
+    if mode == "neighbours":
+        return ContextPolicy.neighbouring(int(value or 1), layout)
+    if mode == "tokens":
+        return ContextPolicy.token_budget(int(value), layout)
+    return ContextPolicy.full(layout)
+
+
+def _peak_rss_mb() -> Optional[float]:
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+def run_case(
+    case: str, corpus: str, scale: int, options: dict
+) -> Dict[str, object]:
+    """Run one benchmark case; meant to be called in a fresh process."""
+    import translation_agent.utils as utils
+    from translation_agent.backends import set_backend
+    from translation_agent.chunking import split_into_chunks
+    from translation_agent.fake_server import FakeBackend
+    from translation_agent.ratelimit import ModelLimits
+    from translation_agent.ratelimit import RateLimiter
+    from translation_agent.ratelimit import set_rate_limiter
+    from translation_agent.tokenizer import TokenizedText
+
+    backend = FakeBackend(
+        latency=options["latency"],
+        max_concurrency=options["server_concurrency"],
+        seed=options["seed"],
+    )
+    set_backend(backend)
+    utils.set_completion_cache(None)
+    utils.set_translation_memory(None)
+    set_rate_limiter(
+        RateLimiter(default_limits=ModelLimits(rpm=10**9, tpm=10**12))
+    )
+
+    source_lang, target_lang, country = "English", "Spanish", "Mexico"
+    text = load_corpus(corpus, scale)
+    tokenized_text = TokenizedText(text)
+    context = _context_policy(
+        options["context"], len(tokenized_text), options["layout"]
+    )
+
+    started = time.perf_counter()
+    if case == "translate":
+        utils.translate(
+            source_lang,
+            target_lang,
+            text,
+            country,
+            max_concurrency=options["max_concurrency"],
+            context=context,
+            fused=options["fused"],
+        )
+    elif case == "one_chunk":
+        utils.one_chunk_translate_text(
+            source_lang, target_lang, text, country, fused=options["fused"]
+        )
+    elif case == "multichunk":
+        chunks = [
+            text[span.start : span.end]
+            for span in split_into_chunks(
+                tokenized_text, utils.MAX_TOKENS_PER_CHUNK
+            )
+        ]
+        utils.multichunk_translation(
+            source_lang,
+            target_lang,
+            chunks,
+            country,
+            context=context,
+            fused=options["fused"],
+        )
+    wall_time = time.perf_counter() - started
+
+    stats = backend.llm.stats()
+    return {
+        "wall_time": round(wall_time, 3),
+        "llm_calls": stats.get("completed", 0),
+        "prompt_tokens": stats.get("prompt_tokens", 0),
+        "completion_tokens": stats.get("completion_tokens", 0),
+        "cached_tokens": stats.get("cached_tokens", 0),
+        "peak_rss_mb": _peak_rss_mb(),
+        "source_tokens": len(tokenized_text),
+        "context": context.mode,
+    }
+
+
+def run_suite(scales: List[int], options: dict) -> Dict[str, dict]:
+    results = {}
+    spawn = multiprocessing.get_context("spawn")
+    for scale in scales:
+        for case, corpus in CASES:
+            name = f"{case}/{corpus}/{scale}x"
+            with concurrent.futures.ProcessPoolExecutor(
+                max_workers=1, mp_context=spawn
+            ) as pool:
+                results[name] = pool.submit(
+                    run_case, case, corpus, scale, options
+                ).result()
+            print(_format_row(name, results[name]), flush=True)
+    return results
+
+
+def _format_row(name: str, result: dict) -> str:
+    rss = result["peak_rss_mb"]
+    return (
+        f"{name:<28} {result['wall_time']:>9.2f}s "
+        f"{result['llm_calls']:>7} calls "
+        f"{result['prompt_tokens']:>11} prompt "
+        f"{result['completion_tokens']:>9} completion "
+        f"{result.get('cached_tokens', 0):>11} cached "
+        f"{(f'{rss:.0f}' if rss is not None else '-'):>6} MB"
+    )
+
+
+def find_regressions(
+    results: Dict[str, dict], baseline: Dict[str, dict]
+) -> List[str]:
+    """Return a description of every metric that grew past its tolerance."""
+    regressions = []
+    for name, result in results.items():
+        expected = baseline.get(name)
+        if expected is None:
+            continue
+        for metric, (relative, absolute) in TOLERANCES.items():
+            value, reference = result.get(metric), expected.get(metric)
+            if value is None or reference is None:
+                continue
+            if value > reference * (1 + relative) + absolute:
+                regressions.append(
+                    f"{name}: {metric} {value} > baseline {reference} "
+                    f"(+{relative:.0%} allowed)"
+                )
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--scales",
+        default=DEFAULT_SCALES,
+        help="comma-separated corpus multipliers",
+    )
+    parser.add_argument(
+        "--latency",
+        default="constant:0.05",
+        help="simulated latency per LLM call, see fake_server.LatencyModel",
+    )
+    parser.add_argument(
+        "--context",
+        default="auto",
+        help='"auto", "full", "neighbours:K" or "tokens:N"',
+    )
+    parser.add_argument("--max-concurrency", type=int, default=8)
+    parser.add_argument(
+        "--server-concurrency",
+        type=int,
+        default=None,
+        help="requests the simulated provider serves at once",
+    )
+    parser.add_argument(
+        "--layout",
+        default="tagged",
+        choices=["tagged", "prefix"],
+        help="multichunk prompt layout, see ContextPolicy.layout",
+    )
+    parser.add_argument(
+        "--fused",
+        action="store_true",
+        help="reflect and improve in one call (two calls per chunk)",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument(
+        "--save-baseline",
+        action="store_true",
+        help="write the results as the new baseline instead of comparing",
+    )
+    parser.add_argument("--output", help="also write the results here")
+    args = parser.parse_args(argv)
+
+    options = {
+        "latency": args.latency,
+        "context": args.context,
+        "max_concurrency": args.max_concurrency,
+        "server_concurrency": args.server_concurrency,
+        "fused": args.fused,
+        "layout": args.layout,
+        "seed": args.seed,
+    }
+    scales = [int(scale) for scale in args.scales.split(",")]
+    results = run_suite(scales, options)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2, sort_keys=True)
+
+    baseline = {"options": options, "results": {}}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as file:
+            baseline = json.load(file)
+        if baseline["options"] != options:
+            print(
+                f"{args.baseline} was recorded with {baseline['options']}, "
+                f"not {options}; rerun with the same options or save a new "
+                "baseline."
+            )
+            return 2
+
+    if args.save_baseline:
+        baseline["results"].update(results)
+        with open(args.baseline, "w", encoding="utf-8") as file:
+            json.dump(baseline, file, indent=2, sort_keys=True)
+            file.write("\n")
+        print(f"Baseline saved to {args.baseline}")
+        return 0
+
+    if not baseline["results"]:
+        print("No baseline to compare with; run with --save-baseline.")
+        return 0
+
+    regressions = find_regressions(results, baseline["results"])
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1 +1,10 @@
+from .context import ContextPolicy
+from .journal import Journal
+from .memory import TranslationMemory
+from .routing import ModelRouting
+from .routing import StageModel
+from .segments import translate_segments
 from .utils import translate
+from .utils import translate_async
+from .utils import translate_stream
+from .utils import translate_stream_async
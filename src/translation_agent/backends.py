@@ -0,0 +1,280 @@
+import asyncio
+import os
+import threading
+import weakref
+from dataclasses import dataclass
+from typing import Iterator
+from typing import Optional
+from typing import Protocol
+
+import openai
+
+
+@dataclass
+class Completion:
+    """
+    The text of one chat completion and the tokens it was billed for.
+
+    Attributes:
+        text (str): The generated message content.
+        prompt_tokens (Optional[int]): Input tokens, if the backend reports them.
+        completion_tokens (Optional[int]): Output tokens, if the backend reports them.
+        cached_tokens (Optional[int]): Prompt tokens served from the provider's
+            prompt cache, if the backend reports them.
+    """
+
+    text: str
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+    cached_tokens: Optional[int] = None
+
+    @property
+    def total_tokens(self) -> Optional[int]:
+        if self.prompt_tokens is None or self.completion_tokens is None:
+            return None
+        return self.prompt_tokens + self.completion_tokens
+
+
+class Backend(Protocol):
+    """
+    Something that can run a chat completion, blocking or awaitable.
+
+    get_completion and get_completion_async dispatch every request that
+    missed the cache to the configured backend. Errors should look like the
+    OpenAI SDK's (a status_code attribute, APITimeoutError on timeouts), so
+    retries and rate limiting work the same for every backend.
+
+    A backend may also implement stream(), taking the arguments of
+    complete() and returning an iterator of Completion deltas, as
+    OpenAIBackend.stream does. get_completion(stream=True) falls back to
+    complete() for backends without it.
+    """
+
+    def complete(
+        self,
+        prompt: str,
+        system_message: str,
+        model: str,
+        temperature: float,
+        json_mode: bool = False,
+        timeout: Optional[float] = None,
+    ) -> Completion: ...
+
+    async def complete_async(
+        self,
+        prompt: str,
+        system_message: str,
+        model: str,
+        temperature: float,
+        json_mode: bool = False,
+        timeout: Optional[float] = None,
+    ) -> Completion: ...
+
+
+def _usage(response, *path: str) -> Optional[int]:
+    tokens = getattr(response, "usage", None)
+    for field in path:
+        tokens = getattr(tokens, field, None)
+    return tokens if isinstance(tokens, int) else None
+
+
+def _to_completion(response) -> Completion:
+    return Completion(
+        text=response.choices[0].message.content,
+        prompt_tokens=_usage(response, "prompt_tokens"),
+        completion_tokens=_usage(response, "completion_tokens"),
+        cached_tokens=_usage(
+            response, "prompt_tokens_details", "cached_tokens"
+        ),
+    )
+
+
+def _to_deltas(response) -> Iterator[Completion]:
+    with response:
+        for chunk in response:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield Completion(chunk.choices[0].delta.content)
+            if getattr(chunk, "usage", None) is not None:
+                yield Completion(
+                    text="",
+                    prompt_tokens=_usage(chunk, "prompt_tokens"),
+                    completion_tokens=_usage(chunk, "completion_tokens"),
+                    cached_tokens=_usage(
+                        chunk, "prompt_tokens_details", "cached_tokens"
+                    ),
+                )
+
+
+class OpenAIBackend:
+    """
+    The OpenAI chat completions API, or any server compatible with it.
+
+    Clients are created on first use, so importing the package needs no API
+    key. Retries are handled by get_completion, so the clients never retry.
+
+    Args:
+        api_key (Optional[str]): Defaults to the OPENAI_API_KEY environment variable.
+        base_url (Optional[str]): Defaults to OPENAI_BASE_URL, then the OpenAI API.
+    """
+
+    def __init__(
+        self, api_key: Optional[str] = None, base_url: Optional[str] = None
+    ):
+        self.api_key = api_key
+        self.base_url = base_url
+        self._client: Optional[openai.OpenAI] = None
+        self._lock = threading.Lock()
+        # AsyncOpenAI clients hold an httpx connection pool bound to the
+        # event loop that created them, so keep one client per loop.
+        self._async_clients: weakref.WeakKeyDictionary = (
+            weakref.WeakKeyDictionary()
+        )
+
+    def _client_args(self) -> dict:
+        return {
+            "api_key": self.api_key or os.getenv("OPENAI_API_KEY"),
+            "base_url": self.base_url,
+            "max_retries": 0,
+        }
+
+    @property
+    def client(self) -> openai.OpenAI:
+        """The synchronous client, also used for files and batches."""
+        with self._lock:
+            if self._client is None:
+                self._client = openai.OpenAI(**self._client_args())
+            return self._client
+
+    @property
+    def async_client(self) -> openai.AsyncOpenAI:
+        """The asynchronous client of the running event loop."""
+        loop = asyncio.get_running_loop()
+        async_client = self._async_clients.get(loop)
+        if async_client is None:
+            async_client = openai.AsyncOpenAI(**self._client_args())
+            self._async_clients[loop] = async_client
+        return async_client
+
+    async def aclose(self) -> None:
+        """Close the asynchronous client of the running event loop, if any."""
+        loop = asyncio.get_running_loop()
+        async_client = self._async_clients.pop(loop, None)
+        if async_client is not None:
+            await async_client.close()
+
+    @staticmethod
+    def _request_args(
+        prompt: str,
+        system_message: str,
+        model: str,
+        temperature: float,
+        json_mode: bool,
+        timeout: Optional[float],
+    ) -> dict:
+        request_args = {
+            "model": model,
+            "temperature": temperature,
+            "top_p": 1,
+            "messages": [
+                {"role": "system", "content": system_message},
+                {"role": "user", "content": prompt},
+            ],
+            "timeout": timeout if timeout is not None else openai.NOT_GIVEN,
+        }
+        if json_mode:
+            request_args["response_format"] = {"type": "json_object"}
+        return request_args
+
+    def complete(
+        self,
+        prompt: str,
+        system_message: str,
+        model: str,
+        temperature: float,
+        json_mode: bool = False,
+        timeout: Optional[float] = None,
+    ) -> Completion:
+        response = self.client.chat.completions.create(
+            **self._request_args(
+                prompt, system_message, model, temperature, json_mode, timeout
+            )
+        )
+        return _to_completion(response)
+
+    async def complete_async(
+        self,
+        prompt: str,
+        system_message: str,
+        model: str,
+        temperature: float,
+        json_mode: bool = False,
+        timeout: Optional[float] = None,
+    ) -> Completion:
+        response = await self.async_client.chat.completions.create(
+            **self._request_args(
+                prompt, system_message, model, temperature, json_mode, timeout
+            )
+        )
+        return _to_completion(response)
+
+    def stream(
+        self,
+        prompt: str,
+        system_message: str,
+        model: str,
+        temperature: float,
+        json_mode: bool = False,
+        timeout: Optional[float] = None,
+    ) -> Iterator[Completion]:
+        """
+        Start a streamed chat completion.
+
+        The request is sent before this returns, so HTTP errors are raised
+        here and can be retried. The iterator yields one Completion per text
+        delta, then one with an empty text and the token usage.
+        """
+        response = self.client.chat.completions.create(
+            **self._request_args(
+                prompt, system_message, model, temperature, json_mode, timeout
+            ),
+            stream=True,
+            stream_options={"include_usage": True},
+        )
+        return _to_deltas(response)
+
+
+_backend: Optional[Backend] = None
+_backend_lock = threading.Lock()
+
+
+async def close_async_clients() -> None:
+    """
+    Close the backend's client of the running event loop, if it keeps one.
+
+    Call this before a short-lived event loop ends, so its connection pool
+    is closed rather than leaked.
+    """
+    aclose = getattr(get_backend(), "aclose", None)
+    if aclose is not None:
+        await aclose()
+
+
+def get_backend() -> Backend:
+    """Return the backend used by get_completion, an OpenAIBackend by default."""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = OpenAIBackend()
+        return _backend
+
+
+def set_backend(backend: Optional[Backend]) -> None:
+    """
+    Set the backend used by get_completion and get_completion_async.
+
+    Args:
+        backend (Optional[Backend]): The backend to use, or None to go back to the OpenAI default.
+    """
+    global _backend
+    with _backend_lock:
+        _backend = backend
@@ -0,0 +1,341 @@
+import io
+import json
+import logging
+import time
+from dataclasses import dataclass
+from typing import Dict
+from typing import List
+from typing import NamedTuple
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
+
+from . import utils
+from .backends import get_backend
+from .cache import completion_key
+from .chunking import split_into_chunks
+from .context import FULL_CONTEXT
+from .context import ContextPolicy
+from .instrumentation import call_context
+from .tokenizer import TokenizedText
+
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+MAX_BATCH_REQUESTS = 50_000  # OpenAI's limit on requests per batch file
+TERMINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+logger = logging.getLogger(__name__)
+
+
+class BatchItem(NamedTuple):
+    """
+    One text to translate in a batch run.
+
+    Attributes:
+        source_lang (str): The source language of the text.
+        target_lang (str): The target language for translation.
+        source_text (str): The text to translate.
+        country (str): Country specified for target language.
+    """
+
+    source_lang: str
+    target_lang: str
+    source_text: str
+    country: str = ""
+
+
+@dataclass
+class _Segment:
+    """One chunk of one item, carried through the three stages."""
+
+    item: BatchItem
+    chunk: str
+    tagged_text: Optional[str]  # None when the item is a single chunk
+    chunk_index: int = 0
+    layout: str = "tagged"
+    translation_1: str = ""
+    reflection: str = ""
+    translation_2: str = ""
+
+    def initial_prompt(self) -> Tuple[str, str]:
+        item = self.item
+        if self.tagged_text is None:
+            return utils._one_chunk_initial_prompt(
+                item.source_lang, item.target_lang, self.chunk
+            )
+        return utils._multichunk_initial_prompt(
+            item.source_lang,
+            item.target_lang,
+            self.tagged_text,
+            self.chunk,
+            layout=self.layout,
+            chunk_index=self.chunk_index,
+        )
+
+    def reflect_prompt(self) -> Tuple[str, str]:
+        item = self.item
+        if self.tagged_text is None:
+            return utils._one_chunk_reflect_prompt(
+                item.source_lang,
+                item.target_lang,
+                self.chunk,
+                self.translation_1,
+                item.country,
+            )
+        return utils._multichunk_reflect_prompt(
+            item.source_lang,
+            item.target_lang,
+            self.tagged_text,
+            self.chunk,
+            self.translation_1,
+            item.country,
+            layout=self.layout,
+            chunk_index=self.chunk_index,
+        )
+
+    def improve_prompt(self) -> Tuple[str, str]:
+        item = self.item
+        if self.tagged_text is None:
+            return utils._one_chunk_improve_prompt(
+                item.source_lang,
+                item.target_lang,
+                self.chunk,
+                self.translation_1,
+                self.reflection,
+            )
+        return utils._multichunk_improve_prompt(
+            item.source_lang,
+            item.target_lang,
+            self.tagged_text,
+            self.chunk,
+            self.translation_1,
+            self.reflection,
+            layout=self.layout,
+            chunk_index=self.chunk_index,
+        )
+
+
+class BatchTranslator:
+    """
+    Translate many texts through the OpenAI Batch API.
+
+    Each stage of the agentic workflow (initial translation, reflection,
+    improvement) runs as one batch over every chunk of every text, so a
+    whole folder costs three batch round trips instead of three calls per
+    chunk. Batch requests are billed at a discount and do not count against
+    the interactive rate limits, at the price of a completion window of up
+    to 24 hours. The prompts are the ones translate() sends, so results
+    land in (and are served from) the same completion cache.
+
+    Args:
+        client (Optional[openai.OpenAI]): Client used for the files and batches endpoints.
+            Defaults to the client of the configured OpenAI backend. Point its base_url
+            at a local stand-in server, such as fake_server, to test without an API key.
+        model (str, optional): The model every request uses. Defaults to "gpt-4-turbo".
+        temperature (float, optional): The sampling temperature. Defaults to 0.3.
+        max_tokens (int, optional): The maximum number of tokens per chunk.
+        context (ContextPolicy, optional): How much surrounding text to send with each chunk.
+        poll_interval (float, optional): Seconds between batch status checks. Defaults to 60.
+        completion_window (str, optional): The batch completion window. Defaults to "24h".
+    """
+
+    def __init__(
+        self,
+        client=None,
+        model: str = "gpt-4-turbo",
+        temperature: float = 0.3,
+        max_tokens: int = utils.MAX_TOKENS_PER_CHUNK,
+        context: ContextPolicy = FULL_CONTEXT,
+        poll_interval: float = 60.0,
+        completion_window: str = "24h",
+    ):
+        self.client = client
+        self.model = model
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+        self.context = context
+        self.poll_interval = poll_interval
+        self.completion_window = completion_window
+
+    def _client(self):
+        return self.client if self.client is not None else get_backend().client
+
+    def _segments(self, item: BatchItem) -> List[_Segment]:
+        """Split an item into chunks the same way translate() does."""
+        tokenized_text = TokenizedText(item.source_text)
+        if len(tokenized_text) < self.max_tokens:
+            return [_Segment(item, item.source_text, None)]
+
+        chunk_spans = split_into_chunks(tokenized_text, self.max_tokens)
+        chunks = [
+            item.source_text[span.start : span.end] for span in chunk_spans
+        ]
+        tagged_texts = utils._chunk_tagged_texts(
+            chunks, self.context, [span.num_tokens for span in chunk_spans]
+        )
+        return [
+            _Segment(item, chunk, tagged_text, i, self.context.layout)
+            for i, (chunk, tagged_text) in enumerate(zip(chunks, tagged_texts))
+        ]
+
+    def _request_line(
+        self, custom_id: str, system_message: str, prompt: str
+    ) -> str:
+        return json.dumps(
+            {
+                "custom_id": custom_id,
+                "method": "POST",
+                "url": BATCH_ENDPOINT,
+                "body": {
+                    "model": self.model,
+                    "temperature": self.temperature,
+                    "top_p": 1,
+                    "messages": [
+                        {"role": "system", "content": system_message},
+                        {"role": "user", "content": prompt},
+                    ],
+                },
+            },
+            ensure_ascii=False,
+        )
+
+    def _submit(self, lines: List[str]) -> str:
+        """Upload one JSONL batch file and start the batch."""
+        client = self._client()
+        data = ("\n".join(lines) + "\n").encode("utf-8")
+        batch_file = client.files.create(
+            file=("batch.jsonl", io.BytesIO(data)), purpose="batch"
+        )
+        batch = client.batches.create(
+            input_file_id=batch_file.id,
+            endpoint=BATCH_ENDPOINT,
+            completion_window=self.completion_window,
+        )
+        return batch.id
+
+    def _wait(self, batch_id: str):
+        client = self._client()
+        batch = client.batches.retrieve(batch_id)
+        while batch.status not in TERMINAL_STATUSES:
+            time.sleep(self.poll_interval)
+            batch = client.batches.retrieve(batch_id)
+        return batch
+
+    def _results(self, batch) -> Dict[str, str]:
+        """Read the successful responses of a finished batch."""
+        if not batch.output_file_id:
+            return {}
+        output = self._client().files.content(batch.output_file_id).text
+        results = {}
+        for line in output.splitlines():
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            response = record.get("response") or {}
+            if record.get("error") or response.get("status_code") != 200:
+                continue
+            body = response["body"]
+            results[record["custom_id"]] = body["choices"][0]["message"][
+                "content"
+            ]
+        return results
+
+    def run_stage(
+        self, requests: Sequence[Tuple[str, str]], stage: str = "stage"
+    ) -> List[str]:
+        """
+        Complete a list of (system_message, prompt) pairs as batches.
+
+        Requests already in the completion cache are not resubmitted, and
+        any request the batch did not complete is retried through
+        get_completion, so one bad line never loses the whole run.
+
+        Args:
+            requests (Sequence[Tuple[str, str]]): The (system_message, prompt) pairs.
+            stage (str, optional): A label used in the custom ids.
+
+        Returns:
+            List[str]: The completion of each request, in order.
+        """
+        cache = utils.completion_cache
+        keys = [
+            completion_key(
+                prompt, system_message, self.model, self.temperature, False
+            )
+            for system_message, prompt in requests
+        ]
+        completions: List[Optional[str]] = [
+            cache.get(key) if cache is not None else None for key in keys
+        ]
+        missing = [i for i, text in enumerate(completions) if text is None]
+
+        batch_ids = []
+        for start in range(0, len(missing), MAX_BATCH_REQUESTS):
+            lines = [
+                self._request_line(f"{stage}-{i}", *requests[i])
+                for i in missing[start : start + MAX_BATCH_REQUESTS]
+            ]
+            batch_ids.append(self._submit(lines))
+        logger.debug(
+            "Batch stage %s: %d requests, %d submitted in %s",
+            stage,
+            len(requests),
+            len(missing),
+            batch_ids,
+        )
+
+        results: Dict[str, str] = {}
+        for batch_id in batch_ids:
+            results.update(self._results(self._wait(batch_id)))
+
+        for i in missing:
+            text = results.get(f"{stage}-{i}")
+            if text is None:
+                system_message, prompt = requests[i]
+                with call_context(stage):
+                    text = utils.get_completion(
+                        prompt,
+                        system_message=system_message,
+                        model=self.model,
+                        temperature=self.temperature,
+                    )
+            elif cache is not None:
+                cache.put(keys[i], text)
+            completions[i] = text
+        return completions
+
+    def translate(self, items: Sequence[BatchItem]) -> List[str]:
+        """
+        Translate every item with three batch round trips.
+
+        Args:
+            items (Sequence[BatchItem]): The texts to translate.
+
+        Returns:
+            List[str]: The final translation of each item, in order.
+        """
+        segments_per_item = [self._segments(item) for item in items]
+        segments = [s for item in segments_per_item for s in item]
+
+        translations_1 = self.run_stage(
+            [segment.initial_prompt() for segment in segments], "initial"
+        )
+        for segment, translation_1 in zip(segments, translations_1):
+            segment.translation_1 = translation_1
+
+        reflections = self.run_stage(
+            [segment.reflect_prompt() for segment in segments], "reflect"
+        )
+        for segment, reflection in zip(segments, reflections):
+            segment.reflection = reflection
+
+        translations_2 = self.run_stage(
+            [segment.improve_prompt() for segment in segments], "improve"
+        )
+        for segment, translation_2 in zip(segments, translations_2):
+            segment.translation_2 = translation_2
+
+        return [
+            "".join(segment.translation_2 for segment in item_segments)
+            for item_segments in segments_per_item
+        ]
@@ -0,0 +1,230 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+
+DEFAULT_MAX_BYTES = 1 << 30  # 1 GiB of cached completions
+EVICT_EVERY_N_PUTS = 64  # amortise eviction scans over many writes
+
+
+def completion_key(
+    prompt: str,
+    system_message: str,
+    model: str,
+    temperature: float,
+    json_mode: bool,
+) -> str:
+    """
+    Return the content-addressed cache key for a chat completion request.
+
+    Args:
+        prompt (str): The user's prompt.
+        system_message (str): The system message.
+        model (str): The model name.
+        temperature (float): The sampling temperature.
+        json_mode (bool): Whether JSON output was requested.
+
+    Returns:
+        str: A hex SHA-256 digest identifying the request.
+    """
+    payload = json.dumps(
+        [model, temperature, system_message, prompt, bool(json_mode)],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class CompletionCache:
+    """
+    Disk-backed completion cache stored in a single SQLite file.
+
+    SQLite in WAL mode lets several processes (e.g. translate_folder.py
+    workers and the Streamlit app) read and write the same file. Each
+    thread gets its own connection.
+
+    Args:
+        path (str): Path of the SQLite database file.
+        max_bytes (int, optional): Evict least recently used entries once the
+            stored completions exceed this size. Defaults to 1 GiB.
+        max_age (float, optional): Entries older than this many seconds are
+            treated as misses and evicted. Defaults to None (no expiry).
+        read_only (bool, optional): Serve hits but never write. Defaults to False.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        max_age: Optional[float] = None,
+        read_only: bool = False,
+    ):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.read_only = read_only
+        self.hits = 0
+        self.misses = 0
+        self._puts = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+        if not read_only:
+            directory = os.path.dirname(os.path.abspath(path))
+            os.makedirs(directory, exist_ok=True)
+            conn = self._connection()
+            with conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS completions ("
+                    " key TEXT PRIMARY KEY,"
+                    " value TEXT NOT NULL,"
+                    " size INTEGER NOT NULL,"
+                    " created REAL NOT NULL,"
+                    " accessed REAL NOT NULL)"
+                )
+                conn.execute(
+                    "CREATE INDEX IF NOT EXISTS completions_accessed"
+                    " ON completions (accessed)"
+                )
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            if self.read_only:
+                uri = f"file:{os.path.abspath(self.path)}?mode=ro"
+                conn = sqlite3.connect(uri, uri=True, timeout=30)
+            else:
+                conn = sqlite3.connect(self.path, timeout=30)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached completion for key, or None on a miss."""
+        try:
+            row = (
+                self._connection()
+                .execute(
+                    "SELECT value, created FROM completions WHERE key = ?",
+                    (key,),
+                )
+                .fetchone()
+            )
+        except sqlite3.OperationalError:
+            # Read-only caches may point at a file that does not exist yet.
+            row = None
+
+        now = time.time()
+        expired = (
+            row is not None
+            and self.max_age is not None
+            and now - row[1] > self.max_age
+        )
+        if expired:
+            row = None
+
+        with self._lock:
+            if row is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+
+        if row is None:
+            return None
+
+        if not self.read_only:
+            conn = self._connection()
+            with conn:
+                conn.execute(
+                    "UPDATE completions SET accessed = ? WHERE key = ?",
+                    (now, key),
+                )
+        return row[0]
+
+    def put(self, key: str, value: str) -> None:
+        """Store a completion under key. A no-op in read-only mode."""
+        if self.read_only or value is None:
+            return
+
+        now = time.time()
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO completions"
+                " (key, value, size, created, accessed)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (key, value, len(value.encode("utf-8")), now, now),
+            )
+
+        with self._lock:
+            self._puts += 1
+            evict = self._puts % EVICT_EVERY_N_PUTS == 0
+        if evict:
+            self.evict()
+
+    def evict(self) -> int:
+        """
+        Drop expired entries, then least recently used ones above max_bytes.
+
+        Returns:
+            int: The number of entries removed.
+        """
+        if self.read_only:
+            return 0
+
+        conn = self._connection()
+        removed = 0
+        with conn:
+            if self.max_age is not None:
+                cursor = conn.execute(
+                    "DELETE FROM completions WHERE created < ?",
+                    (time.time() - self.max_age,),
+                )
+                removed += cursor.rowcount
+
+            total = conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM completions"
+            ).fetchone()[0]
+            if total > self.max_bytes:
+                excess = total - self.max_bytes
+                freed = 0
+                stale = []
+                for key, size in conn.execute(
+                    "SELECT key, size FROM completions ORDER BY accessed"
+                ):
+                    stale.append((key,))
+                    freed += size
+                    if freed >= excess:
+                        break
+                conn.executemany(
+                    "DELETE FROM completions WHERE key = ?", stale
+                )
+                removed += len(stale)
+        return removed
+
+    def stats(self) -> dict:
+        """Return hit/miss counters for this process and the cache size."""
+        try:
+            entries, size = (
+                self._connection()
+                .execute(
+                    "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM completions"
+                )
+                .fetchone()
+            )
+        except sqlite3.OperationalError:
+            entries, size = 0, 0
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "entries": entries,
+            "bytes": size,
+        }
@@ -0,0 +1,132 @@
+import math
+from typing import List
+from typing import NamedTuple
+
+from .tokenizer import TokenizedText
+
+
+# Boundary ranks: a cut after a line break beats a cut after a sentence,
+# which beats a cut between words, which beats a cut inside a word.
+PARAGRAPH = 3
+SENTENCE = 2
+WORD = 1
+TOKEN = 0
+
+# ASCII and CJK (ideographic full stop, fullwidth ! ? ;) sentence endings
+SENTENCE_ENDINGS = (
+    ".",
+    "!",
+    "?",
+    ";",
+    "…",
+    "。",
+    "\uff01",
+    "\uff1f",
+    "\uff1b",
+)
+MIN_TOLERANCE_RATIO = 20  # need at least target/20 tokens of slack per cut
+TOLERANCE_RATIO = 10  # search up to target/10 tokens around each ideal cut
+
+
+class ChunkSpan(NamedTuple):
+    """
+    One chunk of a tokenized text, as token and character offsets.
+
+    Attributes:
+        start_token (int): Index of the chunk's first token.
+        end_token (int): Index one past the chunk's last token.
+        start (int): Character offset where the chunk starts.
+        end (int): Character offset where the chunk ends.
+    """
+
+    start_token: int
+    end_token: int
+    start: int
+    end: int
+
+    @property
+    def num_tokens(self) -> int:
+        return self.end_token - self.start_token
+
+
+def boundary_ranks(tokenized_text: TokenizedText) -> List[int]:
+    """
+    Rank every possible cut position in a single pass over the tokens.
+
+    Returns:
+        List[int]: ranks[i] is the rank of cutting just before token i.
+    """
+    text = tokenized_text.text
+    offsets = tokenized_text.offsets
+    num_tokens = len(tokenized_text)
+
+    ranks = [TOKEN] * (num_tokens + 1)
+    for i in range(1, num_tokens):
+        previous = text[offsets[i - 1] : offsets[i]]
+        following = text[offsets[i] : offsets[i + 1]]
+        if "\n" in previous:
+            ranks[i] = PARAGRAPH
+        elif previous.rstrip().endswith(SENTENCE_ENDINGS) and (
+            previous[-1:].isspace()
+            or following[:1].isspace()
+            or not previous[-1:].isascii()
+        ):
+            ranks[i] = SENTENCE
+        elif previous[-1:].isspace() or following[:1].isspace():
+            ranks[i] = WORD
+    ranks[num_tokens] = PARAGRAPH
+    return ranks
+
+
+def split_into_chunks(
+    tokenized_text: TokenizedText, max_tokens: int
+) -> List[ChunkSpan]:
+    """
+    Split a tokenized text into balanced chunks of at most max_tokens tokens.
+
+    The number of chunks is the fewest that fit max_tokens while leaving a
+    little slack. Each cut aims at an even share of the tokens and moves to
+    the best nearby boundary: paragraph, then sentence, then word, then any
+    token. Cuts aim at absolute positions, so small moves never accumulate
+    and every chunk stays within a few percent of the target size. Runs in
+    O(n) over the token array without re-encoding anything.
+
+    Args:
+        tokenized_text (TokenizedText): The text, encoded once.
+        max_tokens (int): The maximum number of tokens per chunk.
+
+    Returns:
+        List[ChunkSpan]: Contiguous spans covering the whole text.
+    """
+    num_tokens = len(tokenized_text)
+    if num_tokens == 0:
+        return []
+
+    num_chunks = math.ceil(num_tokens / max_tokens)
+    while (
+        max_tokens - num_tokens / num_chunks
+        < num_tokens / num_chunks / MIN_TOLERANCE_RATIO
+        and num_tokens / (num_chunks + 1) >= 1
+    ):
+        num_chunks += 1
+    target = num_tokens / num_chunks
+    tolerance = int(min(target / TOLERANCE_RATIO, (max_tokens - target) / 2))
+
+    ranks = boundary_ranks(tokenized_text)
+    cuts = [0]
+    for j in range(1, num_chunks):
+        ideal = round(j * target)
+        lo = max(cuts[-1] + 1, ideal - tolerance)
+        hi = min(num_tokens - 1, ideal + tolerance, cuts[-1] + max_tokens)
+        best = min(max(ideal, lo), hi)
+        for i in range(lo, hi + 1):
+            if (ranks[i], -abs(i - ideal)) > (ranks[best], -abs(best - ideal)):
+                best = i
+        cuts.append(best)
+    cuts.append(num_tokens)
+
+    offsets = tokenized_text.offsets
+    return [
+        ChunkSpan(start, end, offsets[start], offsets[end])
+        for start, end in zip(cuts, cuts[1:])
+    ]
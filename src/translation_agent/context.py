@@ -0,0 +1,137 @@
+from dataclasses import dataclass
+from typing import List
+from typing import Optional
+
+
+CONTEXT_MODES = ("full", "neighbours", "tokens")
+PROMPT_LAYOUTS = ("tagged", "prefix")
+
+
+@dataclass(frozen=True)
+class ContextPolicy:
+    """
+    How much of the surrounding document is sent as context for each chunk.
+
+    Attributes:
+        mode (str): "full" sends the whole document (the original behaviour),
+            "neighbours" sends `neighbours` chunks on either side, and
+            "tokens" grows a window around the chunk up to `max_tokens`.
+        neighbours (int): Chunks of context on each side in "neighbours" mode.
+        max_tokens (int): Token budget for the whole tagged text, including
+            the chunk being translated, in "tokens" mode.
+        layout (str): "tagged" marks the chunk with <TRANSLATE_THIS> inside
+            the context (the original behaviour). "prefix" puts the context,
+            untouched, at the start of every prompt and the chunk index and
+            text at the end, so all stages of all chunks sharing a context
+            share a byte-identical prompt prefix that provider-side prompt
+            caching can reuse. Only "full" mode shares the context across
+            chunks.
+    """
+
+    mode: str = "full"
+    neighbours: int = 1
+    max_tokens: int = 2000
+    layout: str = "tagged"
+
+    def __post_init__(self):
+        if self.mode not in CONTEXT_MODES:
+            raise ValueError(
+                f"Unknown context mode {self.mode!r}, expected one of {CONTEXT_MODES}"
+            )
+        if self.layout not in PROMPT_LAYOUTS:
+            raise ValueError(
+                f"Unknown prompt layout {self.layout!r}, expected one of {PROMPT_LAYOUTS}"
+            )
+        if self.neighbours < 0 or self.max_tokens < 0:
+            raise ValueError("Context sizes must not be negative")
+
+    @classmethod
+    def full(cls, layout: str = "tagged") -> "ContextPolicy":
+        """Send the whole document as context."""
+        return cls(mode="full", layout=layout)
+
+    @classmethod
+    def neighbouring(cls, k: int, layout: str = "tagged") -> "ContextPolicy":
+        """Send k chunks on either side of the chunk being translated."""
+        return cls(mode="neighbours", neighbours=k, layout=layout)
+
+    @classmethod
+    def token_budget(
+        cls, max_tokens: int, layout: str = "tagged"
+    ) -> "ContextPolicy":
+        """Send whole neighbouring chunks until max_tokens is reached."""
+        return cls(mode="tokens", max_tokens=max_tokens, layout=layout)
+
+
+FULL_CONTEXT = ContextPolicy.full()
+
+
+def _window(
+    policy: ContextPolicy, i: int, chunk_token_counts: List[int]
+) -> range:
+    """Return the range of chunk indices sent as context for chunk i."""
+    n = len(chunk_token_counts)
+    if policy.mode == "full":
+        return range(n)
+    if policy.mode == "neighbours":
+        return range(
+            max(0, i - policy.neighbours), min(n, i + policy.neighbours + 1)
+        )
+
+    # Grow the window one chunk at a time on each side while it fits.
+    budget = policy.max_tokens - chunk_token_counts[i]
+    lo, hi = i, i + 1
+    grew = True
+    while grew:
+        grew = False
+        if lo > 0 and chunk_token_counts[lo - 1] <= budget:
+            lo -= 1
+            budget -= chunk_token_counts[lo]
+            grew = True
+        if hi < n and chunk_token_counts[hi] <= budget:
+            budget -= chunk_token_counts[hi]
+            hi += 1
+            grew = True
+    return range(lo, hi)
+
+
+def build_tagged_texts(
+    source_text_chunks: List[str],
+    policy: ContextPolicy = FULL_CONTEXT,
+    chunk_token_counts: Optional[List[int]] = None,
+) -> List[str]:
+    """
+    Build the tagged context for every chunk once, for all three stages.
+
+    Args:
+        source_text_chunks (List[str]): The source text divided into chunks.
+        policy (ContextPolicy): How much surrounding text to include.
+        chunk_token_counts (Optional[List[int]]): Token count of each chunk.
+            Required in "tokens" mode.
+
+    Returns:
+        List[str]: For each chunk, the context text with that chunk wrapped
+            in <TRANSLATE_THIS> and </TRANSLATE_THIS>, or the untouched
+            context text in the "prefix" layout.
+    """
+    if policy.mode == "tokens" and chunk_token_counts is None:
+        raise ValueError("chunk_token_counts is required in 'tokens' mode")
+    if chunk_token_counts is None:
+        chunk_token_counts = [0] * len(source_text_chunks)
+
+    tagged_texts = []
+    for i in range(len(source_text_chunks)):
+        window = _window(policy, i, chunk_token_counts)
+        if policy.layout == "prefix":
+            tagged_texts.append(
+                "".join(source_text_chunks[window.start : window.stop])
+            )
+            continue
+        tagged_texts.append(
+            "".join(source_text_chunks[window.start : i])
+            + "<TRANSLATE_THIS>"
+            + source_text_chunks[i]
+            + "</TRANSLATE_THIS>"
+            + "".join(source_text_chunks[i + 1 : window.stop])
+        )
+    return tagged_texts
@@ -0,0 +1,203 @@
+"""
+Translate a Word document in memory, parsing and saving it once.
+
+Every paragraph and table cell to translate is a Segment with an id
+bound to its XML element, so translations are written back by id rather
+than by position and cannot drift onto the wrong paragraph.
+
+Requires the optional python-docx package.
+"""
+
+import os
+import re
+from dataclasses import dataclass
+from typing import Dict
+from typing import List
+from typing import Mapping
+from typing import Optional
+from typing import Sequence
+from typing import Union
+
+
+try:
+    from docx import Document
+    from docx.table import _Cell
+    from docx.text.paragraph import Paragraph
+except ImportError as exc:
+    raise ImportError(
+        "docx_pipeline needs the python-docx package: pip install python-docx"
+    ) from exc
+
+
+_WORD = re.compile(r"\w")
+SEGMENT_KINDS = ("paragraph", "cell")
+
+
+def replace_paragraph_text(paragraph: Paragraph, text: str) -> None:
+    """
+    Replace the text of a paragraph, keeping the format of its first run.
+
+    Each line of text becomes a run with the bold, italic, underline, font
+    size and font name of the paragraph's first run.
+    """
+    if not paragraph.runs:
+        paragraph.add_run("")
+    first_run = paragraph.runs[0]
+    for run in paragraph.runs:
+        run.text = ""
+    for line in text.split("\n"):
+        new_run = paragraph.add_run(line)
+        new_run.bold = first_run.bold
+        new_run.italic = first_run.italic
+        new_run.underline = first_run.underline
+        if first_run.font.size:
+            new_run.font.size = first_run.font.size
+        if first_run.font.name:
+            new_run.font.name = first_run.font.name
+
+
+@dataclass(frozen=True)
+class Segment:
+    """
+    A piece of a document to translate.
+
+    Attributes:
+        id (str): Stable across loads of the same file: "p3" is the fourth
+            paragraph of the body and "t0.2.1" the cell in row 2, column 1
+            of the first table.
+        kind (str): "paragraph" or "cell".
+        text (str): The text of the segment when the document was loaded.
+    """
+
+    id: str
+    kind: str
+    text: str
+
+
+class DocumentPipeline:
+    """
+    A .docx file parsed once, edited in memory and saved once.
+
+    The segments to translate, the body paragraphs with text and the
+    table cells with words in them, are collected when the document is loaded, each bound to its element by
+    id. Replacements are applied to the same parsed document, so a document
+    costs one parse and one save however many chunks it is translated in.
+
+    Args:
+        input_path (str): The document to translate.
+        output_path (Optional[str]): Where save() writes the translated
+            document. Not needed to only read the texts to translate.
+        checkpoint_every (Optional[int]): Also save after every this many
+            replaced segments, so a crash keeps the work done so far.
+            Defaults to None (save only at the end).
+    """
+
+    def __init__(
+        self,
+        input_path: str,
+        output_path: Optional[str] = None,
+        checkpoint_every: Optional[int] = None,
+    ):
+        self.output_path = output_path
+        self.checkpoint_every = checkpoint_every
+        self.document = Document(input_path)
+        self.saves = 0
+        self._edits = 0
+        self._segments: Dict[str, List[Segment]] = {
+            kind: [] for kind in SEGMENT_KINDS
+        }
+        self._elements: Dict[str, Union[Paragraph, _Cell]] = {}
+
+        for i, paragraph in enumerate(self.document.paragraphs):
+            if not paragraph.text.strip():
+                continue
+            self._add(f"p{i}", "paragraph", paragraph, paragraph.text)
+        for t, table in enumerate(self.document.tables):
+            seen = set()
+            for r, row in enumerate(table.rows):
+                for c, cell in enumerate(row.cells):
+                    # A merged cell is returned once per grid position it
+                    # spans, all for the same element.
+                    if id(cell._tc) in seen:
+                        continue
+                    seen.add(id(cell._tc))
+                    if cell.text.strip() and _WORD.search(cell.text):
+                        self._add(f"t{t}.{r}.{c}", "cell", cell, cell.text)
+
+    def _add(
+        self,
+        segment_id: str,
+        kind: str,
+        element: Union[Paragraph, _Cell],
+        text: str,
+    ) -> None:
+        self._segments[kind].append(Segment(segment_id, kind, text))
+        self._elements[segment_id] = element
+
+    def segments(self, kind: str = "paragraph") -> List[Segment]:
+        """The segments of one kind, in document order."""
+        return list(self._segments[kind])
+
+    @property
+    def paragraphs(self) -> List[Paragraph]:
+        """The body paragraphs with text."""
+        return [self._elements[s.id] for s in self._segments["paragraph"]]
+
+    @property
+    def cells(self) -> List[_Cell]:
+        """The table cells with words in them."""
+        return [self._elements[s.id] for s in self._segments["cell"]]
+
+    def paragraph_texts(self) -> List[str]:
+        """The text of every paragraph to translate, in document order."""
+        return [s.text for s in self._segments["paragraph"]]
+
+    def cell_texts(self) -> List[str]:
+        """The text of every table cell to translate, in document order."""
+        return [s.text for s in self._segments["cell"]]
+
+    def replace(self, segment_id: str, text: str) -> None:
+        """
+        Replace the text of one segment.
+
+        A paragraph keeps the format of its first run, see
+        replace_paragraph_text(); a cell's text is replaced as a whole.
+
+        Raises:
+            KeyError: If the document has no segment with this id.
+        """
+        element = self._elements[segment_id]
+        if isinstance(element, Paragraph):
+            replace_paragraph_text(element, text)
+        else:
+            element.text = text
+        self._edited()
+
+    def replace_all(self, translations: Mapping[str, str]) -> None:
+        """Replace the text of every segment in translations, by id."""
+        for segment_id, text in translations.items():
+            self.replace(segment_id, text)
+
+    def replace_paragraphs(self, texts: Sequence[str], start: int = 0) -> None:
+        """Replace paragraphs start, start + 1, ... of paragraphs with texts."""
+        for segment, text in zip(self._segments["paragraph"][start:], texts):
+            self.replace(segment.id, text)
+
+    def replace_cells(self, texts: Sequence[str], start: int = 0) -> None:
+        """Replace the text of cells start, start + 1, ... with texts."""
+        for segment, text in zip(self._segments["cell"][start:], texts):
+            self.replace(segment.id, text)
+
+    def _edited(self) -> None:
+        self._edits += 1
+        if self.checkpoint_every and self._edits % self.checkpoint_every == 0:
+            self.save()
+
+    def save(self) -> None:
+        """Write the document to output_path, replacing it atomically."""
+        if self.output_path is None:
+            raise ValueError("DocumentPipeline has no output_path to save to")
+        partial_path = f"{self.output_path}.partial"
+        self.document.save(partial_path)
+        os.replace(partial_path, self.output_path)
+        self.saves += 1
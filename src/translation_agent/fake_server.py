@@ -0,0 +1,835 @@
+"""
+A fake OpenAI-compatible LLM for offline tests and load tests.
+
+FakeLLM simulates a provider: deterministic replies, latency drawn from a
+configurable distribution, a concurrency cap, requests- and
+tokens-per-minute limits, and injected 429 and 500 errors. FakeBackend runs
+it in process behind the Backend protocol; FakeServer serves it over HTTP
+(chat completions, streamed or not, plus the files and batches endpoints),
+so the real OpenAI client can be pointed at it:
+
+    python -m translation_agent.fake_server --port 8000 --latency lognormal:0.8,0.5
+    OPENAI_BASE_URL=http://127.0.0.1:8000/v1 OPENAI_API_KEY=fake python main.py
+"""
+
+import argparse
+import asyncio
+import collections
+import email
+import email.policy
+import hashlib
+import itertools
+import json
+import math
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from typing import Callable
+from typing import Deque
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Set
+from typing import Tuple
+
+import httpx
+import openai
+
+from .backends import Completion
+from .tokenizer import count_tokens
+from .tokenizer import encode
+
+
+SYLLABLES = ("ka", "lo", "mi", "ren", "to", "sa", "vu", "ne", "di", "po")
+MESSAGE_OVERHEAD_TOKENS = 4  # chat formatting tokens billed per message
+WINDOW = 60.0  # seconds covered by the requests/tokens per minute limits
+# Prompt caching as OpenAI does it: prefixes of at least 1024 tokens are
+# cached, in increments of 128 tokens.
+PROMPT_CACHE_MIN_TOKENS = 1024
+PROMPT_CACHE_INCREMENT = 128
+FAKE_REQUEST = httpx.Request("POST", "http://fake/v1/chat/completions")
+
+
+@dataclass
+class LatencyModel:
+    """
+    A distribution of response latencies, in seconds.
+
+    Specs are "kind:params": "constant:0.5" (or just "0.5"), "uniform:0.2,1",
+    "normal:mean,sd", "lognormal:median,sigma" and "exponential:mean".
+    per_token adds that many seconds per completion token.
+    """
+
+    kind: str = "constant"
+    params: Tuple[float, ...] = (0.0,)
+    per_token: float = 0.0
+
+    @classmethod
+    def parse(cls, spec: str, per_token: float = 0.0) -> "LatencyModel":
+        kind, _, params = spec.rpartition(":")
+        latency_model = cls(
+            kind or "constant",
+            tuple(float(p) for p in params.split(",")),
+            per_token,
+        )
+        latency_model.sample(random.Random(0))  # validate the spec early
+        return latency_model
+
+    def sample(self, rng: random.Random, completion_tokens: int = 0) -> float:
+        p = self.params
+        if self.kind == "constant":
+            latency = p[0]
+        elif self.kind == "uniform":
+            latency = rng.uniform(p[0], p[1])
+        elif self.kind == "normal":
+            latency = rng.gauss(p[0], p[1])
+        elif self.kind == "lognormal":
+            latency = rng.lognormvariate(math.log(p[0]), p[1])
+        elif self.kind == "exponential":
+            latency = rng.expovariate(1 / p[0]) if p[0] > 0 else 0.0
+        else:
+            raise ValueError(f"Unknown latency distribution: {self.kind}")
+        return max(0.0, latency) + self.per_token * completion_tokens
+
+
+def default_reply(messages: List[dict], model: str, json_mode: bool) -> str:
+    """
+    Return pseudo-words seeded by the request, about half as long as it.
+
+    The same request always gets the same reply, so caches and memories
+    behave as they would against a real model at temperature 0. JSON-mode
+    requests for a reflection verdict, a revision or a pack of segments get
+    a reply of that shape; about half of the verdicts find nothing to fix.
+    """
+    request = json.dumps([model, messages], sort_keys=True).encode()
+    rng = random.Random(hashlib.sha256(request).digest())
+    prompt = messages[-1]["content"]
+    num_words = max(1, min(800, len(prompt.split()) // 2))
+    words = [
+        "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(1, 3)))
+        for _ in range(num_words)
+    ]
+    text = " ".join(words)
+    if not json_mode:
+        return text
+    if "<SEGMENTS>" in prompt:
+        block = prompt.split("<SEGMENTS>")[1].split("</SEGMENTS>")[0]
+        translations = [
+            {"id": segment["id"], "text": rng.choice(words)}
+            for segment in json.loads(block)
+        ]
+        return json.dumps({"translations": translations})
+    if '"translation":' in prompt:
+        critique = " ".join(words[: len(words) // 2])
+        return json.dumps({"critique": critique, "translation": text})
+    if '"issues":' in prompt:
+        issues = [{"severity": "minor", "issue": text}]
+        return json.dumps({"issues": issues if rng.random() < 0.5 else []})
+    return json.dumps({"reply": text})
+
+
+def split_deltas(text: str) -> List[str]:
+    """Split a reply into the word-sized deltas it is streamed in."""
+    return re.findall(r"\s*\S+", text) or [text]
+
+
+class FakeError(Exception):
+    """A simulated provider error, carried as (status_code, retry_after)."""
+
+    def __init__(self, status_code: int, retry_after: Optional[float] = None):
+        super().__init__(f"Simulated HTTP {status_code}")
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+    def to_openai(self) -> openai.APIStatusError:
+        """Return the exception the OpenAI SDK would raise for this error."""
+        headers = {}
+        if self.retry_after is not None:
+            headers["retry-after"] = f"{self.retry_after:.3f}"
+        response = httpx.Response(
+            self.status_code, headers=headers, request=FAKE_REQUEST
+        )
+        error_class = (
+            openai.RateLimitError
+            if self.status_code == 429
+            else openai.InternalServerError
+        )
+        return error_class(str(self), response=response, body=None)
+
+
+class FakeLLM:
+    """
+    The simulated provider shared by FakeBackend and FakeServer.
+
+    Args:
+        latency (str): A LatencyModel spec. Defaults to no latency.
+        per_token_latency (float): Extra seconds per completion token.
+        max_concurrency (Optional[int]): Requests served at once; others queue.
+        rpm (Optional[int]): Requests per minute before answering 429.
+        tpm (Optional[int]): Tokens per minute before answering 429.
+        throttle_rate (float): Probability of an injected 429.
+        error_rate (float): Probability of an injected 500.
+        seed (int): Seed for latencies and injected errors.
+        responder (Callable): Builds the reply from (messages, model, json_mode).
+            Defaults to default_reply.
+        prompt_cache (bool): Report the prompt prefix already seen by an
+            earlier request to the same model as cached tokens.
+    """
+
+    def __init__(
+        self,
+        latency: str = "0",
+        per_token_latency: float = 0.0,
+        max_concurrency: Optional[int] = None,
+        rpm: Optional[int] = None,
+        tpm: Optional[int] = None,
+        throttle_rate: float = 0.0,
+        error_rate: float = 0.0,
+        seed: int = 0,
+        responder: Callable[[List[dict], str, bool], str] = default_reply,
+        prompt_cache: bool = True,
+    ):
+        self.latency = LatencyModel.parse(latency, per_token_latency)
+        self.rpm = rpm
+        self.tpm = tpm
+        self.throttle_rate = throttle_rate
+        self.error_rate = error_rate
+        self.seed = seed
+        self.responder = responder
+        self.prompt_cache = prompt_cache
+        self._cached_prefixes: Set[bytes] = set()
+        self._capacity = (
+            threading.BoundedSemaphore(max_concurrency)
+            if max_concurrency
+            else None
+        )
+        self._rng = random.Random(seed)
+        self._window: Deque[Tuple[float, int]] = collections.deque()
+        self._window_tokens = 0
+        self._lock = threading.Lock()
+        self._stats: Dict[str, int] = collections.Counter()
+        self._in_flight = 0
+
+    def reply(
+        self, messages: List[dict], model: str, json_mode: bool = False
+    ) -> Completion:
+        """Build the deterministic reply to a request and its token usage."""
+        text = self.responder(messages, model, json_mode)
+        prompt_tokens = sum(
+            count_tokens(message["content"]) + MESSAGE_OVERHEAD_TOKENS
+            for message in messages
+        )
+        cached_tokens = (
+            self._cache_prompt(model, messages) if self.prompt_cache else None
+        )
+        return Completion(
+            text, prompt_tokens, count_tokens(text), cached_tokens
+        )
+
+    def _cache_prompt(self, model: str, messages: List[dict]) -> int:
+        """Cache the prefixes of a prompt; return how many tokens were cached."""
+        tokens = [
+            token
+            for message in messages
+            for token in encode(f"{message['role']}\n{message['content']}")
+        ]
+        prefix = hashlib.sha256(model.encode())
+        start, cached_tokens = 0, 0
+        with self._lock:
+            for end in range(
+                PROMPT_CACHE_MIN_TOKENS,
+                len(tokens) + 1,
+                PROMPT_CACHE_INCREMENT,
+            ):
+                prefix.update(repr(tokens[start:end]).encode())
+                start = end
+                digest = prefix.digest()
+                if digest in self._cached_prefixes:
+                    cached_tokens = end
+                else:
+                    self._cached_prefixes.add(digest)
+        return cached_tokens
+
+    def admit(self, tokens: int) -> None:
+        """
+        Count a request against the limits, or raise FakeError.
+
+        Raises:
+            FakeError: 429 when over the rpm/tpm limits or on an injected
+                throttle, 500 on an injected error.
+        """
+        now = time.monotonic()
+        with self._lock:
+            self._stats["requests"] += 1
+            while self._window and self._window[0][0] <= now - WINDOW:
+                self._window_tokens -= self._window.popleft()[1]
+            over_limit = (
+                self.rpm is not None and len(self._window) >= self.rpm
+            ) or (
+                self.tpm is not None
+                and self._window_tokens + tokens > self.tpm
+            )
+            if over_limit:
+                self._stats["throttled"] += 1
+                retry_after = (
+                    self._window[0][0] + WINDOW - now if self._window else 1.0
+                )
+                raise FakeError(429, retry_after)
+            draw = self._rng.random()
+            if draw < self.throttle_rate:
+                self._stats["throttled"] += 1
+                raise FakeError(429, 1.0)
+            if draw < self.throttle_rate + self.error_rate:
+                self._stats["errors"] += 1
+                raise FakeError(500)
+            if self.rpm is not None or self.tpm is not None:
+                self._window.append((now, tokens))
+                self._window_tokens += tokens
+
+    def sample_latency(self, completion_tokens: int) -> float:
+        with self._lock:
+            return self.latency.sample(self._rng, completion_tokens)
+
+    def _entered(self) -> None:
+        with self._lock:
+            self._in_flight += 1
+            self._stats["peak_in_flight"] = max(
+                self._stats["peak_in_flight"], self._in_flight
+            )
+
+    def enter(self) -> None:
+        """Wait for a free server slot (blocking)."""
+        if self._capacity is not None:
+            self._capacity.acquire()
+        self._entered()
+
+    async def enter_async(self) -> None:
+        """Wait for a free server slot without blocking the event loop."""
+        while self._capacity is not None and not self._capacity.acquire(
+            blocking=False
+        ):
+            await asyncio.sleep(0.001)
+        self._entered()
+
+    def leave(self, completion: Optional[Completion] = None) -> None:
+        with self._lock:
+            self._in_flight -= 1
+            if completion is not None:
+                self._stats["completed"] += 1
+                self._stats["prompt_tokens"] += completion.prompt_tokens
+                self._stats["completion_tokens"] += (
+                    completion.completion_tokens
+                )
+                self._stats["cached_tokens"] += completion.cached_tokens or 0
+        if self._capacity is not None:
+            self._capacity.release()
+
+    def batch_line_fails(self, custom_id: str) -> bool:
+        """Decide, deterministically per line, whether a batch line fails."""
+        digest = hashlib.sha256(f"{self.seed}:{custom_id}".encode()).digest()
+        return int.from_bytes(digest[:8], "big") / 2**64 < self.error_rate
+
+    def stats(self) -> Dict[str, int]:
+        """Return request, throttle, error, token and peak concurrency counts."""
+        with self._lock:
+            return dict(self._stats)
+
+
+class FakeBackend:
+    """
+    A Backend that answers from a FakeLLM in process, without HTTP.
+
+    Injected errors are raised as the OpenAI SDK's exceptions, and a
+    latency beyond the request timeout raises APITimeoutError, so retries,
+    hedging and rate limiting behave as they do against the real API.
+
+    Args:
+        llm (Optional[FakeLLM]): The simulated provider. Other keyword
+            arguments build a new FakeLLM.
+    """
+
+    def __init__(self, llm: Optional[FakeLLM] = None, **llm_args):
+        self.llm = llm or FakeLLM(**llm_args)
+
+    def _start(
+        self,
+        prompt: str,
+        system_message: str,
+        model: str,
+        json_mode: bool,
+    ) -> Completion:
+        messages = [
+            {"role": "system", "content": system_message},
+            {"role": "user", "content": prompt},
+        ]
+        completion = self.llm.reply(messages, model, json_mode)
+        try:
+            self.llm.admit(completion.total_tokens)
+        except FakeError as exc:
+            raise exc.to_openai() from None
+        return completion
+
+    def complete(
+        self,
+        prompt: str,
+        system_message: str,
+        model: str,
+        temperature: float,
+        json_mode: bool = False,
+        timeout: Optional[float] = None,
+    ) -> Completion:
+        completion = self._start(prompt, system_message, model, json_mode)
+        self.llm.enter()
+        try:
+            latency = self.llm.sample_latency(completion.completion_tokens)
+            if timeout is not None and latency > timeout:
+                time.sleep(timeout)
+                raise openai.APITimeoutError(request=FAKE_REQUEST)
+            time.sleep(latency)
+        except BaseException:
+            self.llm.leave()
+            raise
+        self.llm.leave(completion)
+        return completion
+
+    async def complete_async(
+        self,
+        prompt: str,
+        system_message: str,
+        model: str,
+        temperature: float,
+        json_mode: bool = False,
+        timeout: Optional[float] = None,
+    ) -> Completion:
+        completion = self._start(prompt, system_message, model, json_mode)
+        await self.llm.enter_async()
+        try:
+            latency = self.llm.sample_latency(completion.completion_tokens)
+            if timeout is not None and latency > timeout:
+                await asyncio.sleep(timeout)
+                raise openai.APITimeoutError(request=FAKE_REQUEST)
+            await asyncio.sleep(latency)
+        except BaseException:
+            self.llm.leave()
+            raise
+        self.llm.leave(completion)
+        return completion
+
+    def stream(
+        self,
+        prompt: str,
+        system_message: str,
+        model: str,
+        temperature: float,
+        json_mode: bool = False,
+        timeout: Optional[float] = None,
+    ) -> Iterator[Completion]:
+        """
+        Stream the reply one word at a time, like OpenAIBackend.stream.
+
+        The latency model's per-call latency passes before this returns and
+        its per-token latency between deltas.
+        """
+        completion = self._start(prompt, system_message, model, json_mode)
+        self.llm.enter()
+        try:
+            latency = self.llm.sample_latency(0)
+            if timeout is not None and latency > timeout:
+                time.sleep(timeout)
+                raise openai.APITimeoutError(request=FAKE_REQUEST)
+            time.sleep(latency)
+        except BaseException:
+            self.llm.leave()
+            raise
+        return self._deltas(completion)
+
+    def _deltas(self, completion: Completion) -> Iterator[Completion]:
+        finished = False
+        try:
+            for delta in split_deltas(completion.text):
+                time.sleep(self.llm.latency.per_token * count_tokens(delta))
+                yield Completion(delta)
+            finished = True
+        finally:
+            self.llm.leave(completion if finished else None)
+        yield Completion(
+            "",
+            completion.prompt_tokens,
+            completion.completion_tokens,
+            completion.cached_tokens,
+        )
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: "FakeServer"
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(
+        self,
+        status: int,
+        body: bytes,
+        content_type: str = "application/json",
+        headers: Optional[Dict[str, str]] = None,
+    ) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, payload: dict, status: int = 200, **kwargs) -> None:
+        self._send(status, json.dumps(payload).encode(), **kwargs)
+
+    def _send_error(self, exc: FakeError) -> None:
+        headers = {}
+        if exc.retry_after is not None:
+            headers["retry-after"] = f"{exc.retry_after:.3f}"
+        error_type = (
+            "rate_limit_error" if exc.status_code == 429 else "server_error"
+        )
+        self._send_json(
+            {"error": {"message": str(exc), "type": error_type, "code": None}},
+            status=exc.status_code,
+            headers=headers,
+        )
+
+    def _body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def _route(self) -> str:
+        path = self.path.split("?", 1)[0]
+        return path[len("/v1") :] if path.startswith("/v1/") else path
+
+    def do_POST(self):  # noqa: N802
+        route = self._route()
+        if route == "/chat/completions":
+            self._chat_completion(json.loads(self._body()))
+        elif route == "/files":
+            self._upload_file()
+        elif route == "/batches":
+            self._create_batch(json.loads(self._body()))
+        else:
+            self._send_json({"error": {"message": "Not found"}}, status=404)
+
+    def do_GET(self):  # noqa: N802
+        route = self._route()
+        parts = route.strip("/").split("/")
+        if len(parts) == 2 and parts[0] == "batches":
+            self._retrieve_batch(parts[1])
+        elif len(parts) == 3 and parts[0] == "files" and parts[2] == "content":
+            body = self.server.files.get(parts[1])
+            if body is None:
+                self._send_json({"error": {"message": "Not found"}}, 404)
+            else:
+                self._send(200, body, "application/octet-stream")
+        else:
+            self._send_json({"error": {"message": "Not found"}}, status=404)
+
+    def _chat_completion(self, request: dict) -> None:
+        llm = self.server.llm
+        json_mode = (request.get("response_format") or {}).get(
+            "type"
+        ) == "json_object"
+        completion = llm.reply(
+            request["messages"], request["model"], json_mode
+        )
+        try:
+            llm.admit(completion.total_tokens)
+        except FakeError as exc:
+            self._send_error(exc)
+            return
+
+        llm.enter()
+        try:
+            time.sleep(llm.sample_latency(completion.completion_tokens))
+        finally:
+            llm.leave(completion)
+        response = {
+            "id": self.server.new_id("chatcmpl"),
+            "created": int(time.time()),
+            "model": request["model"],
+        }
+        usage = {
+            "prompt_tokens": completion.prompt_tokens,
+            "completion_tokens": completion.completion_tokens,
+            "total_tokens": completion.total_tokens,
+            "prompt_tokens_details": {
+                "cached_tokens": completion.cached_tokens or 0
+            },
+        }
+        if request.get("stream"):
+            self._send_stream(response, completion.text, usage, request)
+            return
+        self._send_json(
+            {
+                **response,
+                "object": "chat.completion",
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {
+                            "role": "assistant",
+                            "content": completion.text,
+                        },
+                        "finish_reason": "stop",
+                    }
+                ],
+                "usage": usage,
+            }
+        )
+
+    def _send_stream(
+        self, response: dict, text: str, usage: dict, request: dict
+    ) -> None:
+        # The whole event stream is sent at once, after the latency.
+        chunk = {**response, "object": "chat.completion.chunk"}
+        events = [
+            {
+                **chunk,
+                "choices": [
+                    {
+                        "index": 0,
+                        "delta": {"content": delta},
+                        "finish_reason": None,
+                    }
+                ],
+            }
+            for delta in split_deltas(text)
+        ]
+        events[-1]["choices"][0]["finish_reason"] = "stop"
+        if (request.get("stream_options") or {}).get("include_usage"):
+            events.append({**chunk, "choices": [], "usage": usage})
+        body = "".join(f"data: {json.dumps(event)}\n\n" for event in events)
+        self._send(
+            200, (body + "data: [DONE]\n\n").encode(), "text/event-stream"
+        )
+
+    def _upload_file(self) -> None:
+        message = email.message_from_bytes(
+            b"Content-Type: "
+            + self.headers["Content-Type"].encode()
+            + b"\r\n\r\n"
+            + self._body(),
+            policy=email.policy.HTTP,
+        )
+        parts = {
+            part.get_param("name", header="content-disposition"): part
+            for part in message.iter_parts()
+        }
+        data = parts["file"].get_payload(decode=True)
+        file_id = self.server.new_id("file")
+        self.server.files[file_id] = data
+        self._send_json(
+            {
+                "id": file_id,
+                "object": "file",
+                "bytes": len(data),
+                "created_at": int(time.time()),
+                "filename": parts["file"].get_filename() or "upload",
+                "purpose": parts["purpose"].get_content().strip(),
+                "status": "processed",
+            }
+        )
+
+    def _create_batch(self, request: dict) -> None:
+        batch_id = self.server.new_id("batch")
+        batch = {
+            "id": batch_id,
+            "object": "batch",
+            "endpoint": request["endpoint"],
+            "input_file_id": request["input_file_id"],
+            "completion_window": request["completion_window"],
+            "status": "validating",
+            "created_at": int(time.time()),
+            "output_file_id": None,
+            "error_file_id": None,
+        }
+        self.server.batches[batch_id] = batch
+        self._send_json(batch)
+
+    def _retrieve_batch(self, batch_id: str) -> None:
+        batch = self.server.batches.get(batch_id)
+        if batch is None:
+            self._send_json({"error": {"message": "Not found"}}, status=404)
+            return
+        # Each status check moves the batch one step towards completion.
+        if batch["status"] == "validating":
+            batch["status"] = "in_progress"
+        elif batch["status"] == "in_progress":
+            self._complete_batch(batch)
+        self._send_json(batch)
+
+    def _complete_batch(self, batch: dict) -> None:
+        llm = self.server.llm
+        output = []
+        completed = failed = 0
+        for line in self.server.files[batch["input_file_id"]].splitlines():
+            if not line.strip():
+                continue
+            request = json.loads(line)
+            body = request["body"]
+            if llm.batch_line_fails(request["custom_id"]):
+                failed += 1
+                response = {
+                    "status_code": 500,
+                    "body": {"error": {"message": "Simulated HTTP 500"}},
+                }
+            else:
+                completed += 1
+                completion = llm.reply(body["messages"], body["model"])
+                response = {
+                    "status_code": 200,
+                    "body": {
+                        "choices": [
+                            {
+                                "index": 0,
+                                "message": {
+                                    "role": "assistant",
+                                    "content": completion.text,
+                                },
+                            }
+                        ],
+                        "usage": {
+                            "prompt_tokens": completion.prompt_tokens,
+                            "completion_tokens": completion.completion_tokens,
+                            "total_tokens": completion.total_tokens,
+                        },
+                    },
+                }
+            self.server.batch_requests.append(request)
+            output.append(
+                json.dumps(
+                    {"custom_id": request["custom_id"], "response": response}
+                )
+            )
+        output_file_id = self.server.new_id("file")
+        self.server.files[output_file_id] = ("\n".join(output) + "\n").encode()
+        batch.update(
+            status="completed",
+            output_file_id=output_file_id,
+            request_counts={
+                "total": completed + failed,
+                "completed": completed,
+                "failed": failed,
+            },
+        )
+
+
+class FakeServer(ThreadingHTTPServer):
+    """
+    Serve a FakeLLM over the OpenAI HTTP API on a background thread.
+
+    Usable as a context manager; base_url is ready to pass to openai.OpenAI.
+
+    Args:
+        llm (Optional[FakeLLM]): The simulated provider. Other keyword
+            arguments build a new FakeLLM.
+        host (str, optional): Defaults to "127.0.0.1".
+        port (int, optional): Defaults to 0, any free port.
+    """
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        llm: Optional[FakeLLM] = None,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        **llm_args,
+    ):
+        super().__init__((host, port), _Handler)
+        self.llm = llm or FakeLLM(**llm_args)
+        self.files: Dict[str, bytes] = {}
+        self.batches: Dict[str, dict] = {}
+        self.batch_requests: List[dict] = []
+        self._ids = itertools.count()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def new_id(self, prefix: str) -> str:
+        return f"{prefix}-{next(self._ids)}"
+
+    def start(self) -> "FakeServer":
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+    def client(self) -> openai.OpenAI:
+        """Return an OpenAI client pointed at this server."""
+        return openai.OpenAI(
+            api_key="fake", base_url=self.base_url, max_retries=0
+        )
+
+    def __enter__(self) -> "FakeServer":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Serve a fake OpenAI-compatible chat completions API."
+    )
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument(
+        "--latency",
+        default="0",
+        help='latency distribution, e.g. "lognormal:0.8,0.5" or "uniform:0.2,2"',
+    )
+    parser.add_argument(
+        "--per-token-latency",
+        type=float,
+        default=0.0,
+        help="extra seconds per completion token",
+    )
+    parser.add_argument("--max-concurrency", type=int, default=None)
+    parser.add_argument("--rpm", type=int, default=None)
+    parser.add_argument("--tpm", type=int, default=None)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    server = FakeServer(
+        host=args.host,
+        port=args.port,
+        latency=args.latency,
+        per_token_latency=args.per_token_latency,
+        max_concurrency=args.max_concurrency,
+        rpm=args.rpm,
+        tpm=args.tpm,
+        throttle_rate=args.throttle_rate,
+        error_rate=args.error_rate,
+        seed=args.seed,
+    )
+    print(f"Fake OpenAI API listening on {server.base_url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,434 @@
+import collections
+import contextlib
+import contextvars
+import itertools
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from dataclasses import field
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from .backends import Completion
+
+
+logger = logging.getLogger(__name__)
+
+_call_ids = itertools.count(1)
+# (stage, chunk_index) of the LLM calls made in the current context
+_call_context: contextvars.ContextVar[Tuple[Optional[str], Optional[int]]] = (
+    contextvars.ContextVar("translation_call_context", default=(None, None))
+)
+_scoped_handlers: contextvars.ContextVar[Tuple["CallbackHandler", ...]] = (
+    contextvars.ContextVar("translation_call_handlers", default=())
+)
+_handlers: List["CallbackHandler"] = []
+
+
+@dataclass
+class CallEvent:
+    """
+    One LLM call made by get_completion or get_completion_async.
+
+    The same object is passed to on_call_start and, once filled in, to
+    on_call_end.
+
+    Attributes:
+        call_id (int): Unique per process; pairs the start and end events.
+        model (str): The model the call was made to.
+        stage (Optional[str]): The workflow stage, e.g. "initial", "reflect" or "improve".
+        chunk_index (Optional[int]): The chunk being translated, for multichunk calls.
+        started (float): Wall-clock start time, as from time.time().
+        prompt_tokens (Optional[int]): Input tokens reported by the backend.
+        completion_tokens (Optional[int]): Output tokens reported by the backend.
+        cached_tokens (Optional[int]): Prompt tokens the provider served from
+            its prompt cache, as reported by the backend.
+        latency (Optional[float]): Seconds from start to end, retries included.
+        cache_hit (bool): Whether the completion cache answered the call.
+        error (Optional[BaseException]): The exception the call failed with.
+    """
+
+    call_id: int
+    model: str
+    stage: Optional[str] = None
+    chunk_index: Optional[int] = None
+    started: float = field(default_factory=time.time)
+    prompt_tokens: Optional[int] = None
+    completion_tokens: Optional[int] = None
+    cached_tokens: Optional[int] = None
+    latency: Optional[float] = None
+    cache_hit: bool = False
+    error: Optional[BaseException] = None
+    _perf_started: float = field(default_factory=time.perf_counter, repr=False)
+
+
+@dataclass
+class CritiqueEvent:
+    """
+    The critique of a translation, kept for audit.
+
+    Attributes:
+        stage (Optional[str]): "reflect", or "fused" for a reflect-and-improve call.
+        chunk_index (Optional[int]): The chunk the critique is about, for multichunk calls.
+        critique (str): The critique as returned by the model.
+    """
+
+    stage: Optional[str]
+    chunk_index: Optional[int]
+    critique: str
+
+
+class CallbackHandler:
+    """
+    Base class for receivers of LLM call events.
+
+    Override any method. Handlers run synchronously on the calling thread
+    or event loop, so they should be quick; an exception raised by a
+    handler is logged and never fails the translation.
+    """
+
+    def on_call_start(self, event: CallEvent) -> None:
+        pass
+
+    def on_call_end(self, event: CallEvent) -> None:
+        pass
+
+    def on_call_skipped(self, event: CallEvent) -> None:
+        """Called instead of start/end when the workflow skips a call."""
+
+    def on_critique(self, event: CritiqueEvent) -> None:
+        """Called with every critique the workflow gets from the model."""
+
+
+def add_handler(handler: CallbackHandler) -> None:
+    """Receive the events of every LLM call in this process."""
+    _handlers.append(handler)
+
+
+def remove_handler(handler: CallbackHandler) -> None:
+    _handlers.remove(handler)
+
+
+@contextlib.contextmanager
+def instrument(*handlers: CallbackHandler) -> Iterator[None]:
+    """
+    Receive the events of the LLM calls made inside the with block.
+
+    The handlers follow the current context into asyncio tasks, so
+    concurrent translations can each collect their own metrics.
+    """
+    token = _scoped_handlers.set(_scoped_handlers.get() + handlers)
+    try:
+        yield
+    finally:
+        _scoped_handlers.reset(token)
+
+
+@contextlib.contextmanager
+def call_context(
+    stage: Optional[str], chunk_index: Optional[int] = None
+) -> Iterator[None]:
+    """Label the LLM calls made inside the with block."""
+    token = _call_context.set((stage, chunk_index))
+    try:
+        yield
+    finally:
+        _call_context.reset(token)
+
+
+def _dispatch(method: str, event: CallEvent) -> None:
+    for handler in (*_handlers, *_scoped_handlers.get()):
+        try:
+            getattr(handler, method)(event)
+        except Exception:
+            logger.exception("Call handler %r failed", handler)
+
+
+def call_started(model: str) -> CallEvent:
+    """Create the event of a new LLM call and notify the handlers."""
+    stage, chunk_index = _call_context.get()
+    event = CallEvent(next(_call_ids), model, stage, chunk_index)
+    _dispatch("on_call_start", event)
+    return event
+
+
+def call_finished(
+    event: CallEvent,
+    completion: Optional[Completion] = None,
+    cache_hit: bool = False,
+    error: Optional[BaseException] = None,
+) -> None:
+    """Fill in the outcome of an LLM call and notify the handlers."""
+    event.latency = time.perf_counter() - event._perf_started
+    event.cache_hit = cache_hit
+    event.error = error
+    if completion is not None:
+        event.prompt_tokens = completion.prompt_tokens
+        event.completion_tokens = completion.completion_tokens
+        event.cached_tokens = completion.cached_tokens
+    _dispatch("on_call_end", event)
+
+
+def call_skipped(model: str) -> None:
+    """Notify the handlers that the workflow skipped an LLM call."""
+    stage, chunk_index = _call_context.get()
+    event = CallEvent(next(_call_ids), model, stage, chunk_index, latency=0.0)
+    _dispatch("on_call_skipped", event)
+
+
+def critique_recorded(critique: str) -> None:
+    """Pass the critique of the current stage to the handlers."""
+    stage, chunk_index = _call_context.get()
+    _dispatch("on_critique", CritiqueEvent(stage, chunk_index, critique))
+
+
+class LoggingHandler(CallbackHandler):
+    """
+    Log one structured record per finished call.
+
+    The call's fields are attached to the record as `extra`, for JSON log
+    formatters, and repeated in the message as key=value pairs.
+
+    Args:
+        logger (Optional[logging.Logger]): Defaults to the "translation_agent.calls" logger.
+        level (int, optional): The level of successful calls. Defaults to logging.INFO.
+    """
+
+    def __init__(
+        self,
+        logger: Optional[logging.Logger] = None,
+        level: int = logging.INFO,
+    ):
+        self.logger = logger or logging.getLogger("translation_agent.calls")
+        self.level = level
+
+    def on_call_end(self, event: CallEvent) -> None:
+        fields = {
+            "call_id": event.call_id,
+            "model": event.model,
+            "stage": event.stage,
+            "chunk_index": event.chunk_index,
+            "prompt_tokens": event.prompt_tokens,
+            "completion_tokens": event.completion_tokens,
+            "cached_tokens": event.cached_tokens,
+            "latency": round(event.latency or 0.0, 4),
+            "cache_hit": event.cache_hit,
+            "error": type(event.error).__name__ if event.error else None,
+        }
+        self.logger.log(
+            logging.WARNING if event.error else self.level,
+            "llm_call %s",
+            " ".join(f"{key}={value}" for key, value in fields.items()),
+            extra={"llm_call": fields},
+        )
+
+    def on_call_skipped(self, event: CallEvent) -> None:
+        self.logger.log(
+            self.level,
+            "llm_call_skipped stage=%s chunk_index=%s",
+            event.stage,
+            event.chunk_index,
+            extra={
+                "llm_call": {
+                    "call_id": event.call_id,
+                    "model": event.model,
+                    "stage": event.stage,
+                    "chunk_index": event.chunk_index,
+                    "skipped": True,
+                }
+            },
+        )
+
+    def on_critique(self, event: CritiqueEvent) -> None:
+        self.logger.log(
+            self.level,
+            "llm_critique stage=%s chunk_index=%s critique=%r",
+            event.stage,
+            event.chunk_index,
+            event.critique,
+            extra={
+                "llm_critique": {
+                    "stage": event.stage,
+                    "chunk_index": event.chunk_index,
+                    "critique": event.critique,
+                }
+            },
+        )
+
+
+class MetricsCollector(CallbackHandler):
+    """
+    Aggregate call counts, tokens and latencies per stage in memory.
+
+    Thread-safe. summary() returns per-stage totals, latency percentiles
+    of the calls that reached the backend and the share of skipped calls.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts: Dict[str, Dict[str, int]] = collections.defaultdict(
+            collections.Counter
+        )
+        self._latencies: Dict[str, List[float]] = collections.defaultdict(list)
+
+    def on_call_end(self, event: CallEvent) -> None:
+        stage = event.stage or "other"
+        with self._lock:
+            counts = self._counts[stage]
+            counts["calls"] += 1
+            if event.cache_hit:
+                counts["cache_hits"] += 1
+                return
+            if event.error is not None:
+                counts["errors"] += 1
+                return
+            counts["prompt_tokens"] += event.prompt_tokens or 0
+            counts["completion_tokens"] += event.completion_tokens or 0
+            counts["cached_tokens"] += event.cached_tokens or 0
+            self._latencies[stage].append(event.latency or 0.0)
+
+    def on_call_skipped(self, event: CallEvent) -> None:
+        with self._lock:
+            self._counts[event.stage or "other"]["skipped"] += 1
+
+    @staticmethod
+    def _percentile(latencies: List[float], q: float) -> Optional[float]:
+        if not latencies:
+            return None
+        ordered = sorted(latencies)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def summary(self) -> Dict[str, dict]:
+        """
+        Return the metrics of every stage seen so far.
+
+        Returns:
+            Dict[str, dict]: For each stage, calls, cache_hits, errors,
+            skipped, skip_rate (skipped / (calls + skipped)), prompt_tokens,
+            completion_tokens, cached_tokens, cached_rate (the share of
+            prompt tokens served from the provider's prompt cache),
+            latency_total, latency_p50 and latency_p95 (in seconds).
+        """
+        with self._lock:
+            summary = {}
+            for stage, counts in self._counts.items():
+                latencies = self._latencies[stage]
+                planned = counts["calls"] + counts["skipped"]
+                summary[stage] = {
+                    "calls": counts["calls"],
+                    "cache_hits": counts["cache_hits"],
+                    "errors": counts["errors"],
+                    "skipped": counts["skipped"],
+                    "skip_rate": counts["skipped"] / planned
+                    if planned
+                    else 0.0,
+                    "prompt_tokens": counts["prompt_tokens"],
+                    "completion_tokens": counts["completion_tokens"],
+                    "cached_tokens": counts["cached_tokens"],
+                    "cached_rate": counts["cached_tokens"]
+                    / counts["prompt_tokens"]
+                    if counts["prompt_tokens"]
+                    else 0.0,
+                    "latency_total": sum(latencies),
+                    "latency_p50": self._percentile(latencies, 0.5),
+                    "latency_p95": self._percentile(latencies, 0.95),
+                }
+            return summary
+
+
+class OpenTelemetryHandler(CallbackHandler):
+    """
+    Export every call as an OpenTelemetry span plus latency/token metrics.
+
+    Requires the optional opentelemetry-api package; configure the SDK and
+    exporters as usual for the application.
+
+    Args:
+        tracer_provider: Defaults to the global tracer provider.
+        meter_provider: Defaults to the global meter provider.
+    """
+
+    def __init__(self, tracer_provider=None, meter_provider=None):
+        try:
+            from opentelemetry import metrics
+            from opentelemetry import trace
+        except ImportError as exc:
+            raise ImportError(
+                "OpenTelemetryHandler needs the opentelemetry-api package: "
+                "pip install opentelemetry-api"
+            ) from exc
+
+        self._trace = trace
+        self._tracer = trace.get_tracer(
+            "translation_agent", tracer_provider=tracer_provider
+        )
+        meter = metrics.get_meter(
+            "translation_agent", meter_provider=meter_provider
+        )
+        self._latency = meter.create_histogram(
+            "translation_agent.llm.latency",
+            unit="s",
+            description="Latency of LLM calls, retries included",
+        )
+        self._tokens = meter.create_counter(
+            "translation_agent.llm.tokens",
+            unit="{token}",
+            description="Tokens billed by LLM calls",
+        )
+        self._skipped = meter.create_counter(
+            "translation_agent.llm.skipped",
+            unit="{call}",
+            description="LLM calls the workflow found unnecessary",
+        )
+        self._spans: Dict[int, object] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _attributes(event: CallEvent) -> dict:
+        attributes = {"llm.model": event.model, "llm.stage": event.stage or ""}
+        if event.chunk_index is not None:
+            attributes["llm.chunk_index"] = event.chunk_index
+        return attributes
+
+    def on_call_start(self, event: CallEvent) -> None:
+        span = self._tracer.start_span(
+            f"llm {event.stage or 'call'}",
+            attributes=self._attributes(event),
+            start_time=int(event.started * 1e9),
+        )
+        with self._lock:
+            self._spans[event.call_id] = span
+
+    def on_call_end(self, event: CallEvent) -> None:
+        with self._lock:
+            span = self._spans.pop(event.call_id, None)
+        attributes = self._attributes(event)
+        attributes["llm.cache_hit"] = event.cache_hit
+        if span is not None:
+            span.set_attribute("llm.cache_hit", event.cache_hit)
+            if event.prompt_tokens is not None:
+                span.set_attribute("llm.prompt_tokens", event.prompt_tokens)
+            if event.completion_tokens is not None:
+                span.set_attribute(
+                    "llm.completion_tokens", event.completion_tokens
+                )
+            if event.cached_tokens is not None:
+                span.set_attribute("llm.cached_tokens", event.cached_tokens)
+            if event.error is not None:
+                span.record_exception(event.error)
+                span.set_status(self._trace.StatusCode.ERROR)
+            span.end()
+        self._latency.record(event.latency or 0.0, attributes)
+        for kind in ("prompt", "completion", "cached"):
+            tokens = getattr(event, f"{kind}_tokens")
+            if tokens:
+                self._tokens.add(
+                    tokens, {**attributes, "llm.token_type": kind}
+                )
+
+    def on_call_skipped(self, event: CallEvent) -> None:
+        self._skipped.add(1, self._attributes(event))
@@ -0,0 +1,171 @@
+"""
+A crash-safe, append-only journal of finished translation work.
+
+Every LLM reply of a document's workflow (the initial translation,
+reflection and improved translation of each chunk) is appended to a JSON
+Lines file as soon as it arrives, and so is every finished file of a
+folder run. A run resumed from the journal replays the recorded replies
+without LLM calls and carries on from the first stage that is missing.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import threading
+from typing import Any
+from typing import Dict
+from typing import Optional
+from typing import Tuple
+
+
+def document_key(
+    source_lang: str, target_lang: str, source_text: str, *params: Any
+) -> str:
+    """
+    Return the journal key of a document translated with the given settings.
+
+    Args:
+        source_lang (str): The source language of the text.
+        target_lang (str): The target language for the translation.
+        source_text (str): The whole text being translated.
+        *params: The settings that change how the text is chunked and
+            prompted (country, chunk size, context policy, ...), as values
+            with a stable repr().
+
+    Returns:
+        str: A hex SHA-256 digest identifying the document and its settings.
+    """
+    payload = json.dumps(
+        [source_lang, target_lang, [repr(p) for p in params], source_text],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def file_key(path: str, *params: Any) -> str:
+    """Return the journal key of a file's contents translated with params."""
+    digest = hashlib.sha256(json.dumps([repr(p) for p in params]).encode())
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class Journal:
+    """
+    Append-only record of LLM replies and finished files, in one JSONL file.
+
+    Each record is written, flushed and synced before the call that
+    produced it returns, so a crash loses at most the calls in flight. A
+    record torn by the crash is ignored when the journal is read back.
+
+    Args:
+        path (str): Path of the journal file.
+        resume (bool, optional): Replay the records already in the file.
+            Otherwise the file is started afresh. Defaults to False.
+    """
+
+    def __init__(self, path: str, resume: bool = False):
+        self.path = path
+        self.replayed = 0
+        self._replies: Dict[Tuple[str, str, Optional[int]], str] = {}
+        self._files: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        if resume and os.path.exists(path):
+            self._load()
+            with open(path, "rb+") as f:
+                if f.seek(0, os.SEEK_END):
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        # Start after a torn last record, not on its line.
+                        f.write(b"\n")
+        else:
+            with open(path, "w", encoding="utf-8"):
+                pass
+
+    def _load(self) -> None:
+        with open(self.path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if "file" in record:
+                    self._files[record["file"]] = record["output"]
+                elif "doc" in record:
+                    key = (record["doc"], record["stage"], record["chunk"])
+                    self._replies[key] = record["output"]
+
+    def _append(self, record: dict) -> None:
+        line = json.dumps(record, ensure_ascii=False)
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def reply(
+        self, doc: str, stage: str, chunk_index: Optional[int]
+    ) -> Optional[str]:
+        """Return the recorded reply of a stage, or None if there is none."""
+        with self._lock:
+            reply = self._replies.get((doc, stage, chunk_index))
+            if reply is not None:
+                self.replayed += 1
+            return reply
+
+    def record_reply(
+        self, doc: str, stage: str, chunk_index: Optional[int], reply: str
+    ) -> None:
+        """Append the reply of a stage of one chunk of a document."""
+        with self._lock:
+            self._replies[(doc, stage, chunk_index)] = reply
+        self._append(
+            {"doc": doc, "chunk": chunk_index, "stage": stage, "output": reply}
+        )
+
+    def finished_file(self, key: str) -> Optional[str]:
+        """Return the output path recorded for a finished file, if any."""
+        with self._lock:
+            return self._files.get(key)
+
+    def record_file(self, key: str, output_path: str) -> None:
+        """Append a finished file and the path its translation was saved to."""
+        with self._lock:
+            self._files[key] = output_path
+        self._append({"file": key, "output": output_path})
+
+    def document(self, key: str) -> "DocumentJournal":
+        """Return the view of the journal for the document with this key."""
+        return DocumentJournal(self, key)
+
+
+class DocumentJournal:
+    """
+    The journal records of one document, looked up by stage and chunk.
+
+    Stages are named as the call handlers see them: "initial" holds
+    translation_1, "reflect" the reflection and "improve" translation_2;
+    "escalate", "fused" and "adapt" replies are kept the same way.
+    """
+
+    def __init__(self, journal: Journal, key: str):
+        self.journal = journal
+        self.key = key
+
+    def get(self, stage: str, chunk_index: Optional[int]) -> Optional[str]:
+        return self.journal.reply(self.key, stage, chunk_index)
+
+    def record(
+        self, stage: str, chunk_index: Optional[int], reply: str
+    ) -> None:
+        self.journal.record_reply(self.key, stage, chunk_index, reply)
+
+    async def record_async(
+        self, stage: str, chunk_index: Optional[int], reply: str
+    ) -> None:
+        """Like record(), with the write and fsync in a worker thread."""
+        await asyncio.to_thread(self.record, stage, chunk_index, reply)
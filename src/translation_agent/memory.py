@@ -0,0 +1,246 @@
+import hashlib
+import os
+import random
+import sqlite3
+import threading
+import time
+import unicodedata
+import zlib
+from dataclasses import dataclass
+from typing import List
+from typing import Optional
+from typing import Set
+
+
+SHINGLE_SIZE = 4  # character n-grams used for fuzzy matching
+NUM_PERM = 32  # MinHash signature length
+NUM_BANDS = 8  # LSH bands; NUM_PERM // NUM_BANDS rows per band
+MAX_CANDIDATES = 5  # candidates verified with exact Jaccard per lookup
+
+# Each MinHash "permutation" XORs the 32-bit shingle hash with a fixed random
+# mask, which is far cheaper in Python than a multiply-mod hash family.
+_rng = random.Random(1)
+_MASKS = [_rng.getrandbits(32) for _ in range(NUM_PERM)]
+
+
+def normalize_segment(segment: str) -> str:
+    """
+    The form segments are compared in by the memory and deduplicate().
+
+    Unicode is NFC-normalised, runs of whitespace collapse to one space and
+    the ends are stripped. Case and punctuation are kept, since "Yes" and
+    "YES" may need different translations.
+    """
+    return " ".join(unicodedata.normalize("NFC", segment).split())
+
+
+def _shingles(normalized: str) -> Set[str]:
+    text = normalized.lower()
+    if len(text) <= SHINGLE_SIZE:
+        return {text}
+    return {
+        text[i : i + SHINGLE_SIZE] for i in range(len(text) - SHINGLE_SIZE + 1)
+    }
+
+
+def _band_keys(shingles: Set[str], lang_pair: str) -> List[int]:
+    """Return one LSH bucket id per band of the MinHash signature."""
+    hashes = [zlib.crc32(s.encode("utf-8")) for s in shingles]
+    signature = [min([h ^ mask for h in hashes]) for mask in _MASKS]
+    rows = NUM_PERM // NUM_BANDS
+    keys = []
+    for band in range(NUM_BANDS):
+        digest = hashlib.blake2b(
+            f"{lang_pair}|{band}|{signature[band * rows : (band + 1) * rows]}".encode(),
+            digest_size=8,
+        ).digest()
+        keys.append(int.from_bytes(digest, "big", signed=True))
+    return keys
+
+
+def _jaccard(a: Set[str], b: Set[str]) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+@dataclass
+class MemoryMatch:
+    """
+    A translation memory hit.
+
+    Attributes:
+        source (str): The stored source segment.
+        translation (str): Its stored translation.
+        similarity (float): 1.0 for exact matches, otherwise the character
+            n-gram Jaccard similarity to the looked-up segment.
+        exact (bool): Whether the normalised segments are identical.
+    """
+
+    source: str
+    translation: str
+    similarity: float
+    exact: bool = False
+
+
+class TranslationMemory:
+    """
+    Segment-level translation memory stored in a SQLite file.
+
+    Exact matches are a primary key lookup on the normalised segment.
+    Fuzzy matches use a MinHash LSH index over character n-grams, and the
+    best few candidates are verified with exact Jaccard similarity, so the
+    cost of a lookup does not grow with the size of the memory. See
+    benchmarks/memory_lookup.py for the latency on your machine.
+
+    Args:
+        path (str): Path of the SQLite database file.
+        threshold (float, optional): Minimum similarity for a fuzzy match.
+            Defaults to 0.8.
+        fuzzy (bool, optional): Whether to look for fuzzy matches at all.
+            Defaults to True.
+    """
+
+    def __init__(self, path: str, threshold: float = 0.8, fuzzy: bool = True):
+        self.path = path
+        self.threshold = threshold
+        self.fuzzy = fuzzy
+        self._local = threading.local()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._connection()
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS segments ("
+                " id INTEGER PRIMARY KEY,"
+                " key TEXT UNIQUE NOT NULL,"
+                " source TEXT NOT NULL,"
+                " translation TEXT NOT NULL,"
+                " updated REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS bands ("
+                " band INTEGER NOT NULL,"
+                " segment_id INTEGER NOT NULL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS bands_band"
+                " ON bands (band, segment_id)"
+            )
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _key(normalized: str, source_lang: str, target_lang: str) -> str:
+        return hashlib.sha1(
+            f"{source_lang}\0{target_lang}\0{normalized}".encode()
+        ).hexdigest()
+
+    def lookup(
+        self, source_text: str, source_lang: str, target_lang: str
+    ) -> Optional[MemoryMatch]:
+        """
+        Find the stored translation of a segment.
+
+        Args:
+            source_text (str): The segment to look up.
+            source_lang (str): The source language.
+            target_lang (str): The target language.
+
+        Returns:
+            Optional[MemoryMatch]: The exact match if there is one, else the
+                most similar segment above the threshold, else None.
+        """
+        normalized = normalize_segment(source_text)
+        if not normalized:
+            return None
+
+        conn = self._connection()
+        row = conn.execute(
+            "SELECT source, translation FROM segments WHERE key = ?",
+            (self._key(normalized, source_lang, target_lang),),
+        ).fetchone()
+        if row is not None:
+            return MemoryMatch(row[0], row[1], 1.0, exact=True)
+        if not self.fuzzy:
+            return None
+
+        shingles = _shingles(normalized)
+        bands = _band_keys(shingles, f"{source_lang}\0{target_lang}")
+        segment_ids = [
+            row[0]
+            for row in conn.execute(
+                "SELECT segment_id FROM bands"
+                f" WHERE band IN ({','.join('?' * len(bands))})"
+                " GROUP BY segment_id ORDER BY COUNT(*) DESC LIMIT ?",
+                (*bands, MAX_CANDIDATES),
+            )
+        ]
+        if not segment_ids:
+            return None
+        candidates = conn.execute(
+            "SELECT source, translation FROM segments"
+            f" WHERE id IN ({','.join('?' * len(segment_ids))})",
+            segment_ids,
+        ).fetchall()
+
+        best = None
+        for source, translation in candidates:
+            similarity = _jaccard(shingles, _shingles(source))
+            if similarity >= self.threshold and (
+                best is None or similarity > best.similarity
+            ):
+                best = MemoryMatch(source, translation, similarity)
+        return best
+
+    def add(
+        self,
+        source_text: str,
+        translation: str,
+        source_lang: str,
+        target_lang: str,
+    ) -> None:
+        """Store (or replace) the translation of a segment."""
+        normalized = normalize_segment(source_text)
+        if not normalized or not translation:
+            return
+
+        key = self._key(normalized, source_lang, target_lang)
+        bands = _band_keys(
+            _shingles(normalized), f"{source_lang}\0{target_lang}"
+        )
+        conn = self._connection()
+        with conn:
+            existing = conn.execute(
+                "SELECT id FROM segments WHERE key = ?", (key,)
+            ).fetchone()
+            if existing is not None:
+                conn.execute(
+                    "UPDATE segments SET translation = ?, updated = ?"
+                    " WHERE id = ?",
+                    (translation, time.time(), existing[0]),
+                )
+                return
+            cursor = conn.execute(
+                "INSERT INTO segments (key, source, translation, updated)"
+                " VALUES (?, ?, ?, ?)",
+                (key, normalized, translation, time.time()),
+            )
+            conn.executemany(
+                "INSERT INTO bands (band, segment_id) VALUES (?, ?)",
+                [(band, cursor.lastrowid) for band in bands],
+            )
+
+    def __len__(self) -> int:
+        return (
+            self._connection()
+            .execute("SELECT COUNT(*) FROM segments")
+            .fetchone()[0]
+        )
@@ -0,0 +1,474 @@
+import heapq
+import json
+from dataclasses import dataclass
+from dataclasses import field
+from typing import Dict
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
+
+from . import prefilter
+from . import utils
+from .chunking import split_into_chunks
+from .context import FULL_CONTEXT
+from .context import ContextPolicy
+from .context import _window
+from .ratelimit import ModelLimits
+from .ratelimit import get_rate_limiter
+from .segments import PACK_MAX_TOKENS
+from .segments import _pack_improve_prompt
+from .segments import _pack_initial_prompt
+from .segments import _pack_reflect_prompt
+from .segments import deduplicate
+from .segments import needs_translation
+from .segments import pack_segments
+from .tokenizer import TokenizedText
+from .tokenizer import count_tokens
+from .tokenizer import encode_batch
+
+
+STAGES = ("initial", "reflect", "improve")
+OUTPUT_RATIO = 1.0  # translation tokens per source token
+REFLECTION_RATIO = 0.5  # reflection tokens per source token
+CALL_LATENCY = 1.0  # seconds per call before the first output token
+SECONDS_PER_TOKEN = 0.02  # seconds per completion token (~50 tokens/s)
+MESSAGE_OVERHEAD_TOKENS = 4  # chat formatting tokens around each message
+
+
+@dataclass
+class StagePlan:
+    """
+    Expected LLM usage of one workflow stage.
+
+    Attributes:
+        calls (int): Number of LLM calls.
+        prompt_tokens (int): Prompt tokens, system message and context included.
+        completion_tokens (int): Expected completion tokens.
+    """
+
+    calls: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+    def add(self, prompt_tokens: int, completion_tokens: int) -> None:
+        self.calls += 1
+        self.prompt_tokens += prompt_tokens
+        self.completion_tokens += completion_tokens
+
+
+@dataclass
+class FileTexts:
+    """
+    What translating one file sends to the LLM.
+
+    Attributes:
+        texts (Sequence[str]): The texts of its translate() calls.
+        segment_groups (Sequence[Sequence[str]]): The segments of its
+            translate_segments() calls, e.g. its distinct table cells.
+    """
+
+    texts: Sequence[str] = ()
+    segment_groups: Sequence[Sequence[str]] = ()
+
+
+@dataclass
+class Plan:
+    """
+    Expected cost and duration of translating some texts and segments.
+
+    Attributes:
+        texts (int): Number of texts, i.e. translate() calls.
+        chunks (int): Number of chunks over all texts.
+        segments (int): Number of segments given to translate_segments().
+        packs (int): Number of packs the segments are sent in.
+        skipped (int): Texts, chunks and segments passed through unchanged,
+            without any LLM call.
+        source_tokens (int): Tokens in the source texts.
+        stages (Dict[str, StagePlan]): Usage of each stage.
+        wall_time (float): Estimated seconds to translate the texts and
+            segment groups one after another, then the files max_files at a
+            time.
+        bottleneck (str): What bounds wall_time: "latency", "tpm" or "rpm".
+    """
+
+    texts: int = 0
+    chunks: int = 0
+    segments: int = 0
+    packs: int = 0
+    skipped: int = 0
+    source_tokens: int = 0
+    stages: Dict[str, StagePlan] = field(
+        default_factory=lambda: {stage: StagePlan() for stage in STAGES}
+    )
+    wall_time: float = 0.0
+    bottleneck: str = "latency"
+
+    @property
+    def calls(self) -> int:
+        return sum(stage.calls for stage in self.stages.values())
+
+    @property
+    def prompt_tokens(self) -> int:
+        return sum(stage.prompt_tokens for stage in self.stages.values())
+
+    @property
+    def completion_tokens(self) -> int:
+        return sum(stage.completion_tokens for stage in self.stages.values())
+
+    def report(self) -> str:
+        """Return a human-readable table of the plan."""
+        lines = [
+            f"{self.texts} texts, {self.chunks} chunks, "
+            + (
+                f"{self.segments} segments in {self.packs} packs, "
+                if self.segments
+                else ""
+            )
+            + f"{self.source_tokens} source tokens"
+            + (f", {self.skipped} passed through" if self.skipped else ""),
+            f"{'stage':<10}{'calls':>8}{'prompt':>14}{'completion':>14}",
+        ]
+        for name, stage in [*self.stages.items(), ("total", self)]:
+            lines.append(
+                f"{name:<10}{stage.calls:>8}{stage.prompt_tokens:>14}"
+                f"{stage.completion_tokens:>14}"
+            )
+        minutes, seconds = divmod(round(self.wall_time), 60)
+        hours, minutes = divmod(minutes, 60)
+        lines.append(
+            f"Estimated wall time: {hours}h{minutes:02d}m{seconds:02d}s "
+            f"(bound by {self.bottleneck})"
+        )
+        return "\n".join(lines)
+
+
+def _call_latency(
+    completion_tokens: int, call_latency: float, seconds_per_token: float
+) -> float:
+    return call_latency + completion_tokens * seconds_per_token
+
+
+def _prompt_tokens(system_message: str, prompt: str) -> int:
+    return (
+        count_tokens(system_message)
+        + count_tokens(prompt)
+        + 2 * MESSAGE_OVERHEAD_TOKENS
+    )
+
+
+@dataclass
+class _Estimator:
+    """Adds the expected usage of translate() calls and packs to a plan."""
+
+    result: Plan
+    source_lang: str
+    target_lang: str
+    country: str
+    max_tokens: int
+    max_concurrency: int
+    context: ContextPolicy
+    max_pack_tokens: int
+    output_ratio: float
+    reflection_ratio: float
+    call_latency: float
+    seconds_per_token: float
+
+    def _chain(
+        self,
+        prompts: Sequence[Tuple[str, str]],
+        context_tokens: int,
+        source_tokens: int,
+        reply_overhead: int = 0,
+    ) -> float:
+        """Count the three stages of one chunk or pack; return their latency."""
+        translation_tokens = round(source_tokens * self.output_ratio)
+        reflection_tokens = round(source_tokens * self.reflection_ratio)
+        inputs = (
+            0,
+            translation_tokens,
+            translation_tokens + reflection_tokens,
+        )
+        outputs = (
+            translation_tokens + reply_overhead,
+            reflection_tokens,
+            translation_tokens + reply_overhead,
+        )
+        chain = 0.0
+        for stage, prompt, input_tokens, output_tokens in zip(
+            STAGES, prompts, inputs, outputs
+        ):
+            self.result.stages[stage].add(
+                _prompt_tokens(*prompt) + context_tokens + input_tokens,
+                output_tokens,
+            )
+            chain += _call_latency(
+                output_tokens, self.call_latency, self.seconds_per_token
+            )
+        return chain
+
+    def _latency(self, chains: Sequence[float]) -> float:
+        # Chains run concurrently, max_concurrency calls at a time.
+        return max(
+            max(chains, default=0.0), sum(chains) / self.max_concurrency
+        )
+
+    def text(self, text: str) -> float:
+        """Count one translate() call on text; return its latency."""
+        source_lang, target_lang = self.source_lang, self.target_lang
+        tokenized_text = TokenizedText(text)
+        self.result.texts += 1
+        self.result.source_tokens += len(tokenized_text)
+        if prefilter.PREFILTER and prefilter.classify(
+            text, source_lang, target_lang
+        ):
+            self.result.skipped += 1
+            return 0.0
+
+        one_chunk = len(tokenized_text) < self.max_tokens
+        if one_chunk:
+            chunks = [text]
+            chunk_token_counts = [len(tokenized_text)]
+        else:
+            spans = split_into_chunks(tokenized_text, self.max_tokens)
+            chunks = [text[span.start : span.end] for span in spans]
+            chunk_token_counts = [span.num_tokens for span in spans]
+        self.result.chunks += len(chunks)
+
+        chains = []
+        for i, chunk in enumerate(chunks):
+            if (
+                not one_chunk
+                and prefilter.PREFILTER
+                and prefilter.classify(chunk, source_lang, target_lang)
+            ):
+                self.result.skipped += 1
+                continue
+            # Model outputs are left empty in the prompts and added as counts.
+            if one_chunk:
+                context_tokens = 0
+                prompts = (
+                    utils._one_chunk_initial_prompt(
+                        source_lang, target_lang, chunk
+                    ),
+                    utils._one_chunk_reflect_prompt(
+                        source_lang, target_lang, chunk, "", self.country
+                    ),
+                    utils._one_chunk_improve_prompt(
+                        source_lang, target_lang, chunk, "", ""
+                    ),
+                )
+            else:
+                # The tagged text is counted from the chunk token counts, so
+                # planning stays linear even with the full document as context.
+                context = self.context
+                window = _window(context, i, chunk_token_counts)
+                context_tokens = sum(
+                    chunk_token_counts[window.start : window.stop]
+                )
+                if context.layout == "prefix":
+                    tagged_text = ""
+                else:
+                    tagged_text = f"<TRANSLATE_THIS>{chunk}</TRANSLATE_THIS>"
+                    context_tokens -= chunk_token_counts[i]
+                prompt_layout = {"layout": context.layout, "chunk_index": i}
+                prompts = (
+                    utils._multichunk_initial_prompt(
+                        source_lang,
+                        target_lang,
+                        tagged_text,
+                        chunk,
+                        **prompt_layout,
+                    ),
+                    utils._multichunk_reflect_prompt(
+                        source_lang,
+                        target_lang,
+                        tagged_text,
+                        chunk,
+                        "",
+                        self.country,
+                        **prompt_layout,
+                    ),
+                    utils._multichunk_improve_prompt(
+                        source_lang,
+                        target_lang,
+                        tagged_text,
+                        chunk,
+                        "",
+                        "",
+                        **prompt_layout,
+                    ),
+                )
+            chains.append(
+                self._chain(prompts, context_tokens, chunk_token_counts[i])
+            )
+        return self._latency(chains)
+
+    def segment_group(self, group: Sequence[str]) -> float:
+        """Count one translate_segments() call on group; return its latency."""
+        source_lang, target_lang = self.source_lang, self.target_lang
+        unique = deduplicate(group).unique
+        if prefilter.PREFILTER:
+            reasons, _ = prefilter.skipped_segments(
+                unique, source_lang, target_lang
+            )
+            todo = [s for s, reason in zip(unique, reasons) if reason is None]
+        else:
+            todo = [s for s in unique if needs_translation(s)]
+        self.result.segments += len(group)
+        self.result.skipped += len(unique) - len(todo)
+
+        token_counts = [len(ids) for ids in encode_batch(todo)]
+        chains = []
+        for pack in pack_segments(token_counts, self.max_pack_tokens):
+            texts = [todo[i] for i in pack]
+            if len(pack) == 1:
+                # A lone segment goes through translate().
+                chains.append(self.text(texts[0]))
+                continue
+            self.result.packs += 1
+            source_tokens = sum(token_counts[i] for i in pack)
+            self.result.source_tokens += source_tokens
+            empty = [""] * len(texts)
+            prompts = (
+                _pack_initial_prompt(
+                    source_lang, target_lang, self.country, texts
+                ),
+                _pack_reflect_prompt(
+                    source_lang, target_lang, self.country, texts, empty
+                ),
+                _pack_improve_prompt(
+                    source_lang, target_lang, texts, empty, ""
+                ),
+            )
+            # The JSON around the translations of a reply.
+            reply_overhead = count_tokens(
+                json.dumps(
+                    {
+                        "translations": [
+                            {"id": str(i), "text": ""}
+                            for i in range(len(texts))
+                        ]
+                    }
+                )
+            )
+            chains.append(
+                self._chain(prompts, 0, source_tokens, reply_overhead)
+            )
+        return self._latency(chains)
+
+
+def plan(
+    texts: Sequence[str],
+    source_lang: str,
+    target_lang: str,
+    country: str = "",
+    max_tokens: int = utils.MAX_TOKENS_PER_CHUNK,
+    max_concurrency: int = utils.MAX_CONCURRENCY,
+    context: ContextPolicy = FULL_CONTEXT,
+    model: str = "gpt-4-turbo",
+    limits: Optional[ModelLimits] = None,
+    output_ratio: float = OUTPUT_RATIO,
+    reflection_ratio: float = REFLECTION_RATIO,
+    call_latency: float = CALL_LATENCY,
+    seconds_per_token: float = SECONDS_PER_TOKEN,
+    segment_groups: Sequence[Sequence[str]] = (),
+    max_pack_tokens: int = PACK_MAX_TOKENS,
+    files: Sequence[FileTexts] = (),
+    max_files: int = 1,
+) -> Plan:
+    """
+    Estimate the LLM calls, tokens and wall time of translating texts.
+
+    Each text is chunked exactly as translate() would chunk it and every
+    prompt is built from the real templates, so prompt tokens include the
+    tagged context repeated in each stage. Segment groups are deduplicated
+    and packed exactly as translate_segments() would pack them, and planned
+    with the pack prompts. Texts, chunks and segments the pre-filter passes
+    through cost nothing. No LLM is called. Completion caches and
+    translation memories are ignored, so the plan is an upper bound for a
+    warm run.
+
+    Args:
+        texts (Sequence[str]): The texts translate() will be called on, in order.
+        source_lang (str): The source language of the texts.
+        target_lang (str): The target language for the translation.
+        country (str): Country specified for target language.
+        max_tokens (int): Chunk size, as passed to translate().
+        max_concurrency (int): Maximum number of LLM calls in flight per text.
+        context (ContextPolicy): How much surrounding text is sent with each chunk.
+        model (str): The model whose rate limits apply.
+        limits (Optional[ModelLimits]): Rate limits of the model. Defaults to
+            those of the process-wide rate limiter.
+        output_ratio (float): Expected translation tokens per source token.
+        reflection_ratio (float): Expected reflection tokens per source token.
+        call_latency (float): Seconds per call before the first output token.
+        seconds_per_token (float): Seconds per generated token.
+        segment_groups (Sequence[Sequence[str]]): The segments, e.g. table
+            cells, of each translate_segments() call, run after the texts.
+        max_pack_tokens (int): Source tokens per pack, as passed to
+            translate_segments().
+        files (Sequence[FileTexts]): Files whose texts and segment groups
+            are all translated at once, as translate_folder.py does, after
+            the texts and segment groups above.
+        max_files (int): Number of files translated at the same time.
+
+    Returns:
+        Plan: Calls and tokens per stage and the estimated wall time.
+    """
+    result = Plan()
+    estimator = _Estimator(
+        result,
+        source_lang,
+        target_lang,
+        country,
+        max_tokens,
+        max_concurrency,
+        context,
+        max_pack_tokens,
+        output_ratio,
+        reflection_ratio,
+        call_latency,
+        seconds_per_token,
+    )
+    # Texts and segment groups run one after another.
+    latency_bound = sum(estimator.text(text) for text in texts) + sum(
+        estimator.segment_group(group) for group in segment_groups
+    )
+    # A file takes as long as its slowest text or segment group, and each
+    # file starts, in order, as soon as one of max_files slots is free.
+    slots = [0.0] * max_files
+    for file_texts in files:
+        file_latency = max(
+            [
+                *(estimator.text(text) for text in file_texts.texts),
+                *(
+                    estimator.segment_group(group)
+                    for group in file_texts.segment_groups
+                ),
+            ],
+            default=0.0,
+        )
+        heapq.heapreplace(slots, slots[0] + file_latency)
+    latency_bound += max(slots)
+    return _bound(result, latency_bound, model, limits)
+
+
+def _bound(
+    result: Plan,
+    latency_bound: float,
+    model: str,
+    limits: Optional[ModelLimits],
+) -> Plan:
+    """Set the wall time of result to the tightest of its bounds."""
+    if limits is None:
+        rate_limiter = get_rate_limiter()
+        limits = rate_limiter.limits.get(model, rate_limiter.default_limits)
+    total_tokens = result.prompt_tokens + result.completion_tokens
+    bounds = {
+        "latency": latency_bound,
+        "tpm": 60 * total_tokens / limits.tpm,
+        "rpm": 60 * result.calls / limits.rpm,
+    }
+    result.bottleneck = max(bounds, key=bounds.get)
+    result.wall_time = bounds[result.bottleneck]
+    return result
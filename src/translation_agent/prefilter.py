@@ -0,0 +1,279 @@
+"""
+A local pre-filter for segments that do not need an LLM call.
+
+Numbers, dates, codes, URLs and email addresses are kept as they are in a
+translation, and so is text already written in the target language. The
+pre-filter spots them with precompiled patterns and Unicode script ranges,
+so they pass through unchanged instead of costing three LLM calls each.
+"""
+
+import collections
+import os
+import re
+import threading
+from typing import Dict
+from typing import FrozenSet
+from typing import List
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
+
+
+# Ask the pre-filter to pass non-translatable segments through unchanged.
+PREFILTER = os.getenv("TRANSLATION_PREFILTER", "true").lower() == "true"
+
+# Share of a sentence's letters that must be in the target language's script
+# for the sentence to count as already translated. A text of several
+# sentences counts only if every one of them does.
+TARGET_SCRIPT_SHARE = 0.8
+
+SKIP_REASONS = (
+    "empty",
+    "date",
+    "number",
+    "url",
+    "email",
+    "code",
+    "target_script",
+)
+
+_WORD = re.compile(r"\w")
+_LETTER = re.compile(r"[^\W\d_]")
+_DATE = re.compile(
+    r"""
+    (?:\d{4}[-/.]\d{1,2}[-/.]\d{1,2}        # 2024-01-31
+      |\d{1,2}[-/.]\d{1,2}[-/.]\d{2,4})     # 31/01/2024
+    (?:[ T]\d{1,2}:\d{2}(?::\d{2})?)?       # optional time of day
+    |\d{1,2}:\d{2}(?::\d{2})?               # 14:30
+    """,
+    re.VERBOSE,
+)
+_URL = re.compile(r"(?:[a-z][a-z0-9+.-]*://|www\.)\S+", re.IGNORECASE)
+_EMAIL = re.compile(r"(?:mailto:)?[\w.+-]+@[\w-]+(?:\.[\w-]+)+", re.ASCII)
+# Part numbers, SKUs and the like: upper case letters and digits, with at
+# least one digit, joined by separators but no spaces.
+_CODE = re.compile(r"(?=\S*\d)[A-Z0-9]+(?:[-_./#:][A-Z0-9]+)*")
+# Where a text breaks into sentences: after a full stop, question or
+# exclamation mark followed by a space, after an ideographic one, and at
+# line breaks.
+_SENTENCE_BREAK = re.compile(r"(?<=[.!?])\s+|(?<=[\u3002\uff01\uff1f])|\n+")
+
+_SCRIPTS: Dict[str, re.Pattern] = {
+    "Latin": re.compile(r"[A-Za-z\u00c0-\u024f\u1e00-\u1eff\uff21-\uff5a]"),
+    "Han": re.compile(r"[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]"),
+    "Hiragana": re.compile(r"[\u3040-\u309f]"),
+    "Katakana": re.compile(r"[\u30a0-\u30ff\u31f0-\u31ff\uff66-\uff9f]"),
+    "Hangul": re.compile(r"[\u1100-\u11ff\u3130-\u318f\uac00-\ud7af]"),
+    "Cyrillic": re.compile(r"[\u0400-\u052f]"),
+    "Greek": re.compile(r"[\u0370-\u03ff\u1f00-\u1fff]"),
+    "Arabic": re.compile(r"[\u0600-\u06ff\u0750-\u077f\ufb50-\ufdff]"),
+    "Hebrew": re.compile(r"[\u0590-\u05ff]"),
+    "Thai": re.compile(r"[\u0e00-\u0e7f]"),
+    "Devanagari": re.compile(r"[\u0900-\u097f]"),
+}
+
+# Language names, as passed to translate(), and the scripts they are
+# written in. A name matches if it contains the key, e.g. "Simplified
+# Chinese" matches "chinese".
+LANGUAGE_SCRIPTS: Dict[str, FrozenSet[str]] = {
+    **dict.fromkeys(("chinese", "mandarin", "cantonese"), frozenset({"Han"})),
+    "japanese": frozenset({"Han", "Hiragana", "Katakana"}),
+    "korean": frozenset({"Hangul"}),
+    **dict.fromkeys(
+        ("russian", "ukrainian", "bulgarian", "belarusian", "kazakh"),
+        frozenset({"Cyrillic"}),
+    ),
+    "greek": frozenset({"Greek"}),
+    **dict.fromkeys(
+        ("arabic", "persian", "farsi", "urdu"), frozenset({"Arabic"})
+    ),
+    **dict.fromkeys(("hebrew", "yiddish"), frozenset({"Hebrew"})),
+    "thai": frozenset({"Thai"}),
+    **dict.fromkeys(
+        ("hindi", "marathi", "nepali", "sanskrit"),
+        frozenset({"Devanagari"}),
+    ),
+    **dict.fromkeys(
+        (
+            "english",
+            "spanish",
+            "french",
+            "german",
+            "italian",
+            "portuguese",
+            "dutch",
+            "polish",
+            "czech",
+            "swedish",
+            "danish",
+            "norwegian",
+            "finnish",
+            "romanian",
+            "hungarian",
+            "turkish",
+            "vietnamese",
+            "indonesian",
+            "malay",
+            "tagalog",
+        ),
+        frozenset({"Latin"}),
+    ),
+}
+
+
+def language_scripts(language: str) -> FrozenSet[str]:
+    """Return the scripts a language is written in, or an empty set if unknown."""
+    name = language.lower()
+    for key, scripts in LANGUAGE_SCRIPTS.items():
+        if key in name:
+            return scripts
+    return frozenset()
+
+
+def script_counts(text: str) -> Dict[str, int]:
+    """Count the letters of text in each script of _SCRIPTS."""
+    counts = {}
+    for script, pattern in _SCRIPTS.items():
+        n = len(pattern.findall(text))
+        if n:
+            counts[script] = n
+    return counts
+
+
+def _in_target_script(
+    segment: str, source: FrozenSet[str], target: FrozenSet[str]
+) -> bool:
+    # Only scripts the target uses and the source does not tell the
+    # languages apart: a Han-only cell is not "already Japanese" when
+    # translating from Chinese, nor is anything when both use Latin.
+    target_only = target - source
+    if not target_only:
+        return False
+    # A share of the letters is enough within a sentence, e.g. one naming a
+    # product, but a chunk with a few sentences left in the source language
+    # must not pass through: every sentence has to be in the target script.
+    sentences = [
+        sentence
+        for sentence in _SENTENCE_BREAK.split(segment)
+        if _LETTER.search(sentence)
+    ]
+    return bool(sentences) and all(
+        _sentence_in_target_script(sentence, target_only, target)
+        for sentence in sentences
+    )
+
+
+def _sentence_in_target_script(
+    sentence: str, target_only: FrozenSet[str], target: FrozenSet[str]
+) -> bool:
+    counts = script_counts(sentence)
+    letters = sum(counts.values())
+    if not letters or not any(counts.get(s) for s in target_only):
+        return False
+    in_target = sum(counts.get(s, 0) for s in target)
+    return in_target >= TARGET_SCRIPT_SHARE * letters
+
+
+def _classify(
+    segment: str, source: FrozenSet[str], target: FrozenSet[str]
+) -> Optional[str]:
+    text = segment.strip()
+    if not _WORD.search(text):
+        return "empty"
+    if _DATE.fullmatch(text):
+        return "date"
+    if not _LETTER.search(text):
+        return "number"
+    if _URL.fullmatch(text):
+        return "url"
+    if _EMAIL.fullmatch(text):
+        return "email"
+    if _CODE.fullmatch(text):
+        return "code"
+    if _in_target_script(text, source, target):
+        return "target_script"
+    return None
+
+
+def classify(
+    segment: str, source_lang: str, target_lang: str
+) -> Optional[str]:
+    """
+    Decide whether a segment can skip translation.
+
+    Args:
+        segment (str): The text to classify, e.g. a table cell or a chunk.
+        source_lang (str): The source language of the translation.
+        target_lang (str): The target language of the translation.
+
+    Returns:
+        Optional[str]: One of SKIP_REASONS if the segment should be passed
+            through unchanged, or None if it needs translating.
+    """
+    return _classify(
+        segment, language_scripts(source_lang), language_scripts(target_lang)
+    )
+
+
+def classify_batch(
+    segments: Sequence[str], source_lang: str, target_lang: str
+) -> List[Optional[str]]:
+    """
+    Classify many segments at once, as classify() does one.
+
+    The language scripts are looked up once for the whole batch and every
+    distinct segment is classified once.
+    """
+    source = language_scripts(source_lang)
+    target = language_scripts(target_lang)
+    reasons: Dict[str, Optional[str]] = {}
+    for segment in segments:
+        if segment not in reasons:
+            reasons[segment] = _classify(segment, source, target)
+    return [reasons[segment] for segment in segments]
+
+
+class PrefilterStats:
+    """
+    Counts of the segments passed through without translation, by reason.
+
+    Shared across threads, like the retry counters.
+    """
+
+    def __init__(self):
+        self._counts: Dict[str, int] = collections.Counter()
+        self._lock = threading.Lock()
+
+    def count(self, reason: str, n: int = 1) -> None:
+        with self._lock:
+            self._counts[reason] += n
+
+    def counts(self) -> Dict[str, int]:
+        """Return the number of segments skipped for each reason."""
+        with self._lock:
+            return dict(self._counts)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counts.clear()
+
+
+prefilter_stats = PrefilterStats()
+
+
+def skipped_segments(
+    segments: Sequence[str], source_lang: str, target_lang: str
+) -> Tuple[List[Optional[str]], Dict[str, int]]:
+    """
+    Classify segments, and count the skipped ones in prefilter_stats.
+
+    Returns:
+        Tuple[List[Optional[str]], Dict[str, int]]: The skip reason of every
+            segment (None if it needs translating) and the number of
+            segments skipped for each reason.
+    """
+    reasons = classify_batch(segments, source_lang, target_lang)
+    counts = collections.Counter(r for r in reasons if r is not None)
+    for reason, n in counts.items():
+        prefilter_stats.count(reason, n)
+    return reasons, dict(counts)
@@ -0,0 +1,308 @@
+import asyncio
+import contextlib
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import AsyncIterator
+from typing import Dict
+from typing import Iterator
+from typing import Optional
+
+from .tokenizer import count_tokens
+
+
+DEFAULT_RPM = 500  # requests per minute per model
+DEFAULT_TPM = 300_000  # tokens per minute per model
+INITIAL_CONCURRENCY = 8
+MIN_CONCURRENCY = 1
+MAX_CONCURRENCY = 64
+EXPECTED_COMPLETION_TOKENS = 1000  # upper bound on the completion estimate
+LATENCY_BACKOFF_FACTOR = 3.0  # a call this much slower than usual backs off
+LATENCY_DECREASE = 0.9  # multiplicative decrease on a slow call
+THROTTLE_DECREASE = 0.5  # multiplicative decrease on a 429
+POLL_INTERVAL = 0.05  # seconds between checks while waiting for a slot
+
+
+@dataclass
+class ModelLimits:
+    """
+    Provider rate limits for one model.
+
+    Attributes:
+        rpm (int): Requests per minute.
+        tpm (int): Tokens (prompt plus completion) per minute.
+    """
+
+    rpm: int = DEFAULT_RPM
+    tpm: int = DEFAULT_TPM
+
+
+class TokenBucket:
+    """A bucket refilled continuously at capacity per minute."""
+
+    def __init__(self, capacity: float, now: float):
+        self.capacity = capacity
+        self.level = capacity
+        self.updated = now
+
+    def refill(self, now: float) -> None:
+        rate = self.capacity / 60
+        self.level = min(
+            self.capacity, self.level + (now - self.updated) * rate
+        )
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until amount can be taken. Oversized requests wait for a full bucket."""
+        missing = min(amount, self.capacity) - self.level
+        return max(0.0, missing / (self.capacity / 60))
+
+
+class ModelState:
+    """
+    Buckets and AIMD concurrency for one model.
+
+    Concurrency grows by roughly one slot per window of successful calls,
+    shrinks by THROTTLE_DECREASE on a 429, and by LATENCY_DECREASE when a
+    call is much slower than the smoothed latency. Calls that fail in any
+    other way, or are cancelled, leave it unchanged.
+    """
+
+    def __init__(self, limits: ModelLimits, now: float):
+        self.limits = limits
+        self.requests = TokenBucket(limits.rpm, now)
+        self.tokens = TokenBucket(limits.tpm, now)
+        self.concurrency = float(INITIAL_CONCURRENCY)
+        self.in_flight = 0
+        self.latency: Optional[float] = None  # EWMA of successful calls
+        self.throttled = 0
+        self.completed = 0
+        self.failed = 0
+
+    def try_acquire(self, cost: int, now: float) -> float:
+        """
+        Take a slot, a request and cost tokens if all are available.
+
+        Returns:
+            float: 0 if the slot was taken, otherwise seconds to wait.
+        """
+        if self.in_flight >= int(self.concurrency):
+            return POLL_INTERVAL
+        self.requests.refill(now)
+        self.tokens.refill(now)
+        wait = max(self.requests.wait_time(1), self.tokens.wait_time(cost))
+        if wait > 0:
+            return wait
+        self.requests.level -= 1
+        self.tokens.level -= cost
+        self.in_flight += 1
+        return 0.0
+
+    def release(
+        self,
+        cost: int,
+        used_tokens: Optional[int],
+        latency: float,
+        throttled: bool,
+        failed: bool = False,
+    ) -> None:
+        """
+        Give back a slot and settle its token estimate.
+
+        Args:
+            cost (int): The tokens taken when the slot was acquired.
+            used_tokens (Optional[int]): The tokens actually billed, if known.
+            latency (float): Seconds the call took.
+            throttled (bool): Whether the call was rejected with a 429.
+            failed (bool): Whether the call raised anything else or was
+                cancelled. Its unbilled estimate is refunded, and it neither
+                counts as completed nor grows concurrency.
+        """
+        self.in_flight -= 1
+        if used_tokens is None and failed:
+            used_tokens = 0
+        if used_tokens is not None:
+            # Settle the estimate against the tokens actually billed.
+            self.tokens.level = min(
+                self.tokens.capacity,
+                self.tokens.level + cost - used_tokens,
+            )
+
+        if failed:
+            self.failed += 1
+            return
+
+        if throttled:
+            self.throttled += 1
+            self.concurrency = max(
+                MIN_CONCURRENCY, self.concurrency * THROTTLE_DECREASE
+            )
+            return
+
+        self.completed += 1
+        if (
+            self.latency is not None
+            and latency > self.latency * LATENCY_BACKOFF_FACTOR
+        ):
+            self.concurrency = max(
+                MIN_CONCURRENCY, self.concurrency * LATENCY_DECREASE
+            )
+        else:
+            self.concurrency = min(
+                MAX_CONCURRENCY, self.concurrency + 1 / self.concurrency
+            )
+        self.latency = (
+            latency
+            if self.latency is None
+            else 0.8 * self.latency + 0.2 * latency
+        )
+
+
+class Permit:
+    """A granted request slot; set used_tokens once the usage is known."""
+
+    def __init__(self, model: str, cost: int):
+        self.model = model
+        self.cost = cost
+        self.used_tokens: Optional[int] = None
+        self.started = time.monotonic()
+
+
+def _is_throttle(exc: BaseException) -> bool:
+    return getattr(exc, "status_code", None) == 429
+
+
+class RateLimiter:
+    """
+    Process-wide limiter for LLM requests, shared across threads and loops.
+
+    Each model has requests-per-minute and tokens-per-minute token buckets
+    and an adaptive in-flight limit. Callers estimate a request's cost
+    before sending it and report the outcome afterwards.
+
+    Args:
+        limits (Optional[Dict[str, ModelLimits]]): Limits per model name.
+        default_limits (Optional[ModelLimits]): Limits for any other model.
+    """
+
+    def __init__(
+        self,
+        limits: Optional[Dict[str, ModelLimits]] = None,
+        default_limits: Optional[ModelLimits] = None,
+    ):
+        self.limits = dict(limits or {})
+        self.default_limits = default_limits or ModelLimits()
+        self._models: Dict[str, ModelState] = {}
+        self._lock = threading.Lock()
+
+    def _state(self, model: str) -> ModelState:
+        state = self._models.get(model)
+        if state is None:
+            limits = self.limits.get(model, self.default_limits)
+            state = self._models[model] = ModelState(limits, time.monotonic())
+        return state
+
+    @staticmethod
+    def estimate_tokens(system_message: str, prompt: str) -> int:
+        """Estimate prompt plus completion tokens for one chat request."""
+        prompt_tokens = count_tokens(system_message) + count_tokens(prompt)
+        return prompt_tokens + min(prompt_tokens, EXPECTED_COMPLETION_TOKENS)
+
+    def _try_acquire(self, model: str, cost: int) -> float:
+        with self._lock:
+            return self._state(model).try_acquire(cost, time.monotonic())
+
+    def _release(
+        self,
+        permit: Permit,
+        exc: Optional[BaseException] = None,
+    ) -> None:
+        throttled = exc is not None and _is_throttle(exc)
+        with self._lock:
+            self._state(permit.model).release(
+                permit.cost,
+                permit.used_tokens,
+                time.monotonic() - permit.started,
+                throttled,
+                failed=exc is not None and not throttled,
+            )
+
+    @contextlib.contextmanager
+    def slot(self, model: str, cost: int) -> Iterator[Permit]:
+        """Block until a request of cost tokens may be sent to model."""
+        wait = self._try_acquire(model, cost)
+        while wait > 0:
+            time.sleep(wait)
+            wait = self._try_acquire(model, cost)
+
+        permit = Permit(model, cost)
+        try:
+            yield permit
+        except BaseException as exc:
+            # Errors and cancellations, hedges included, are not successes.
+            self._release(permit, exc)
+            raise
+        self._release(permit)
+
+    @contextlib.asynccontextmanager
+    async def slot_async(self, model: str, cost: int) -> AsyncIterator[Permit]:
+        """Like slot(), but waits without blocking the event loop."""
+        wait = self._try_acquire(model, cost)
+        while wait > 0:
+            await asyncio.sleep(wait)
+            wait = self._try_acquire(model, cost)
+
+        permit = Permit(model, cost)
+        try:
+            yield permit
+        except BaseException as exc:
+            # Errors and cancellations, hedges included, are not successes.
+            self._release(permit, exc)
+            raise
+        self._release(permit)
+
+    def stats(self) -> Dict[str, dict]:
+        """Return the current concurrency and counters of every model."""
+        with self._lock:
+            return {
+                model: {
+                    "concurrency": state.concurrency,
+                    "in_flight": state.in_flight,
+                    "completed": state.completed,
+                    "throttled": state.throttled,
+                    "failed": state.failed,
+                    "latency": state.latency,
+                }
+                for model, state in self._models.items()
+            }
+
+
+_rate_limiter: Optional[RateLimiter] = None
+_rate_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> RateLimiter:
+    """
+    Return the limiter shared by every translation in this process.
+
+    Default limits come from the OPENAI_RPM_LIMIT and OPENAI_TPM_LIMIT
+    environment variables.
+    """
+    global _rate_limiter
+    with _rate_limiter_lock:
+        if _rate_limiter is None:
+            _rate_limiter = RateLimiter(
+                default_limits=ModelLimits(
+                    rpm=int(os.getenv("OPENAI_RPM_LIMIT", DEFAULT_RPM)),
+                    tpm=int(os.getenv("OPENAI_TPM_LIMIT", DEFAULT_TPM)),
+                )
+            )
+        return _rate_limiter
+
+
+def set_rate_limiter(rate_limiter: RateLimiter) -> None:
+    """Replace the process-wide limiter, e.g. with per-model limits."""
+    global _rate_limiter
+    with _rate_limiter_lock:
+        _rate_limiter = rate_limiter
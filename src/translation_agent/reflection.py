@@ -0,0 +1,161 @@
+import json
+from dataclasses import dataclass
+from typing import List
+from typing import Optional
+
+
+SEVERITIES = ("cosmetic", "minor", "major", "critical")
+MIN_ACTIONABLE_SEVERITY = "minor"
+
+# Closing instructions of the free-text reflection prompts.
+SUGGESTIONS_INSTRUCTIONS = """Write a list of specific, helpful and constructive suggestions for improving the translation.
+Each suggestion should address one specific part of the translation.
+Output only the suggestions and nothing else."""
+
+VERDICT_INSTRUCTIONS = """List every specific problem you find, each addressing one specific part of the translation, as a JSON object of the form:
+{"issues": [{"severity": "...", "category": "...", "issue": "...", "suggestion": "..."}]}
+
+"severity" is one of "cosmetic" (a matter of preference, the translation is fine as is), "minor", "major" or "critical".
+"category" is one of "accuracy", "fluency", "style" or "terminology".
+If the translation needs no changes, output {"issues": []}.
+Output only the JSON object and nothing else."""
+
+REVISION_INSTRUCTIONS = """Write a list of specific, helpful and constructive suggestions for improving the translation, each addressing one specific part of the translation.
+Then edit the translation, taking your suggestions into account, and output both as a JSON object of the form:
+{"critique": "<your suggestions>", "translation": "<the edited translation>"}
+
+The "translation" value must contain only the new translation and nothing else.
+Output only the JSON object and nothing else."""
+
+
+@dataclass(frozen=True)
+class Issue:
+    """
+    One problem found by a structured reflection.
+
+    Attributes:
+        severity (str): One of SEVERITIES.
+        category (str): "accuracy", "fluency", "style" or "terminology".
+        issue (str): What is wrong with the translation.
+        suggestion (str): How to fix it.
+    """
+
+    severity: str
+    category: str = ""
+    issue: str = ""
+    suggestion: str = ""
+
+
+@dataclass(frozen=True)
+class Reflection:
+    """The issues a structured reflection found in a translation."""
+
+    issues: List[Issue]
+
+    def actionable(self, min_severity: str = MIN_ACTIONABLE_SEVERITY) -> bool:
+        """Whether any issue is severe enough to run the improve stage."""
+        threshold = SEVERITIES.index(min_severity)
+        return any(
+            SEVERITIES.index(issue.severity) >= threshold
+            for issue in self.issues
+        )
+
+    def as_suggestions(self) -> str:
+        """Render the issues as the expert suggestions of the improve prompt."""
+        return "\n".join(
+            f"- [{issue.severity}] {issue.issue} {issue.suggestion}".rstrip()
+            for issue in self.issues
+        )
+
+
+@dataclass(frozen=True)
+class Revision:
+    """
+    The reply to a revision_prompt: a critique and the translation it led to.
+
+    Attributes:
+        critique (str): The suggestions, kept for audit.
+        translation (str): The edited translation.
+    """
+
+    critique: str
+    translation: str
+
+
+def _replace_instructions(prompt: str, instructions: str) -> str:
+    if not prompt.endswith(SUGGESTIONS_INSTRUCTIONS):
+        raise ValueError("Not a reflection prompt")
+    return prompt[: -len(SUGGESTIONS_INSTRUCTIONS)] + instructions
+
+
+def verdict_prompt(prompt: str) -> str:
+    """Ask a reflection prompt for a JSON list of issues instead of free text."""
+    return _replace_instructions(prompt, VERDICT_INSTRUCTIONS)
+
+
+def revision_prompt(prompt: str) -> str:
+    """Ask a reflection prompt for the critique and the edited translation at once."""
+    return _replace_instructions(prompt, REVISION_INSTRUCTIONS)
+
+
+def parse_revision(text: str) -> Optional[Revision]:
+    """
+    Parse the reply to a revision_prompt.
+
+    Args:
+        text (str): The JSON reply of the model.
+
+    Returns:
+        Optional[Revision]: The critique and translation, or None if the reply
+            is not a JSON object with a non-empty "translation" string.
+    """
+    try:
+        data = json.loads(text)
+    except (TypeError, ValueError):
+        return None
+    if not isinstance(data, dict):
+        return None
+    translation = data.get("translation")
+    if not isinstance(translation, str) or not translation.strip():
+        return None
+    critique = data.get("critique", "")
+    if not isinstance(critique, str):
+        critique = json.dumps(critique, ensure_ascii=False)
+    return Revision(critique, translation)
+
+
+def parse_reflection(text: str) -> Optional[Reflection]:
+    """
+    Parse the reply to a verdict_prompt.
+
+    Unknown severities count as "major", so a malformed issue is never
+    silently dropped.
+
+    Args:
+        text (str): The JSON reply of the model.
+
+    Returns:
+        Optional[Reflection]: The issues found, or None if the reply is not
+            a JSON object with an "issues" list.
+    """
+    try:
+        data = json.loads(text)
+    except (TypeError, ValueError):
+        return None
+    if not isinstance(data, dict) or not isinstance(data.get("issues"), list):
+        return None
+
+    issues = []
+    for item in data["issues"]:
+        if not isinstance(item, dict):
+            item = {"issue": str(item)}
+        severity = str(item.get("severity", "")).lower()
+        issues.append(
+            Issue(
+                severity=severity if severity in SEVERITIES else "major",
+                category=str(item.get("category", "")),
+                issue=str(item.get("issue", "")),
+                suggestion=str(item.get("suggestion", "")),
+            )
+        )
+    return Reflection(issues)
@@ -0,0 +1,366 @@
+import asyncio
+import collections
+import concurrent.futures
+import os
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any
+from typing import Awaitable
+from typing import Callable
+from typing import Deque
+from typing import Dict
+from typing import Iterable
+from typing import Optional
+from typing import TypeVar
+
+import openai
+
+
+T = TypeVar("T")
+
+RETRYABLE_STATUS_CODES = (408, 409, 429)  # plus every 5xx
+LATENCY_WINDOW = 256  # successful calls kept per model for the quantile
+
+# asyncio.wait_for() raises asyncio.TimeoutError, which is only the builtin
+# TimeoutError from Python 3.11 on.
+TIMEOUT_ERRORS = (openai.APITimeoutError, TimeoutError, asyncio.TimeoutError)
+
+
+@dataclass
+class RetryPolicy:
+    """
+    How get_completion retries, times out and hedges a request.
+
+    Attributes:
+        max_attempts (int): Attempts per call, including the first one.
+        base_delay (float): Backoff before the first retry, in seconds.
+        max_delay (float): Upper bound on a single backoff, in seconds.
+        timeout (float): Deadline for one attempt, in seconds.
+        deadline (Optional[float]): Deadline for the whole call including
+            retries, in seconds. None means only max_attempts applies.
+        hedge (bool): Whether to send a duplicate request when an attempt
+            runs past the hedge_quantile latency of its model.
+        hedge_quantile (float): Latency quantile that triggers a hedge.
+        hedge_min_samples (int): Successful calls needed before hedging.
+    """
+
+    max_attempts: int = 4
+    base_delay: float = 0.5
+    max_delay: float = 30.0
+    timeout: float = 120.0
+    deadline: Optional[float] = None
+    hedge: bool = False
+    hedge_quantile: float = 0.95
+    hedge_min_samples: int = 20
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """Return True for timeouts, connection errors, 408/409/429 and 5xx."""
+    if isinstance(exc, (openai.APIConnectionError, *TIMEOUT_ERRORS)):
+        return True
+    status_code = getattr(exc, "status_code", None)
+    return isinstance(status_code, int) and (
+        status_code in RETRYABLE_STATUS_CODES or status_code >= 500
+    )
+
+
+def _retry_after(exc: BaseException) -> Optional[float]:
+    """Return the delay a 429 or 503 response asked for, if any."""
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(
+    attempt: int, policy: RetryPolicy, exc: Optional[BaseException] = None
+) -> float:
+    """
+    Return the seconds to wait before retry number attempt (from 1).
+
+    Uses exponential backoff with full jitter, so concurrent callers that
+    failed together do not retry together, and honours a server-provided
+    Retry-After header.
+    """
+    ceiling = min(policy.max_delay, policy.base_delay * 2 ** (attempt - 1))
+    delay = random.uniform(0, ceiling)
+    retry_after = _retry_after(exc) if exc is not None else None
+    if retry_after is not None:
+        delay = max(delay, min(retry_after, policy.max_delay))
+    return delay
+
+
+class LatencyTracker:
+    """
+    Rolling latencies of successful calls per model, plus retry counters.
+
+    Shared across threads; the hedge delay of a model is a quantile of its
+    last LATENCY_WINDOW latencies.
+    """
+
+    def __init__(self, window: int = LATENCY_WINDOW):
+        self.window = window
+        self._latencies: Dict[str, Deque[float]] = {}
+        self._counts: Dict[str, int] = collections.Counter()
+        self._lock = threading.Lock()
+
+    def record(self, model: str, latency: float) -> None:
+        with self._lock:
+            latencies = self._latencies.get(model)
+            if latencies is None:
+                latencies = self._latencies[model] = collections.deque(
+                    maxlen=self.window
+                )
+            latencies.append(latency)
+
+    def count(self, event: str) -> None:
+        with self._lock:
+            self._counts[event] += 1
+
+    def quantile(
+        self, model: str, q: float, min_samples: int = 1
+    ) -> Optional[float]:
+        """Return the q-quantile latency of model, or None if too few calls."""
+        with self._lock:
+            latencies = sorted(self._latencies.get(model, ()))
+        if len(latencies) < max(1, min_samples):
+            return None
+        return latencies[min(len(latencies) - 1, int(q * len(latencies)))]
+
+    def hedge_delay(self, model: str, policy: RetryPolicy) -> Optional[float]:
+        """Return how long to wait before hedging a call, or None to not hedge."""
+        if not policy.hedge:
+            return None
+        return self.quantile(
+            model, policy.hedge_quantile, policy.hedge_min_samples
+        )
+
+    def stats(self) -> Dict[str, int]:
+        """Return the retry, timeout, hedge and hedge win counters."""
+        with self._lock:
+            return dict(self._counts)
+
+
+def _retry_policy_from_env() -> RetryPolicy:
+    """Build the policy configured by TRANSLATION_* environment variables."""
+    deadline = os.getenv("TRANSLATION_CALL_DEADLINE")
+    return RetryPolicy(
+        max_attempts=int(os.getenv("TRANSLATION_MAX_ATTEMPTS", 4)),
+        timeout=float(os.getenv("TRANSLATION_REQUEST_TIMEOUT", 120)),
+        deadline=float(deadline) if deadline else None,
+        hedge=os.getenv("TRANSLATION_HEDGE_REQUESTS", "false").lower()
+        == "true",
+    )
+
+
+retry_policy = _retry_policy_from_env()
+latency_tracker = LatencyTracker()
+
+
+def set_retry_policy(policy: RetryPolicy) -> None:
+    """
+    Set the policy used by get_completion and get_completion_async.
+
+    Args:
+        policy (RetryPolicy): The retry, timeout and hedging settings.
+    """
+    global retry_policy
+    retry_policy = policy
+
+
+def _next_delay(
+    attempt: int,
+    policy: RetryPolicy,
+    exc: BaseException,
+    started: float,
+) -> Optional[float]:
+    """Return the backoff before the next attempt, or None to give up."""
+    if attempt >= policy.max_attempts or not is_retryable(exc):
+        return None
+    delay = backoff_delay(attempt, policy, exc)
+    if (
+        policy.deadline is not None
+        and time.monotonic() - started + delay >= policy.deadline
+    ):
+        return None
+    return delay
+
+
+def _attempt_timeout(policy: RetryPolicy, started: float) -> float:
+    """Return the deadline of the next attempt, bounded by the call's."""
+    if policy.deadline is None:
+        return policy.timeout
+    remaining = policy.deadline - (time.monotonic() - started)
+    return max(0.0, min(policy.timeout, remaining))
+
+
+def _first_success(done: Iterable[Any], hedge: Any) -> Optional[Any]:
+    """Return an attempt in done that succeeded, if any, counting hedge wins."""
+    # Both attempts may finish at once, the failed one first.
+    for future in done:
+        if future.exception() is None:
+            if future is hedge:
+                latency_tracker.count("hedge_wins")
+            return future
+    return None
+
+
+def _hedged(
+    attempt: Callable[[float], T],
+    timeout: float,
+    hedge_after: float,
+) -> T:
+    """Run attempt, and a duplicate if it is still running after hedge_after."""
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=2)
+    try:
+        primary = executor.submit(attempt, timeout)
+        done, _ = concurrent.futures.wait([primary], timeout=hedge_after)
+        if done:
+            return primary.result()
+
+        latency_tracker.count("hedges")
+        hedge = executor.submit(attempt, timeout)
+        pending = {primary, hedge}
+        while True:
+            done, pending = concurrent.futures.wait(
+                pending, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            winner = _first_success(done, hedge)
+            if winner is not None:
+                return winner.result()
+            if not pending:
+                # Both attempts failed.
+                return primary.result()
+    finally:
+        # Threads cannot be interrupted; the loser finishes within its
+        # timeout and its result is dropped.
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def call_with_retry(
+    attempt: Callable[[float], T],
+    model: str,
+    policy: Optional[RetryPolicy] = None,
+) -> T:
+    """
+    Call attempt(timeout) until it succeeds or the policy gives up.
+
+    Transient errors are retried with jittered exponential backoff. With
+    hedging enabled, an attempt that runs past the model's hedge quantile
+    is raced against a duplicate and the first success wins.
+
+    Args:
+        attempt (Callable[[float], T]): Sends one request with the given timeout in seconds.
+        model (str): The model name, used for latency tracking.
+        policy (Optional[RetryPolicy]): Defaults to the process-wide policy.
+
+    Returns:
+        T: The result of the first successful attempt.
+    """
+    policy = policy or retry_policy
+    started = time.monotonic()
+    attempt_number = 0
+    while True:
+        attempt_number += 1
+        timeout = _attempt_timeout(policy, started)
+        hedge_after = latency_tracker.hedge_delay(model, policy)
+        attempt_started = time.monotonic()
+        try:
+            if hedge_after is None:
+                result = attempt(timeout)
+            else:
+                result = _hedged(attempt, timeout, hedge_after)
+        except Exception as exc:
+            if isinstance(exc, TIMEOUT_ERRORS):
+                latency_tracker.count("timeouts")
+            delay = _next_delay(attempt_number, policy, exc, started)
+            if delay is None:
+                raise
+            latency_tracker.count("retries")
+            time.sleep(delay)
+            continue
+        latency_tracker.record(model, time.monotonic() - attempt_started)
+        return result
+
+
+async def _attempt_async(
+    attempt: Callable[[float], Awaitable[T]], timeout: float
+) -> T:
+    # The attempt is only created once the task runs, so cancelling a task
+    # that never started leaves no un-awaited coroutine behind.
+    return await asyncio.wait_for(attempt(timeout), timeout)
+
+
+async def _hedged_async(
+    attempt: Callable[[float], Awaitable[T]],
+    timeout: float,
+    hedge_after: Optional[float],
+) -> T:
+    """Await attempt under timeout, hedging it after hedge_after seconds."""
+    primary = asyncio.ensure_future(_attempt_async(attempt, timeout))
+    if hedge_after is None:
+        return await primary
+
+    hedge: Optional[asyncio.Future] = None
+    pending = {primary}
+    try:
+        done, pending = await asyncio.wait(pending, timeout=hedge_after)
+        if done:
+            return primary.result()
+
+        latency_tracker.count("hedges")
+        hedge = asyncio.ensure_future(_attempt_async(attempt, timeout))
+        pending = {primary, hedge}
+        while True:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            winner = _first_success(done, hedge)
+            if winner is not None:
+                return winner.result()
+            if not pending:
+                # Both attempts failed.
+                return primary.result()
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+async def call_with_retry_async(
+    attempt: Callable[[float], Awaitable[Any]],
+    model: str,
+    policy: Optional[RetryPolicy] = None,
+) -> Any:
+    """
+    Like call_with_retry, for an attempt that returns an awaitable.
+
+    Each attempt is cancelled at its deadline, and a losing hedge is
+    cancelled as soon as the other request succeeds.
+    """
+    policy = policy or retry_policy
+    started = time.monotonic()
+    attempt_number = 0
+    while True:
+        attempt_number += 1
+        timeout = _attempt_timeout(policy, started)
+        hedge_after = latency_tracker.hedge_delay(model, policy)
+        attempt_started = time.monotonic()
+        try:
+            result = await _hedged_async(attempt, timeout, hedge_after)
+        except Exception as exc:
+            if isinstance(exc, TIMEOUT_ERRORS):
+                latency_tracker.count("timeouts")
+            delay = _next_delay(attempt_number, policy, exc, started)
+            if delay is None:
+                raise
+            latency_tracker.count("retries")
+            await asyncio.sleep(delay)
+            continue
+        latency_tracker.record(model, time.monotonic() - attempt_started)
+        return result
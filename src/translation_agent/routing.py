@@ -0,0 +1,192 @@
+"""
+Per-stage model routing, and escalation of drafts that fail basic checks.
+
+The initial translation and the reflection can usually run on a fast,
+cheap model, with a strong model kept for the improve stage. A draft from
+the cheap model that is structurally broken (empty, wrong number of
+lines, leftover prompt tags, ...) is translated again with the escalation
+model rather than handed to the later stages.
+"""
+
+import os
+import re
+import threading
+from dataclasses import dataclass
+from dataclasses import field
+from typing import List
+from typing import Optional
+
+
+DEFAULT_MODEL = "gpt-4-turbo"  # the default model of get_completion
+STAGES = ("initial", "reflect", "improve", "escalation")
+# Stages reported by the call handlers that run with another stage's model.
+STAGE_ALIASES = {
+    "fused": "improve",
+    "adapt": "improve",
+    "escalate": "escalation",
+}
+
+# Character length of a draft relative to its source text outside which it
+# is considered broken. Wide, since scripts differ a lot in density.
+MIN_LENGTH_RATIO = 0.15
+MAX_LENGTH_RATIO = 6.0
+_PROMPT_TAGS = re.compile(
+    r"</?(?:TRANSLATE_THIS|SOURCE_TEXT|TRANSLATION|SEGMENTS|EXPERT_SUGGESTIONS)>"
+)
+
+
+@dataclass(frozen=True)
+class StageModel:
+    """
+    The model and temperature of one stage; None keeps get_completion's default.
+
+    Attributes:
+        model (Optional[str]): The model name.
+        temperature (Optional[float]): The sampling temperature.
+    """
+
+    model: Optional[str] = None
+    temperature: Optional[float] = None
+
+    def completion_kwargs(self) -> dict:
+        """Return the get_completion keyword arguments that are set."""
+        kwargs = {}
+        if self.model is not None:
+            kwargs["model"] = self.model
+        if self.temperature is not None:
+            kwargs["temperature"] = self.temperature
+        return kwargs
+
+
+@dataclass(frozen=True)
+class ModelRouting:
+    """
+    Which model and temperature each stage of the workflow uses.
+
+    Attributes:
+        initial (StageModel): The first draft of every chunk.
+        reflect (StageModel): The critique of the draft.
+        improve (StageModel): The edit of the draft, also used by fused
+            reflect-and-improve calls and translation memory adaptations.
+        escalation (StageModel): Redoes a draft that fails draft_issues().
+            Escalation is off unless its model is set and differs from the
+            initial model.
+    """
+
+    initial: StageModel = field(default_factory=StageModel)
+    reflect: StageModel = field(default_factory=StageModel)
+    improve: StageModel = field(default_factory=StageModel)
+    escalation: StageModel = field(default_factory=StageModel)
+
+    @classmethod
+    def tiered(
+        cls, draft_model: str, edit_model: str, escalate: bool = True
+    ) -> "ModelRouting":
+        """Draft and reflect with draft_model, improve with edit_model."""
+        return cls(
+            initial=StageModel(draft_model),
+            reflect=StageModel(draft_model),
+            improve=StageModel(edit_model),
+            escalation=StageModel(edit_model) if escalate else StageModel(),
+        )
+
+    def for_stage(self, stage: str) -> StageModel:
+        """Return the StageModel of a stage, as named by the call handlers."""
+        stage = STAGE_ALIASES.get(stage, stage)
+        if stage not in STAGES:
+            return StageModel()
+        return getattr(self, stage)
+
+    def completion_kwargs(self, stage: str) -> dict:
+        """Return the get_completion keyword arguments of a stage."""
+        return self.for_stage(stage).completion_kwargs()
+
+    def model(self, stage: str) -> str:
+        """Return the name of the model a stage calls."""
+        return self.for_stage(stage).model or DEFAULT_MODEL
+
+    @property
+    def escalates(self) -> bool:
+        return (
+            self.escalation.model is not None
+            and self.escalation.model != self.model("initial")
+        )
+
+
+def draft_issues(source_text: str, translation: str) -> List[str]:
+    """
+    Check a draft translation for structural problems.
+
+    These checks need no model and do not judge the quality of the
+    translation, only whether it has the shape of one.
+
+    Args:
+        source_text (str): The text that was translated.
+        translation (str): The draft translation.
+
+    Returns:
+        List[str]: The problems found: "empty", "tags" (prompt tags left in
+            the reply), "lines" (a different number of non-empty lines),
+            "length" (implausibly short or long) and "untranslated" (a copy
+            of the source). Empty if the draft looks sound.
+    """
+    source = source_text.strip()
+    draft = translation.strip()
+    if not source:
+        return []
+    if not draft:
+        return ["empty"]
+
+    issues = []
+    if _PROMPT_TAGS.search(draft) and not _PROMPT_TAGS.search(source):
+        issues.append("tags")
+    source_lines = [line for line in source.splitlines() if line.strip()]
+    draft_lines = [line for line in draft.splitlines() if line.strip()]
+    if len(source_lines) > 1 and len(draft_lines) != len(source_lines):
+        issues.append("lines")
+    ratio = len(draft) / len(source)
+    if len(source) >= 20 and not (
+        MIN_LENGTH_RATIO <= ratio <= MAX_LENGTH_RATIO
+    ):
+        issues.append("length")
+    if draft == source and len(source.split()) >= 3:
+        issues.append("untranslated")
+    return issues
+
+
+def _stage_from_env(stage: str) -> StageModel:
+    temperature = os.getenv(f"TRANSLATION_{stage.upper()}_TEMPERATURE")
+    return StageModel(
+        model=os.getenv(f"TRANSLATION_{stage.upper()}_MODEL") or None,
+        temperature=float(temperature) if temperature else None,
+    )
+
+
+def _routing_from_env() -> ModelRouting:
+    """Build the routing configured by TRANSLATION_* environment variables."""
+    return ModelRouting(**{stage: _stage_from_env(stage) for stage in STAGES})
+
+
+_model_routing = _routing_from_env()
+_model_routing_lock = threading.Lock()
+
+
+def get_model_routing() -> ModelRouting:
+    """Return the routing used when a translation does not pass its own."""
+    with _model_routing_lock:
+        return _model_routing
+
+
+def set_model_routing(routing: Optional[ModelRouting]) -> None:
+    """
+    Set the routing used when a translation does not pass its own.
+
+    Args:
+        routing (Optional[ModelRouting]): The routing to use, or None to go
+            back to the one configured by the environment.
+    """
+    global _model_routing
+    with _model_routing_lock:
+        _model_routing = (
+            routing if routing is not None else _routing_from_env()
+        )
@@ -0,0 +1,98 @@
+"""
+Segment id markers, which carry each segment's id through a translation.
+
+join_with_ids() starts the line of every segment of a text to translate
+with "[[id]] ", and split_by_ids() hands each segment its translation back
+by marker, however the model breaks or reorders the lines. The workflow
+asks the model to keep the markers (ID_INSTRUCTIONS), and the translation
+memory stores segments without them.
+"""
+
+import re
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Sequence
+
+
+# The id marker join_with_ids() starts each segment's line with, "[[p12]] ".
+_ID_MARKER = re.compile(r"^[ \t]*\[\[([\w.]+)\]\][ \t]?", re.MULTILINE)
+_ANY_MARKER = re.compile(r"\[\[[\w.]+\]\]")
+_PROMPT_TAG = re.compile(r"</?(?:TRANSLATE_THIS|SOURCE_TEXT|TRANSLATION)>")
+
+ID_INSTRUCTIONS = (
+    "Each segment of the text starts a line with an id marker such as"
+    " [[p12]]. Start the translation of each segment with the same marker,"
+    " copied exactly, and keep one marker per segment: do not drop, merge,"
+    " split, reorder or translate the markers."
+)
+
+
+def has_ids(text: str) -> bool:
+    """Whether a text, e.g. a prompt, has an id marker anywhere in it."""
+    return _ANY_MARKER.search(text) is not None
+
+
+def find_ids(text: str) -> List[str]:
+    """The ids of the markers in a text, in order of first appearance."""
+    return list(dict.fromkeys(_ID_MARKER.findall(text)))
+
+
+def join_with_ids(ids: Sequence[str], texts: Sequence[str]) -> str:
+    """
+    Join segments into one text to translate, each behind its id marker.
+
+    Every segment starts a line with "[[id]] ", so split_by_ids() can hand
+    each segment its own translation back however the lines of the
+    translation break.
+    """
+    return "\n".join(f"[[{id_}]] {text}" for id_, text in zip(ids, texts))
+
+
+def split_by_ids(translation: str, ids: Sequence[str]) -> Dict[str, str]:
+    """
+    Recover the translation of every segment of a join_with_ids() text.
+
+    The lines from a marker up to the next one are the translation of the
+    marked segment. Prompt tags echoed by the model, markers of unknown ids
+    and repeated markers are dropped. If the model dropped every marker but
+    kept one line per segment, the lines are matched to ids in order.
+
+    Args:
+        translation (str): The translation of the joined text.
+        ids (Sequence[str]): The ids of the joined segments.
+
+    Returns:
+        Dict[str, str]: The translation of each segment found, by id.
+    """
+    wanted = set(ids)
+    found: Dict[str, List[str]] = {}
+    unmarked: List[str] = []
+    current: Optional[str] = None
+    for line in _PROMPT_TAG.sub("", translation).split("\n"):
+        match = _ID_MARKER.match(line)
+        if match is not None:
+            id_ = match.group(1)
+            current = id_ if id_ in wanted and id_ not in found else None
+            if current is not None:
+                found[current] = []
+            line = line[match.end() :]
+        if not line.strip():
+            continue
+        if current is not None:
+            found[current].append(line.rstrip())
+        elif match is None:
+            unmarked.append(line.strip())
+    if not found and len(unmarked) == len(ids):
+        return dict(zip(ids, unmarked))
+    return {id_: "\n".join(lines) for id_, lines in found.items() if lines}
+
+
+def strip_prompt_tags(text: str) -> str:
+    """Remove the prompt's tags, e.g. <TRANSLATION>, a reply echoes back."""
+    return _PROMPT_TAG.sub("", text).strip("\n")
+
+
+def strip_ids(text: str) -> str:
+    """Remove the id markers of join_with_ids() from a text, e.g. for display."""
+    return _ID_MARKER.sub("", text)
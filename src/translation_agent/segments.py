@@ -0,0 +1,546 @@
+import asyncio
+import json
+import logging
+import re
+from dataclasses import dataclass
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
+
+from . import prefilter
+from . import utils
+from .journal import DocumentJournal
+from .journal import Journal
+from .journal import document_key
+from .memory import TranslationMemory
+from .memory import normalize_segment
+from .routing import ModelRouting
+from .routing import get_model_routing
+from .segment_ids import strip_prompt_tags
+from .tokenizer import encode_batch
+
+
+logger = logging.getLogger(__name__)
+
+PACK_MAX_TOKENS = 1500  # source tokens per packed request
+PACK_MAX_SEGMENTS = 100  # segments per packed request
+
+
+def needs_translation(segment: str) -> bool:
+    """Whether a segment has any word character worth translating."""
+    return bool(re.search(r"\w", segment))
+
+
+@dataclass
+class Deduplicated:
+    """
+    The distinct segments of a sequence, and where each segment occurs.
+
+    Attributes:
+        unique (List[str]): The first occurrence of every distinct segment,
+            in order of first occurrence.
+        index (List[int]): For every segment of the original sequence, the
+            position of its distinct segment in `unique`.
+    """
+
+    unique: List[str]
+    index: List[int]
+
+    @property
+    def ratio(self) -> float:
+        """The share of segments that repeat an earlier one."""
+        if not self.index:
+            return 0.0
+        return 1 - len(self.unique) / len(self.index)
+
+    @property
+    def first(self) -> List[int]:
+        """The position of every distinct segment's first occurrence."""
+        first: Dict[int, int] = {}
+        for position, i in enumerate(self.index):
+            first.setdefault(i, position)
+        return [first[i] for i in range(len(self.unique))]
+
+    def expand(self, translations: Sequence[str]) -> List[str]:
+        """Fan the translations of `unique` back out to every occurrence."""
+        return [translations[i] for i in self.index]
+
+
+def deduplicate(segments: Sequence[str]) -> Deduplicated:
+    """
+    Find the distinct segments of a sequence, comparing normalised segments.
+
+    Args:
+        segments (Sequence[str]): The segments, e.g. paragraphs or cells.
+
+    Returns:
+        Deduplicated: The distinct segments and the index to expand them.
+    """
+    positions: Dict[str, int] = {}
+    unique: List[str] = []
+    index: List[int] = []
+    for segment in segments:
+        key = normalize_segment(segment)
+        if key not in positions:
+            positions[key] = len(unique)
+            unique.append(segment)
+        index.append(positions[key])
+    return Deduplicated(unique, index)
+
+
+def pack_segments(
+    token_counts: Sequence[int],
+    max_tokens: int = PACK_MAX_TOKENS,
+    max_segments: int = PACK_MAX_SEGMENTS,
+) -> List[List[int]]:
+    """
+    Group segments, in order, into packs of at most max_tokens source tokens.
+
+    A segment larger than max_tokens gets a pack of its own.
+
+    Args:
+        token_counts (Sequence[int]): Token count of each segment.
+        max_tokens (int): Token budget of a pack.
+        max_segments (int): Maximum number of segments in a pack.
+
+    Returns:
+        List[List[int]]: The indices of the segments in each pack.
+    """
+    packs: List[List[int]] = []
+    pack: List[int] = []
+    pack_tokens = 0
+    for i, num_tokens in enumerate(token_counts):
+        if pack and (
+            pack_tokens + num_tokens > max_tokens or len(pack) >= max_segments
+        ):
+            packs.append(pack)
+            pack, pack_tokens = [], 0
+        pack.append(i)
+        pack_tokens += num_tokens
+    if pack:
+        packs.append(pack)
+    return packs
+
+
+def _segments_json(**fields: Sequence[str]) -> str:
+    """Serialise parallel lists of segment fields as a JSON list with ids."""
+    names = list(fields)
+    rows = [
+        {"id": str(i), **dict(zip(names, values))}
+        for i, values in enumerate(zip(*fields.values()))
+    ]
+    return json.dumps(rows, ensure_ascii=False, indent=1)
+
+
+def _style_note(target_lang: str, country: str) -> str:
+    if not country:
+        return ""
+    return (
+        f"The final style and tone of the translations should match the "
+        f"style of {target_lang} colloquially spoken in {country}.\n"
+    )
+
+
+def _pack_initial_prompt(
+    source_lang: str, target_lang: str, country: str, segments: List[str]
+) -> Tuple[str, str]:
+    """Build the (system_message, prompt) pair translating a pack."""
+
+    system_message = f"You are an expert linguist, specializing in translation from {source_lang} to {target_lang}."
+
+    prompt = f"""Translate the "text" of every segment below from {source_lang} to {target_lang}. \
+The segments are short texts, such as table cells and captions, from the same document; translate each one on its own.
+{_style_note(target_lang, country)}
+<SEGMENTS>
+{_segments_json(text=segments)}
+</SEGMENTS>
+
+Reply with a JSON object of the form {{"translations": [{{"id": "...", "text": "..."}}]}}, \
+with exactly one translation for every segment id and nothing else."""
+
+    return system_message, prompt
+
+
+def _pack_reflect_prompt(
+    source_lang: str,
+    target_lang: str,
+    country: str,
+    segments: List[str],
+    translations_1: List[str],
+) -> Tuple[str, str]:
+    """Build the (system_message, prompt) pair reflecting on a pack."""
+
+    system_message = f"You are an expert linguist specializing in translation from {source_lang} to {target_lang}. \
+You will be provided with source texts and their translations and your goal is to improve the translations."
+
+    prompt = f"""Your task is to carefully read a list of short source texts and their translations from {source_lang} to {target_lang}, \
+and then give constructive criticism and helpful suggestions to improve the translations.
+{_style_note(target_lang, country)}
+<SEGMENTS>
+{_segments_json(source=segments, translation=translations_1)}
+</SEGMENTS>
+
+When writing suggestions, pay attention to whether there are ways to improve each translation's
+(i) accuracy (by correcting errors of addition, mistranslation, omission, or untranslated text),
+(ii) fluency (by applying {target_lang} grammar, spelling and punctuation rules),
+(iii) style (by ensuring the translations reflect the style of the source texts),
+(iv) terminology (by ensuring terminology use is consistent across segments and reflects the source text domain).
+
+Write a list of specific, helpful and constructive suggestions, each starting with the id of the segment it addresses.
+Output only the suggestions and nothing else."""
+
+    return system_message, prompt
+
+
+def _pack_improve_prompt(
+    source_lang: str,
+    target_lang: str,
+    segments: List[str],
+    translations_1: List[str],
+    reflection: str,
+) -> Tuple[str, str]:
+    """Build the (system_message, prompt) pair improving a pack."""
+
+    system_message = f"You are an expert linguist, specializing in translation editing from {source_lang} to {target_lang}."
+
+    prompt = f"""Your task is to carefully read, then edit, the translations of a list of short texts from {source_lang} to {target_lang}, \
+taking into account a list of expert suggestions and constructive criticisms.
+
+<SEGMENTS>
+{_segments_json(source=segments, translation=translations_1)}
+</SEGMENTS>
+
+<EXPERT_SUGGESTIONS>
+{reflection}
+</EXPERT_SUGGESTIONS>
+
+Please take into account the expert suggestions when editing the translations, ensuring accuracy, fluency, style and consistent terminology.
+
+Reply with a JSON object of the form {{"translations": [{{"id": "...", "text": "..."}}]}}, \
+with exactly one edited translation for every segment id and nothing else."""
+
+    return system_message, prompt
+
+
+def parse_translations(reply: str, num_segments: int) -> Dict[int, str]:
+    """
+    Unpack the translations of a packed reply by segment id.
+
+    Args:
+        reply (str): The JSON reply of the model.
+        num_segments (int): Number of segments in the pack.
+
+    Returns:
+        Dict[int, str]: The translation of every segment the reply has a
+            valid entry for, by position in the pack. Empty if the reply
+            does not parse.
+    """
+    try:
+        data = json.loads(reply)
+    except (TypeError, ValueError):
+        return {}
+    entries = data.get("translations") if isinstance(data, dict) else None
+    if isinstance(entries, dict):
+        entries = [{"id": k, "text": v} for k, v in entries.items()]
+    if not isinstance(entries, list):
+        return {}
+
+    translations = {}
+    for entry in entries:
+        if not isinstance(entry, dict) or not isinstance(
+            entry.get("text"), str
+        ):
+            continue
+        try:
+            i = int(entry.get("id"))
+        except (TypeError, ValueError):
+            continue
+        if 0 <= i < num_segments:
+            translations[i] = entry["text"]
+    return translations
+
+
+async def _translate_pack(
+    source_lang: str,
+    target_lang: str,
+    country: str,
+    segments: List[str],
+    semaphore: asyncio.Semaphore,
+    pack_index: int,
+    routing: Optional[ModelRouting] = None,
+    checkpoint: Optional[DocumentJournal] = None,
+) -> List[Optional[str]]:
+    """
+    Run the initial/reflect/improve stages over one pack.
+
+    Segments the initial reply has no translation for come back as None.
+    Segments missing from the improve reply keep their initial translation.
+    Each stage runs on the model routing picks for it; packs are not
+    escalated, their failed segments fall back to translate() instead.
+    """
+
+    system_message, prompt = _pack_initial_prompt(
+        source_lang, target_lang, country, segments
+    )
+    reply = await utils.limited_completion(
+        semaphore,
+        prompt,
+        system_message,
+        "initial",
+        pack_index,
+        json_mode=True,
+        routing=routing,
+        checkpoint=checkpoint,
+    )
+    initial = parse_translations(reply, len(segments))
+    if not initial:
+        return [None] * len(segments)
+    translated = sorted(initial)
+    sources = [segments[i] for i in translated]
+    translations_1 = [initial[i] for i in translated]
+
+    system_message, prompt = _pack_reflect_prompt(
+        source_lang, target_lang, country, sources, translations_1
+    )
+    reflection = await utils.limited_completion(
+        semaphore,
+        prompt,
+        system_message,
+        "reflect",
+        pack_index,
+        routing=routing,
+        checkpoint=checkpoint,
+    )
+
+    system_message, prompt = _pack_improve_prompt(
+        source_lang, target_lang, sources, translations_1, reflection
+    )
+    reply = await utils.limited_completion(
+        semaphore,
+        prompt,
+        system_message,
+        "improve",
+        pack_index,
+        json_mode=True,
+        routing=routing,
+        checkpoint=checkpoint,
+    )
+    improved = parse_translations(reply, len(sources))
+
+    results: List[Optional[str]] = [None] * len(segments)
+    for j, i in enumerate(translated):
+        results[i] = improved.get(j, translations_1[j])
+    return results
+
+
+async def translate_segments_async(
+    source_lang: str,
+    target_lang: str,
+    segments: Sequence[str],
+    country: str = "",
+    max_pack_tokens: int = PACK_MAX_TOKENS,
+    max_concurrency: int = utils.MAX_CONCURRENCY,
+    routing: Optional[ModelRouting] = None,
+    journal: Optional[Journal] = None,
+    memory: Optional[TranslationMemory] = None,
+) -> List[str]:
+    """
+    Asynchronous counterpart of translate_segments.
+
+    Args:
+        source_lang (str): The source language of the segments.
+        target_lang (str): The target language for the translation.
+        segments (Sequence[str]): The texts to translate, e.g. table cells.
+        country (str): Country specified for target language.
+        max_pack_tokens (int): Source tokens per packed request.
+        max_concurrency (int): Maximum number of LLM calls in flight.
+        routing (Optional[ModelRouting]): The model and temperature of each
+            stage. Defaults to get_model_routing().
+        journal (Optional[Journal]): Records every reply, and replays those
+            an interrupted run recorded, as for translate().
+        memory (Optional[TranslationMemory]): Segments with an exact match
+            are not sent to the LLM, and new translations are written back.
+            Defaults to the memory translate() uses.
+    Returns:
+        List[str]: The translation of each segment, in order.
+    """
+
+    deduplicated = deduplicate(segments)
+    if deduplicated.ratio:
+        logger.debug(
+            "%d of %d segments are repeats (dedup ratio %.2f)",
+            len(segments) - len(deduplicated.unique),
+            len(segments),
+            deduplicated.ratio,
+        )
+    segments = deduplicated.unique
+
+    results = list(segments)
+    if prefilter.PREFILTER:
+        reasons, skipped = prefilter.skipped_segments(
+            segments, source_lang, target_lang
+        )
+        if skipped:
+            logger.debug("Segments passed through unchanged: %s", skipped)
+        todo = [i for i, reason in enumerate(reasons) if reason is None]
+    else:
+        todo = [
+            i
+            for i, segment in enumerate(segments)
+            if needs_translation(segment)
+        ]
+
+    if memory is None:
+        memory = utils.translation_memory
+    if memory is not None:
+        remembered = set()
+        for i in todo:
+            match = memory.lookup(segments[i], source_lang, target_lang)
+            if match is not None and match.exact:
+                results[i] = match.translation
+                remembered.add(i)
+        if remembered:
+            logger.debug(
+                "Translation memory has %d of %d segments",
+                len(remembered),
+                len(todo),
+            )
+            todo = [i for i in todo if i not in remembered]
+
+    token_counts = [
+        len(ids) for ids in encode_batch([segments[i] for i in todo])
+    ]
+    packs = [
+        [todo[j] for j in pack]
+        for pack in pack_segments(token_counts, max_pack_tokens)
+    ]
+
+    if routing is None:
+        routing = get_model_routing()
+    checkpoint = None
+    if journal is not None:
+        checkpoint = journal.document(
+            document_key(
+                source_lang,
+                target_lang,
+                json.dumps([segments[i] for i in todo], ensure_ascii=False),
+                country,
+                max_pack_tokens,
+                routing,
+            )
+        )
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def run(pack_index: int, pack: List[int]) -> None:
+        texts = [segments[i] for i in pack]
+        if len(pack) == 1:
+            translations: List[Optional[str]] = [None]
+        else:
+            translations = await _translate_pack(
+                source_lang,
+                target_lang,
+                country,
+                texts,
+                semaphore,
+                pack_index,
+                routing,
+                checkpoint,
+            )
+        if memory is not None:
+            for text, translation in zip(texts, translations):
+                if translation is not None:
+                    memory.add(text, translation, source_lang, target_lang)
+        missing = [j for j, text in enumerate(translations) if text is None]
+        if len(pack) > 1 and missing:
+            logger.debug(
+                "Pack %d: %d of %d segments fall back to translate()",
+                pack_index,
+                len(missing),
+                len(pack),
+            )
+        # Lone segments, and those the pack failed to return, go through
+        # the full single-text workflow.
+        fallbacks = await asyncio.gather(
+            *(
+                utils.translate_async(
+                    source_lang,
+                    target_lang,
+                    texts[j],
+                    country,
+                    max_concurrency=max_concurrency,
+                    memory=memory,
+                    routing=routing,
+                    journal=journal,
+                )
+                for j in missing
+            )
+        )
+        for j, translation in zip(missing, fallbacks):
+            # A lone segment has no JSON around it, but its reply may echo
+            # the tags of the single-text prompt.
+            translations[j] = strip_prompt_tags(translation)
+        for i, translation in zip(pack, translations):
+            results[i] = translation
+
+    await asyncio.gather(*(run(k, pack) for k, pack in enumerate(packs)))
+    return deduplicated.expand(results)
+
+
+def translate_segments(
+    source_lang: str,
+    target_lang: str,
+    segments: Sequence[str],
+    country: str = "",
+    max_pack_tokens: int = PACK_MAX_TOKENS,
+    max_concurrency: int = utils.MAX_CONCURRENCY,
+    routing: Optional[ModelRouting] = None,
+    journal: Optional[Journal] = None,
+    memory: Optional[TranslationMemory] = None,
+) -> List[str]:
+    """
+    Translate many short segments, such as table cells, in packed requests.
+
+    Segments are packed in order, with ids, into JSON-mode requests of up to
+    max_pack_tokens source tokens, and each pack runs the initial, reflect
+    and improve stages once instead of once per segment. Translations are
+    unpacked by id. Segments a pack fails to return, and segments too long
+    to share a pack, are translated on their own with translate(). Segments
+    the pre-filter finds nothing to translate in (numbers, dates, codes,
+    URLs, text already in the target script; see prefilter.classify) are
+    returned unchanged. Repeated segments,
+    compared after normalize_segment(), are translated once and every
+    occurrence gets the same translation.
+
+    Args:
+        source_lang (str): The source language of the segments.
+        target_lang (str): The target language for the translation.
+        segments (Sequence[str]): The texts to translate, e.g. table cells.
+        country (str): Country specified for target language.
+        max_pack_tokens (int): Source tokens per packed request.
+        max_concurrency (int): Maximum number of LLM calls in flight.
+        routing (Optional[ModelRouting]): The model and temperature of each
+            stage. Defaults to get_model_routing().
+        journal (Optional[Journal]): Records every reply, and replays those
+            an interrupted run recorded, as for translate().
+        memory (Optional[TranslationMemory]): Segments with an exact match
+            are not sent to the LLM, and new translations are written back.
+            Defaults to the memory translate() uses.
+    Returns:
+        List[str]: The translation of each segment, in order.
+    """
+
+    return utils.run_sync(
+        translate_segments_async(
+            source_lang,
+            target_lang,
+            segments,
+            country,
+            max_pack_tokens=max_pack_tokens,
+            max_concurrency=max_concurrency,
+            routing=routing,
+            journal=journal,
+            memory=memory,
+        )
+    )
@@ -0,0 +1,88 @@
+import functools
+from typing import List
+from typing import Sequence
+
+import tiktoken
+
+
+DEFAULT_ENCODING = "cl100k_base"  # the encoding used by GPT-4
+ENCODE_BATCH_THREADS = 8
+
+
+@functools.lru_cache(maxsize=None)
+def get_encoding(encoding_name: str = DEFAULT_ENCODING) -> tiktoken.Encoding:
+    """Return the tiktoken encoder for encoding_name, loading it only once."""
+    return tiktoken.get_encoding(encoding_name)
+
+
+def encode(text: str, encoding_name: str = DEFAULT_ENCODING) -> List[int]:
+    """
+    Encode text into token ids.
+
+    Special-token strings such as "<|endoftext|>" are encoded as plain text,
+    so arbitrary document content never raises.
+    """
+    return get_encoding(encoding_name).encode(text, disallowed_special=())
+
+
+def count_tokens(text: str, encoding_name: str = DEFAULT_ENCODING) -> int:
+    """Return the number of tokens in text."""
+    return len(encode(text, encoding_name))
+
+
+def encode_batch(
+    texts: Sequence[str],
+    encoding_name: str = DEFAULT_ENCODING,
+    num_threads: int = ENCODE_BATCH_THREADS,
+) -> List[List[int]]:
+    """
+    Encode many strings at once, e.g. every cell of a table.
+
+    tiktoken releases the GIL while encoding, so the batch is spread over
+    num_threads threads.
+
+    Args:
+        texts (Sequence[str]): The strings to encode.
+        encoding_name (str, optional): The encoding to use. Defaults to "cl100k_base".
+        num_threads (int, optional): Number of encoder threads. Defaults to 8.
+
+    Returns:
+        List[List[int]]: The token ids of each string, in order.
+    """
+    return get_encoding(encoding_name).encode_batch(
+        list(texts), num_threads=num_threads, disallowed_special=()
+    )
+
+
+class TokenizedText:
+    """
+    A text encoded exactly once, with the character offset of every token.
+
+    Token counts and chunk boundaries for any token range can then be read
+    from the offsets instead of re-encoding substrings.
+
+    Args:
+        text (str): The text to encode.
+        encoding_name (str, optional): The encoding to use. Defaults to "cl100k_base".
+    """
+
+    def __init__(self, text: str, encoding_name: str = DEFAULT_ENCODING):
+        self.text = text
+        self.encoding_name = encoding_name
+        self.tokens = encode(text, encoding_name)
+        _, offsets = get_encoding(encoding_name).decode_with_offsets(
+            self.tokens
+        )
+        # offsets[i] is where token i starts; the sentinel closes the last one
+        self.offsets = [*offsets, len(text)]
+
+    def __len__(self) -> int:
+        return len(self.tokens)
+
+    def char_offset(self, token_index: int) -> int:
+        """Return the character offset at which token_index starts."""
+        return self.offsets[token_index]
+
+    def slice(self, start: int, end: int) -> str:
+        """Return the text covered by tokens[start:end]."""
+        return self.text[self.offsets[start] : self.offsets[end]]
@@ -1,22 +1,143 @@
+import asyncio
+import concurrent.futures
+import contextlib
+import contextvars
+import dataclasses
+import logging
 import os
+import queue
+import threading
+from typing import Any
+from typing import AsyncIterator
+from typing import Coroutine
+from typing import Dict
+from typing import Iterator
 from typing import List
+from typing import Optional
+from typing import Tuple
+from typing import TypeVar
 from typing import Union
 
-import openai
-import tiktoken
 from dotenv import load_dotenv
-from icecream import ic
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+from . import prefilter
+from . import retry
+from .backends import Completion
+from .backends import close_async_clients
+from .backends import get_backend
+from .cache import DEFAULT_MAX_BYTES
+from .cache import CompletionCache
+from .cache import completion_key
+from .chunking import split_into_chunks
+from .context import FULL_CONTEXT
+from .context import ContextPolicy
+from .context import build_tagged_texts
+from .instrumentation import call_context
+from .instrumentation import call_finished
+from .instrumentation import call_skipped
+from .instrumentation import call_started
+from .instrumentation import critique_recorded
+from .journal import DocumentJournal
+from .journal import Journal
+from .journal import document_key
+from .memory import MemoryMatch
+from .memory import TranslationMemory
+from .ratelimit import get_rate_limiter
+from .reflection import SUGGESTIONS_INSTRUCTIONS
+from .reflection import parse_reflection
+from .reflection import parse_revision
+from .reflection import revision_prompt
+from .reflection import verdict_prompt
+from .retry import call_with_retry
+from .retry import call_with_retry_async
+from .routing import ModelRouting
+from .routing import draft_issues
+from .routing import get_model_routing
+from .segment_ids import ID_INSTRUCTIONS
+from .segment_ids import find_ids
+from .segment_ids import has_ids
+from .segment_ids import join_with_ids
+from .segment_ids import split_by_ids
+from .tokenizer import TokenizedText
+from .tokenizer import count_tokens
 
 
 load_dotenv()  # read local .env file
-client = openai.OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+
+logger = logging.getLogger(__name__)
 
 MAX_TOKENS_PER_CHUNK = (
     1000  # if text is more than this many tokens, we'll break it up into
 )
 # discrete chunks to translate one chunk at a time
 
+MAX_CONCURRENCY = 8  # maximum number of LLM calls in flight per translation
+
+# Ask the reflection stage for a JSON list of issues and skip the improve
+# stage when none is actionable.
+STRUCTURED_REFLECTION = (
+    os.getenv("TRANSLATION_STRUCTURED_REFLECTION", "false").lower() == "true"
+)
+# Reflect and improve in one JSON-mode call instead of two.
+FUSED_REFLECTION = (
+    os.getenv("TRANSLATION_FUSED_REFLECTION", "false").lower() == "true"
+)
+
+
+def _completion_cache_from_env() -> Optional[CompletionCache]:
+    """Build the completion cache configured by TRANSLATION_CACHE_* vars."""
+    path = os.getenv("TRANSLATION_CACHE_PATH")
+    if not path:
+        return None
+    max_age = os.getenv("TRANSLATION_CACHE_MAX_AGE")
+    return CompletionCache(
+        path,
+        max_bytes=int(
+            os.getenv("TRANSLATION_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES)
+        ),
+        max_age=float(max_age) if max_age else None,
+        read_only=os.getenv("TRANSLATION_CACHE_READ_ONLY", "false").lower()
+        == "true",
+    )
+
+
+completion_cache = _completion_cache_from_env()
+translation_memory = (
+    TranslationMemory(os.environ["TRANSLATION_MEMORY_PATH"])
+    if os.getenv("TRANSLATION_MEMORY_PATH")
+    else None
+)
+
+
+def set_completion_cache(cache: Optional[CompletionCache]) -> None:
+    """
+    Set the cache consulted by get_completion and get_completion_async.
+
+    Args:
+        cache (Optional[CompletionCache]): The cache to use, or None to disable caching.
+    """
+    global completion_cache
+    completion_cache = cache
+
+
+def set_translation_memory(memory: Optional[TranslationMemory]) -> None:
+    """
+    Set the translation memory translate() uses when none is passed.
+
+    Args:
+        memory (Optional[TranslationMemory]): The memory to use, or None to disable it.
+    """
+    global translation_memory
+    translation_memory = memory
+
+
+def __getattr__(name: str) -> Any:
+    # `client` used to be an OpenAI client created at import; it is now
+    # created on first use by the default backend.
+    if name == "client":
+        return get_backend().client
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 def get_completion(
     prompt: str,
@@ -24,9 +145,10 @@ def get_completion(
     model: str = "gpt-4-turbo",
     temperature: float = 0.3,
     json_mode: bool = False,
-) -> Union[str, dict]:
+    stream: bool = False,
+) -> Union[str, dict, Iterator[str]]:
     """
-        Generate a completion using the OpenAI API.
+        Generate a completion using the configured backend (the OpenAI API by default).
 
     Args:
         prompt (str): The user's prompt or query.
@@ -38,40 +160,397 @@ def get_completion(
             Defaults to 0.3.
         json_mode (bool, optional): Whether to return the response in JSON format.
             Defaults to False.
+        stream (bool, optional): Whether to return an iterator over the text
+            as it is generated instead of the whole completion. Defaults to False.
 
     Returns:
-        Union[str, dict]: The generated completion.
+        Union[str, dict, Iterator[str]]: The generated completion.
             If json_mode is True, returns the complete API response as a dictionary.
             If json_mode is False, returns the generated text as a string.
+            If stream is True, returns an iterator of text deltas.
     """
 
-    if json_mode:
-        response = client.chat.completions.create(
-            model=model,
-            temperature=temperature,
-            top_p=1,
-            response_format={"type": "json_object"},
-            messages=[
-                {"role": "system", "content": system_message},
-                {"role": "user", "content": prompt},
-            ],
+    if stream:
+        return _completion_stream(
+            prompt, system_message, model, temperature, json_mode
         )
-        return response.choices[0].message.content
-    else:
-        response = client.chat.completions.create(
-            model=model,
-            temperature=temperature,
-            top_p=1,
-            messages=[
-                {"role": "system", "content": system_message},
-                {"role": "user", "content": prompt},
-            ],
+
+    event = call_started(model)
+    cache_key = None
+    if completion_cache is not None:
+        cache_key = completion_key(
+            prompt, system_message, model, temperature, json_mode
+        )
+        cached = completion_cache.get(cache_key)
+        if cached is not None:
+            call_finished(event, cache_hit=True)
+            return cached
+
+    backend = get_backend()
+    rate_limiter = get_rate_limiter()
+    estimated_tokens = rate_limiter.estimate_tokens(system_message, prompt)
+
+    def attempt(timeout: float) -> Completion:
+        with rate_limiter.slot(model, estimated_tokens) as permit:
+            completion = backend.complete(
+                prompt, system_message, model, temperature, json_mode, timeout
+            )
+            permit.used_tokens = completion.total_tokens
+        return completion
+
+    try:
+        completion = call_with_retry(attempt, model)
+    except BaseException as exc:
+        call_finished(event, error=exc)
+        raise
+    call_finished(event, completion)
+    content = completion.text
+    if cache_key is not None:
+        completion_cache.put(cache_key, content)
+    return content
+
+
+def _single_delta(completion: Completion) -> Iterator[Completion]:
+    yield completion
+
+
+def _completion_stream(
+    prompt: str,
+    system_message: str,
+    model: str,
+    temperature: float,
+    json_mode: bool,
+) -> Iterator[str]:
+    """
+    Stream a completion, with the caching, rate limiting and instrumentation
+    of get_completion.
+
+    Only opening the stream is retried: once text has been yielded, errors
+    are raised to the caller. Streams are never hedged, since the losing
+    stream would have to be drained to free its rate limiter slot. Backends
+    without a stream() method send the whole completion as one delta.
+    """
+
+    event = call_started(model)
+    cache_key = None
+    if completion_cache is not None:
+        cache_key = completion_key(
+            prompt, system_message, model, temperature, json_mode
+        )
+        cached = completion_cache.get(cache_key)
+        if cached is not None:
+            call_finished(event, cache_hit=True)
+            yield cached
+            return
+
+    backend = get_backend()
+    rate_limiter = get_rate_limiter()
+    estimated_tokens = rate_limiter.estimate_tokens(system_message, prompt)
+    policy = dataclasses.replace(retry.retry_policy, hedge=False)
+
+    def attempt(timeout: float):
+        # The slot is held until the stream is consumed, so that errors
+        # raised while reading it still reach the rate limiter.
+        with contextlib.ExitStack() as stack:
+            permit = stack.enter_context(
+                rate_limiter.slot(model, estimated_tokens)
+            )
+            request_args = (
+                prompt,
+                system_message,
+                model,
+                temperature,
+                json_mode,
+                timeout,
+            )
+            if hasattr(backend, "stream"):
+                deltas = backend.stream(*request_args)
+            else:
+                deltas = _single_delta(backend.complete(*request_args))
+            return deltas, permit, stack.pop_all()
+
+    text = []
+    usage = Completion("")
+    try:
+        deltas, permit, slot = call_with_retry(attempt, model, policy)
+        with slot, contextlib.closing(deltas):
+            for delta in deltas:
+                if delta.prompt_tokens is not None:
+                    usage = delta
+                if delta.text:
+                    text.append(delta.text)
+                    yield delta.text
+            permit.used_tokens = usage.total_tokens
+    except BaseException as exc:
+        call_finished(event, error=exc)
+        raise
+    content = "".join(text)
+    call_finished(
+        event,
+        Completion(
+            content,
+            usage.prompt_tokens,
+            usage.completion_tokens,
+            usage.cached_tokens,
+        ),
+    )
+    if cache_key is not None:
+        completion_cache.put(cache_key, content)
+
+
+async def get_completion_async(
+    prompt: str,
+    system_message: str = "You are a helpful assistant.",
+    model: str = "gpt-4-turbo",
+    temperature: float = 0.3,
+    json_mode: bool = False,
+) -> Union[str, dict]:
+    """
+        Generate a completion using the configured backend, asynchronously.
+
+    Takes the same arguments and returns the same value as get_completion,
+    but does not block the event loop while the request is in flight.
+    """
+
+    event = call_started(model)
+    cache_key = None
+    if completion_cache is not None:
+        cache_key = completion_key(
+            prompt, system_message, model, temperature, json_mode
+        )
+        cached = completion_cache.get(cache_key)
+        if cached is not None:
+            call_finished(event, cache_hit=True)
+            return cached
+
+    backend = get_backend()
+    rate_limiter = get_rate_limiter()
+    estimated_tokens = rate_limiter.estimate_tokens(system_message, prompt)
+
+    async def attempt(timeout: float) -> Completion:
+        async with rate_limiter.slot_async(model, estimated_tokens) as permit:
+            completion = await backend.complete_async(
+                prompt, system_message, model, temperature, json_mode, timeout
+            )
+            permit.used_tokens = completion.total_tokens
+        return completion
+
+    try:
+        completion = await call_with_retry_async(attempt, model)
+    except BaseException as exc:
+        call_finished(event, error=exc)
+        raise
+    call_finished(event, completion)
+    content = completion.text
+    if cache_key is not None:
+        completion_cache.put(cache_key, content)
+    return content
+
+
+async def limited_completion(
+    semaphore: asyncio.Semaphore,
+    prompt: str,
+    system_message: str,
+    stage: str,
+    chunk_index: Optional[int] = None,
+    json_mode: bool = False,
+    routing: Optional[ModelRouting] = None,
+    checkpoint: Optional[DocumentJournal] = None,
+) -> str:
+    """
+    Run get_completion_async for one stage once a concurrency slot is free.
+
+    A reply the checkpoint already holds for the stage and chunk is
+    replayed without a call; a new reply is recorded in it. A prompt with
+    segment id markers (see segment_ids) also asks the model to keep them,
+    except in the reflect stage, whose reply is not a translation.
+
+    Args:
+        semaphore (asyncio.Semaphore): Bounds the calls in flight.
+        prompt (str): The user prompt.
+        system_message (str): The system message.
+        stage (str): The workflow stage, e.g. "initial", "reflect" or
+            "improve". It picks the model and temperature from routing and
+            names the call for instrumentation and the journal.
+        chunk_index (Optional[int]): The chunk or pack the call is for.
+        json_mode (bool): Whether to ask for a JSON reply.
+        routing (Optional[ModelRouting]): The model of each stage.
+        checkpoint (Optional[DocumentJournal]): The journal records of the
+            document being translated.
+
+    Returns:
+        str: The reply.
+    """
+    if checkpoint is not None:
+        reply = checkpoint.get(stage, chunk_index)
+        if reply is not None:
+            return reply
+    if stage != "reflect" and has_ids(prompt):
+        # The caller matches the reply back to its segments by id marker.
+        prompt = f"{prompt}\n\n{ID_INSTRUCTIONS}"
+    kwargs = routing.completion_kwargs(stage) if routing is not None else {}
+    async with semaphore:
+        with call_context(stage, chunk_index):
+            reply = await get_completion_async(
+                prompt,
+                system_message=system_message,
+                json_mode=json_mode,
+                **kwargs,
+            )
+    if checkpoint is not None:
+        # Appending syncs the file to disk, so keep it off the event loop.
+        await checkpoint.record_async(stage, chunk_index, reply)
+    return reply
+
+
+def _escalated_draft(
+    source_text: str,
+    translation_1: str,
+    prompt: str,
+    system_message: str,
+    routing: ModelRouting,
+    chunk_index: Optional[int] = None,
+) -> str:
+    """Redo a draft that fails draft_issues() with the escalation model."""
+    issues = draft_issues(source_text, translation_1)
+    if not issues:
+        return translation_1
+    logger.debug("Escalating draft with issues %s", issues)
+    with call_context("escalate", chunk_index):
+        return get_completion(
+            prompt,
+            system_message=system_message,
+            **routing.completion_kwargs("escalate"),
         )
-        return response.choices[0].message.content
+
+
+async def _draft_async(
+    semaphore: asyncio.Semaphore,
+    prompt: str,
+    system_message: str,
+    source_text: str,
+    routing: ModelRouting,
+    chunk_index: Optional[int] = None,
+    checkpoint: Optional[DocumentJournal] = None,
+) -> str:
+    """Run the initial stage, escalating a draft that fails draft_issues()."""
+    translation_1 = await limited_completion(
+        semaphore,
+        prompt,
+        system_message,
+        "initial",
+        chunk_index,
+        routing=routing,
+        checkpoint=checkpoint,
+    )
+    if not routing.escalates:
+        return translation_1
+    issues = draft_issues(source_text, translation_1)
+    if not issues:
+        return translation_1
+    logger.debug("Escalating draft with issues %s", issues)
+    return await limited_completion(
+        semaphore,
+        prompt,
+        system_message,
+        "escalate",
+        chunk_index,
+        routing=routing,
+        checkpoint=checkpoint,
+    )
+
+
+async def _closing_clients(coro: Coroutine[Any, Any, Any]) -> Any:
+    """Await coro, then close the backend's client of this event loop."""
+    try:
+        return await coro
+    finally:
+        await close_async_clients()
+
+
+def run_sync(coro: Coroutine[Any, Any, Any]) -> Any:
+    """
+    Run a coroutine to completion from synchronous code.
+
+    The coroutine runs on a fresh event loop, whose backend client is closed
+    when it ends. If the caller is already inside a running event loop (e.g.
+    a notebook), that loop is run in a worker thread instead.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(_closing_clients(coro))
+
+    # Copy the caller's context so instrumentation handlers follow the call.
+    context = contextvars.copy_context()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as pool:
+        return pool.submit(
+            context.run, asyncio.run, _closing_clients(coro)
+        ).result()
+
+
+T = TypeVar("T")
+
+
+def _iterate_sync(items: AsyncIterator[T]) -> Iterator[T]:
+    """
+    Iterate an async iterator from synchronous code.
+
+    The iterator runs on a fresh event loop in a worker thread, so this also
+    works when the caller is inside a running event loop, and every item is
+    handed over as soon as it is produced. Closing the returned iterator
+    early cancels the async one.
+    """
+    handover: queue.Queue = queue.Queue()
+    started = threading.Event()
+    running = {}
+
+    async def pump() -> None:
+        running["loop"] = asyncio.get_running_loop()
+        running["task"] = asyncio.current_task()
+        started.set()
+        try:
+            async for item in items:
+                handover.put((True, item))
+        except BaseException as exc:
+            handover.put((False, exc))
+        else:
+            handover.put((False, None))
+        finally:
+            aclose = getattr(items, "aclose", None)
+            if aclose is not None:
+                await aclose()
+            await close_async_clients()
+
+    # Copy the caller's context so instrumentation handlers follow the call.
+    context = contextvars.copy_context()
+    worker = threading.Thread(
+        target=context.run, args=(asyncio.run, pump()), daemon=True
+    )
+    worker.start()
+    finished = False
+    try:
+        while True:
+            more, item = handover.get()
+            if not more:
+                finished = True
+                if item is not None:
+                    raise item
+                return
+            yield item
+    finally:
+        if not finished:
+            started.wait()
+            with contextlib.suppress(RuntimeError):  # the loop has closed
+                running["loop"].call_soon_threadsafe(running["task"].cancel)
+        worker.join()
 
 
 def one_chunk_initial_translation(
-    source_lang: str, target_lang: str, source_text: str
+    source_lang: str,
+    target_lang: str,
+    source_text: str,
+    routing: Optional[ModelRouting] = None,
 ) -> str:
     """
     Translate the entire text as one chunk using an LLM.
@@ -80,10 +559,38 @@ def one_chunk_initial_translation(
         source_lang (str): The source language of the text.
         target_lang (str): The target language for translation.
         source_text (str): The text to be translated.
+        routing (Optional[ModelRouting]): The model of each stage, and the
+            escalation model that redoes a draft failing draft_issues().
+            Defaults to get_model_routing().
 
     Returns:
         str: The translated text.
     """
+    if routing is None:
+        routing = get_model_routing()
+
+    system_message, prompt = _one_chunk_initial_prompt(
+        source_lang, target_lang, source_text
+    )
+
+    with call_context("initial"):
+        translation = get_completion(
+            prompt,
+            system_message=system_message,
+            **routing.completion_kwargs("initial"),
+        )
+    if routing.escalates:
+        translation = _escalated_draft(
+            source_text, translation, prompt, system_message, routing
+        )
+
+    return translation
+
+
+def _one_chunk_initial_prompt(
+    source_lang: str, target_lang: str, source_text: str
+) -> Tuple[str, str]:
+    """Build the (system_message, prompt) pair for a one-chunk translation."""
 
     system_message = f"You are an expert linguist, specializing in translation from {source_lang} to {target_lang}."
 
@@ -95,9 +602,7 @@ Do not provide any explanations or text apart from the translation.
 
     prompt = translation_prompt.format(source_text=source_text)
 
-    translation = get_completion(prompt, system_message=system_message)
-
-    return translation
+    return system_message, prompt
 
 
 def one_chunk_reflect_on_translation(
@@ -106,6 +611,8 @@ def one_chunk_reflect_on_translation(
     source_text: str,
     translation_1: str,
     country: str = "",
+    structured: bool = False,
+    routing: Optional[ModelRouting] = None,
 ) -> str:
     """
     Use an LLM to reflect on the translation, treating the entire text as one chunk.
@@ -116,10 +623,53 @@ def one_chunk_reflect_on_translation(
         source_text (str): The original text in the source language.
         translation_1 (str): The initial translation of the source text.
         country (str): Country specified for target language.
+        structured (bool): Ask for a JSON list of issues with severities instead
+            of free-text suggestions; parse it with reflection.parse_reflection.
+        routing (Optional[ModelRouting]): The model of each stage. Defaults to
+            get_model_routing().
 
     Returns:
         str: The LLM's reflection on the translation, providing constructive criticism and suggestions for improvement.
     """
+    if routing is None:
+        routing = get_model_routing()
+
+    system_message, prompt = _one_chunk_reflect_prompt(
+        source_lang,
+        target_lang,
+        source_text,
+        translation_1,
+        country,
+        structured,
+    )
+    kwargs = routing.completion_kwargs("reflect")
+    with call_context("reflect"):
+        if structured:
+            reflection = get_completion(
+                prompt, system_message=system_message, json_mode=True, **kwargs
+            )
+        else:
+            reflection = get_completion(
+                prompt, system_message=system_message, **kwargs
+            )
+        critique_recorded(reflection)
+    return reflection
+
+
+def _one_chunk_reflect_prompt(
+    source_lang: str,
+    target_lang: str,
+    source_text: str,
+    translation_1: str,
+    country: str = "",
+    structured: bool = False,
+) -> Tuple[str, str]:
+    """
+    Build the (system_message, prompt) pair for a one-chunk reflection.
+
+    With structured=True the reflection is asked for a JSON verdict, see
+    reflection.verdict_prompt.
+    """
 
     system_message = f"You are an expert linguist specializing in translation from {source_lang} to {target_lang}. \
 You will be provided with a source text and its translation and your goal is to improve the translation."
@@ -177,8 +727,9 @@ Output only the suggestions and nothing else."""
         source_text=source_text,
         translation_1=translation_1,
     )
-    reflection = get_completion(prompt, system_message=system_message)
-    return reflection
+    if structured:
+        prompt = verdict_prompt(prompt)
+    return system_message, prompt
 
 
 def one_chunk_improve_translation(
@@ -187,6 +738,7 @@ def one_chunk_improve_translation(
     source_text: str,
     translation_1: str,
     reflection: str,
+    routing: Optional[ModelRouting] = None,
 ) -> str:
     """
     Use the reflection to improve the translation, treating the entire text as one chunk.
@@ -197,10 +749,35 @@ def one_chunk_improve_translation(
         source_text (str): The original text in the source language.
         translation_1 (str): The initial translation of the source text.
         reflection (str): Expert suggestions and constructive criticism for improving the translation.
+        routing (Optional[ModelRouting]): The model of each stage. Defaults to
+            get_model_routing().
 
     Returns:
         str: The improved translation based on the expert suggestions.
     """
+    if routing is None:
+        routing = get_model_routing()
+
+    system_message, prompt = _one_chunk_improve_prompt(
+        source_lang, target_lang, source_text, translation_1, reflection
+    )
+
+    with call_context("improve"):
+        translation_2 = get_completion(
+            prompt, system_message, **routing.completion_kwargs("improve")
+        )
+
+    return translation_2
+
+
+def _one_chunk_improve_prompt(
+    source_lang: str,
+    target_lang: str,
+    source_text: str,
+    translation_1: str,
+    reflection: str,
+) -> Tuple[str, str]:
+    """Build the (system_message, prompt) pair for a one-chunk improvement."""
 
     system_message = f"You are an expert linguist, specializing in translation editing from {source_lang} to {target_lang}."
 
@@ -232,13 +809,152 @@ Please take into account the expert suggestions when editing the translation. Ed
 
 Output only the new translation and nothing else."""
 
-    translation_2 = get_completion(prompt, system_message)
+    return system_message, prompt
 
-    return translation_2
+
+def _improve_suggestions(
+    reflection: str,
+    chunk_index: Optional[int] = None,
+    routing: Optional[ModelRouting] = None,
+) -> Optional[str]:
+    """
+    Turn a structured reflection into suggestions for the improve stage.
+
+    Returns None when no issue is actionable: the improve call is then
+    skipped and reported as such to the call handlers. A reply that is not
+    a valid verdict is passed on as is, so the improve stage still runs.
+    """
+    verdict = parse_reflection(reflection)
+    if verdict is None:
+        logger.debug("Unparseable reflection verdict, running improve stage")
+        return reflection
+    if not verdict.actionable():
+        with call_context("improve", chunk_index):
+            call_skipped((routing or get_model_routing()).model("improve"))
+        return None
+    return verdict.as_suggestions()
+
+
+def one_chunk_revise_translation(
+    source_lang: str,
+    target_lang: str,
+    source_text: str,
+    translation_1: str,
+    country: str = "",
+    routing: Optional[ModelRouting] = None,
+) -> str:
+    """
+    Reflect on and improve the translation in a single JSON-mode LLM call.
+
+    The critique is passed to the call handlers' on_critique for audit. If
+    the reply is not valid JSON, it is used as the reflection of a regular
+    improve call.
+
+    Args:
+        source_lang (str): The source language of the text.
+        target_lang (str): The target language for the translation.
+        source_text (str): The original text in the source language.
+        translation_1 (str): The initial translation of the source text.
+        country (str): Country specified for target language.
+        routing (Optional[ModelRouting]): The model of each stage; the fused
+            call uses the improve model. Defaults to get_model_routing().
+
+    Returns:
+        str: The improved translation.
+    """
+    if routing is None:
+        routing = get_model_routing()
+
+    system_message, prompt = _one_chunk_reflect_prompt(
+        source_lang, target_lang, source_text, translation_1, country
+    )
+    with call_context("fused"):
+        reply = get_completion(
+            revision_prompt(prompt),
+            system_message=system_message,
+            json_mode=True,
+            **routing.completion_kwargs("fused"),
+        )
+        revision = parse_revision(reply)
+        critique_recorded(reply if revision is None else revision.critique)
+    if revision is not None:
+        return revision.translation
+
+    logger.debug("Unparseable revision, running improve stage")
+    return one_chunk_improve_translation(
+        source_lang, target_lang, source_text, translation_1, reply, routing
+    )
+
+
+async def _reflect_or_revise(
+    semaphore: asyncio.Semaphore,
+    system_message: str,
+    prompt: str,
+    translation_1: str,
+    chunk_index: Optional[int] = None,
+    structured: bool = False,
+    fused: bool = False,
+    routing: Optional[ModelRouting] = None,
+    checkpoint: Optional[DocumentJournal] = None,
+) -> Tuple[Optional[str], str]:
+    """
+    Run the reflection stage of one chunk from its plain reflection prompt.
+
+    Returns:
+        Tuple[Optional[str], str]: The final translation if no improve call
+            is needed (a fused call already revised it, or a structured
+            reflection found nothing actionable), else None; and the
+            suggestions for the improve stage.
+    """
+    if fused:
+        reply = await limited_completion(
+            semaphore,
+            revision_prompt(prompt),
+            system_message,
+            "fused",
+            chunk_index,
+            json_mode=True,
+            routing=routing,
+            checkpoint=checkpoint,
+        )
+        revision = parse_revision(reply)
+        with call_context("fused", chunk_index):
+            critique_recorded(reply if revision is None else revision.critique)
+        if revision is not None:
+            return revision.translation, revision.critique
+        logger.debug("Unparseable revision, running improve stage")
+        return None, reply
+
+    if structured:
+        prompt = verdict_prompt(prompt)
+    reflection = await limited_completion(
+        semaphore,
+        prompt,
+        system_message,
+        "reflect",
+        chunk_index,
+        json_mode=structured,
+        routing=routing,
+        checkpoint=checkpoint,
+    )
+    with call_context("reflect", chunk_index):
+        critique_recorded(reflection)
+    if not structured:
+        return None, reflection
+    suggestions = _improve_suggestions(reflection, chunk_index, routing)
+    if suggestions is None:
+        return translation_1, reflection
+    return None, suggestions
 
 
 def one_chunk_translate_text(
-    source_lang: str, target_lang: str, source_text: str, country: str = ""
+    source_lang: str,
+    target_lang: str,
+    source_text: str,
+    country: str = "",
+    structured_reflection: Optional[bool] = None,
+    fused: Optional[bool] = None,
+    routing: Optional[ModelRouting] = None,
 ) -> str:
     """
     Translate a single chunk of text from the source language to the target language.
@@ -252,19 +968,150 @@ def one_chunk_translate_text(
         target_lang (str): The target language for the translation.
         source_text (str): The text to be translated.
         country (str): Country specified for target language.
+        structured_reflection (Optional[bool]): Skip the improve stage when a JSON
+            reflection finds no actionable issue. Defaults to STRUCTURED_REFLECTION.
+        fused (Optional[bool]): Reflect and improve in a single call. Defaults to
+            FUSED_REFLECTION.
+        routing (Optional[ModelRouting]): The model and temperature of each stage,
+            and the escalation model. Defaults to get_model_routing().
     Returns:
         str: The improved translation of the source text.
     """
+    if structured_reflection is None:
+        structured_reflection = STRUCTURED_REFLECTION
+    if fused is None:
+        fused = FUSED_REFLECTION
+    # Only passed on when given, so each stage falls back to the default.
+    stage_kwargs = {} if routing is None else {"routing": routing}
+
     translation_1 = one_chunk_initial_translation(
+        source_lang, target_lang, source_text, **stage_kwargs
+    )
+
+    if fused:
+        return one_chunk_revise_translation(
+            source_lang,
+            target_lang,
+            source_text,
+            translation_1,
+            country,
+            **stage_kwargs,
+        )
+
+    if structured_reflection:
+        reflection = _improve_suggestions(
+            one_chunk_reflect_on_translation(
+                source_lang,
+                target_lang,
+                source_text,
+                translation_1,
+                country,
+                structured=True,
+                **stage_kwargs,
+            ),
+            routing=routing,
+        )
+        if reflection is None:
+            return translation_1
+    else:
+        reflection = one_chunk_reflect_on_translation(
+            source_lang,
+            target_lang,
+            source_text,
+            translation_1,
+            country,
+            **stage_kwargs,
+        )
+    translation_2 = one_chunk_improve_translation(
+        source_lang,
+        target_lang,
+        source_text,
+        translation_1,
+        reflection,
+        **stage_kwargs,
+    )
+
+    return translation_2
+
+
+async def one_chunk_translate_text_async(
+    source_lang: str,
+    target_lang: str,
+    source_text: str,
+    country: str = "",
+    max_concurrency: int = MAX_CONCURRENCY,
+    structured_reflection: Optional[bool] = None,
+    fused: Optional[bool] = None,
+    routing: Optional[ModelRouting] = None,
+    checkpoint: Optional[DocumentJournal] = None,
+) -> str:
+    """
+    Asynchronous counterpart of one_chunk_translate_text.
+
+    Args:
+        source_lang (str): The source language of the text.
+        target_lang (str): The target language for the translation.
+        source_text (str): The text to be translated.
+        country (str): Country specified for target language.
+        max_concurrency (int): Maximum number of LLM calls in flight.
+        structured_reflection (Optional[bool]): Skip the improve stage when a JSON
+            reflection finds no actionable issue. Defaults to STRUCTURED_REFLECTION.
+        fused (Optional[bool]): Reflect and improve in a single call. Defaults to
+            FUSED_REFLECTION.
+        routing (Optional[ModelRouting]): The model and temperature of each stage,
+            and the escalation model. Defaults to get_model_routing().
+        checkpoint (Optional[DocumentJournal]): Replays the replies recorded by
+            an earlier run and records the new ones.
+    Returns:
+        str: The improved translation of the source text.
+    """
+    if structured_reflection is None:
+        structured_reflection = STRUCTURED_REFLECTION
+    if fused is None:
+        fused = FUSED_REFLECTION
+    if routing is None:
+        routing = get_model_routing()
+    semaphore = asyncio.Semaphore(max_concurrency)
+
+    system_message, prompt = _one_chunk_initial_prompt(
         source_lang, target_lang, source_text
     )
+    translation_1 = await _draft_async(
+        semaphore,
+        prompt,
+        system_message,
+        source_text,
+        routing,
+        checkpoint=checkpoint,
+    )
 
-    reflection = one_chunk_reflect_on_translation(
+    system_message, prompt = _one_chunk_reflect_prompt(
         source_lang, target_lang, source_text, translation_1, country
     )
-    translation_2 = one_chunk_improve_translation(
+    final_translation, reflection = await _reflect_or_revise(
+        semaphore,
+        system_message,
+        prompt,
+        translation_1,
+        structured=structured_reflection,
+        fused=fused,
+        routing=routing,
+        checkpoint=checkpoint,
+    )
+    if final_translation is not None:
+        return final_translation
+
+    system_message, prompt = _one_chunk_improve_prompt(
         source_lang, target_lang, source_text, translation_1, reflection
     )
+    translation_2 = await limited_completion(
+        semaphore,
+        prompt,
+        system_message,
+        "improve",
+        routing=routing,
+        checkpoint=checkpoint,
+    )
 
     return translation_2
 
@@ -289,13 +1136,30 @@ def num_tokens_in_string(
         >>> print(num_tokens)
         5
     """
-    encoding = tiktoken.get_encoding(encoding_name)
-    num_tokens = len(encoding.encode(input_str))
+    num_tokens = count_tokens(input_str, encoding_name)
     return num_tokens
 
 
+def _chunk_tagged_texts(
+    source_text_chunks: List[str],
+    context: ContextPolicy,
+    chunk_token_counts: Optional[List[int]] = None,
+) -> List[str]:
+    """Build each chunk's tagged context text according to the policy."""
+    if context.mode == "tokens" and chunk_token_counts is None:
+        chunk_token_counts = [
+            num_tokens_in_string(chunk) for chunk in source_text_chunks
+        ]
+    return build_tagged_texts(source_text_chunks, context, chunk_token_counts)
+
+
 def multichunk_initial_translation(
-    source_lang: str, target_lang: str, source_text_chunks: List[str]
+    source_lang: str,
+    target_lang: str,
+    source_text_chunks: List[str],
+    tagged_texts: Optional[List[str]] = None,
+    layout: str = "tagged",
+    routing: Optional[ModelRouting] = None,
 ) -> List[str]:
     """
     Translate a text in multiple chunks from the source language to the target language.
@@ -304,53 +1168,140 @@ def multichunk_initial_translation(
         source_lang (str): The source language of the text.
         target_lang (str): The target language for translation.
         source_text_chunks (List[str]): A list of text chunks to be translated.
+        tagged_texts (Optional[List[str]]): The tagged context of each chunk, as built by
+            build_tagged_texts. Defaults to the whole document for every chunk.
+        layout (str): The prompt layout tagged_texts were built for, see
+            ContextPolicy.layout.
+        routing (Optional[ModelRouting]): The model of each stage, and the
+            escalation model that redoes a draft failing draft_issues().
+            Defaults to get_model_routing().
 
     Returns:
         List[str]: A list of translated text chunks.
     """
+    if routing is None:
+        routing = get_model_routing()
 
-    system_message = f"You are an expert linguist, specializing in translation from {source_lang} to {target_lang}."
+    if tagged_texts is None:
+        tagged_texts = build_tagged_texts(
+            source_text_chunks, ContextPolicy.full(layout)
+        )
 
-    translation_prompt = """Your task is provide a professional translation from {source_lang} to {target_lang} of PART of a text.
+    translation_chunks = []
+    for i in range(len(source_text_chunks)):
+        # Will translate chunk i
+        system_message, prompt = _multichunk_initial_prompt(
+            source_lang,
+            target_lang,
+            tagged_texts[i],
+            source_text_chunks[i],
+            layout=layout,
+            chunk_index=i,
+        )
 
-The source text is below, delimited by XML tags <SOURCE_TEXT> and </SOURCE_TEXT>. Translate only the part within the source text
-delimited by <TRANSLATE_THIS> and </TRANSLATE_THIS>. You can use the rest of the source text as context, but do not translate any
-of the other text. Do not output anything other than the translation of the indicated part of the text.
+        with call_context("initial", i):
+            translation = get_completion(
+                prompt,
+                system_message=system_message,
+                **routing.completion_kwargs("initial"),
+            )
+        if routing.escalates:
+            translation = _escalated_draft(
+                source_text_chunks[i],
+                translation,
+                prompt,
+                system_message,
+                routing,
+                i,
+            )
+        translation_chunks.append(translation)
 
-<SOURCE_TEXT>
-{tagged_text}
-</SOURCE_TEXT>
+    return translation_chunks
+
+
+def _prefix_prompt(
+    source_lang: str, target_lang: str, source_text: str, instructions: str
+) -> Tuple[str, str]:
+    """
+    Build a (system_message, prompt) pair in the "prefix" layout.
+
+    The system message and the untouched source text come first and are the
+    same for every stage and chunk, so they form a cacheable prompt prefix;
+    only the instructions that follow them differ.
+    """
+
+    system_message = f"You are an expert linguist, specializing in translation from {source_lang} to {target_lang}."
+
+    prompt = f"""The source text is below, delimited by XML tags <SOURCE_TEXT> and </SOURCE_TEXT>.
+
+<SOURCE_TEXT>
+{source_text}
+</SOURCE_TEXT>
+
+{instructions}"""
+
+    return system_message, prompt
+
+
+def _multichunk_initial_prompt(
+    source_lang: str,
+    target_lang: str,
+    tagged_text: str,
+    chunk: str,
+    layout: str = "tagged",
+    chunk_index: int = 0,
+) -> Tuple[str, str]:
+    """
+    Build the (system_message, prompt) pair translating one chunk.
+
+    In the "prefix" layout, tagged_text is the untouched context and the
+    chunk is named by chunk_index, see ContextPolicy.layout.
+    """
+
+    if layout == "prefix":
+        instructions = f"""Your task is to provide a professional translation from {source_lang} to {target_lang} of PART of the source text above.
+
+The source text has been split into consecutive parts. Translate only part {chunk_index + 1}, shown below between <TRANSLATE_THIS> and </TRANSLATE_THIS>.
+You can use the rest of the source text as context, but do not translate any of the other text.
 
-To reiterate, you should translate only this part of the text, shown here again between <TRANSLATE_THIS> and </TRANSLATE_THIS>:
 <TRANSLATE_THIS>
-{chunk_to_translate}
+{chunk}
 </TRANSLATE_THIS>
 
 Output only the translation of the portion you are asked to translate, and nothing else.
 """
-
-    translation_chunks = []
-    for i in range(len(source_text_chunks)):
-        # Will translate chunk i
-        tagged_text = (
-            "".join(source_text_chunks[0:i])
-            + "<TRANSLATE_THIS>"
-            + source_text_chunks[i]
-            + "</TRANSLATE_THIS>"
-            + "".join(source_text_chunks[i + 1 :])
+        return _prefix_prompt(
+            source_lang, target_lang, tagged_text, instructions
         )
 
-        prompt = translation_prompt.format(
-            source_lang=source_lang,
-            target_lang=target_lang,
-            tagged_text=tagged_text,
-            chunk_to_translate=source_text_chunks[i],
-        )
+    system_message = f"You are an expert linguist, specializing in translation from {source_lang} to {target_lang}."
 
-        translation = get_completion(prompt, system_message=system_message)
-        translation_chunks.append(translation)
+    translation_prompt = """Your task is provide a professional translation from {source_lang} to {target_lang} of PART of a text.
 
-    return translation_chunks
+The source text is below, delimited by XML tags <SOURCE_TEXT> and </SOURCE_TEXT>. Translate only the part within the source text
+delimited by <TRANSLATE_THIS> and </TRANSLATE_THIS>. You can use the rest of the source text as context, but do not translate any
+of the other text. Do not output anything other than the translation of the indicated part of the text.
+
+<SOURCE_TEXT>
+{tagged_text}
+</SOURCE_TEXT>
+
+To reiterate, you should translate only this part of the text, shown here again between <TRANSLATE_THIS> and </TRANSLATE_THIS>:
+<TRANSLATE_THIS>
+{chunk_to_translate}
+</TRANSLATE_THIS>
+
+Output only the translation of the portion you are asked to translate, and nothing else.
+"""
+
+    prompt = translation_prompt.format(
+        source_lang=source_lang,
+        target_lang=target_lang,
+        tagged_text=tagged_text,
+        chunk_to_translate=chunk,
+    )
+
+    return system_message, prompt
 
 
 def multichunk_reflect_on_translation(
@@ -359,6 +1310,9 @@ def multichunk_reflect_on_translation(
     source_text_chunks: List[str],
     translation_1_chunks: List[str],
     country: str = "",
+    tagged_texts: Optional[List[str]] = None,
+    layout: str = "tagged",
+    routing: Optional[ModelRouting] = None,
 ) -> List[str]:
     """
     Provides constructive criticism and suggestions for improving a partial translation.
@@ -369,10 +1323,102 @@ def multichunk_reflect_on_translation(
         source_text_chunks (List[str]): The source text divided into chunks.
         translation_1_chunks (List[str]): The translated chunks corresponding to the source text chunks.
         country (str): Country specified for target language.
+        tagged_texts (Optional[List[str]]): The tagged context of each chunk, as built by
+            build_tagged_texts. Defaults to the whole document for every chunk.
+        layout (str): The prompt layout tagged_texts were built for, see
+            ContextPolicy.layout.
+        routing (Optional[ModelRouting]): The model of each stage. Defaults to
+            get_model_routing().
 
     Returns:
         List[str]: A list of reflections containing suggestions for improving each translated chunk.
     """
+    if routing is None:
+        routing = get_model_routing()
+
+    if tagged_texts is None:
+        tagged_texts = build_tagged_texts(
+            source_text_chunks, ContextPolicy.full(layout)
+        )
+
+    reflection_chunks = []
+    for i in range(len(source_text_chunks)):
+        # Will translate chunk i
+        system_message, prompt = _multichunk_reflect_prompt(
+            source_lang,
+            target_lang,
+            tagged_texts[i],
+            source_text_chunks[i],
+            translation_1_chunks[i],
+            country,
+            layout=layout,
+            chunk_index=i,
+        )
+
+        with call_context("reflect", i):
+            reflection = get_completion(
+                prompt,
+                system_message=system_message,
+                **routing.completion_kwargs("reflect"),
+            )
+            critique_recorded(reflection)
+        reflection_chunks.append(reflection)
+
+    return reflection_chunks
+
+
+def _multichunk_reflect_prompt(
+    source_lang: str,
+    target_lang: str,
+    tagged_text: str,
+    chunk: str,
+    translation_1_chunk: str,
+    country: str = "",
+    structured: bool = False,
+    layout: str = "tagged",
+    chunk_index: int = 0,
+) -> Tuple[str, str]:
+    """
+    Build the (system_message, prompt) pair reflecting on one chunk.
+
+    With structured=True the reflection is asked for a JSON verdict, see
+    reflection.verdict_prompt. In the "prefix" layout, tagged_text is the
+    untouched context and the chunk is named by chunk_index.
+    """
+
+    if layout == "prefix":
+        style = (
+            f"The final style and tone of the translation should match the style of {target_lang} colloquially spoken in {country}.\n"
+            if country != ""
+            else ""
+        )
+        instructions = f"""Your task is to carefully read the source text above and part of a translation of that text from {source_lang} to {target_lang}, and then give constructive criticism and helpful suggestions for improving the translation.
+{style}
+The source text has been split into consecutive parts. Only part {chunk_index + 1}, shown below between <TRANSLATE_THIS> and </TRANSLATE_THIS>, has been translated.
+You can use the rest of the source text as context for critiquing the translated part.
+
+<TRANSLATE_THIS>
+{chunk}
+</TRANSLATE_THIS>
+
+The translation of the indicated part, delimited below by <TRANSLATION> and </TRANSLATION>, is as follows:
+<TRANSLATION>
+{translation_1_chunk}
+</TRANSLATION>
+
+When writing suggestions, pay attention to whether there are ways to improve the translation's:
+(i) accuracy (by correcting errors of addition, mistranslation, omission, or untranslated text),
+(ii) fluency (by applying {target_lang} grammar, spelling and punctuation rules, and ensuring there are no unnecessary repetitions),
+(iii) style (by ensuring the translations reflect the style of the source text and takes into account any cultural context),
+(iv) terminology (by ensuring terminology use is consistent and reflects the source text domain; and by only ensuring you use equivalent idioms {target_lang}).
+
+{SUGGESTIONS_INSTRUCTIONS}"""
+        system_message, prompt = _prefix_prompt(
+            source_lang, target_lang, tagged_text, instructions
+        )
+        if structured:
+            prompt = verdict_prompt(prompt)
+        return system_message, prompt
 
     system_message = f"You are an expert linguist specializing in translation from {source_lang} to {target_lang}. \
 You will be provided with a source text and its translation and your goal is to improve the translation."
@@ -440,38 +1486,27 @@ Write a list of specific, helpful and constructive suggestions for improving the
 Each suggestion should address one specific part of the translation.
 Output only the suggestions and nothing else."""
 
-    reflection_chunks = []
-    for i in range(len(source_text_chunks)):
-        # Will translate chunk i
-        tagged_text = (
-            "".join(source_text_chunks[0:i])
-            + "<TRANSLATE_THIS>"
-            + source_text_chunks[i]
-            + "</TRANSLATE_THIS>"
-            + "".join(source_text_chunks[i + 1 :])
-        )
-        if country != "":
-            prompt = reflection_prompt.format(
-                source_lang=source_lang,
-                target_lang=target_lang,
-                tagged_text=tagged_text,
-                chunk_to_translate=source_text_chunks[i],
-                translation_1_chunk=translation_1_chunks[i],
-                country=country,
-            )
-        else:
-            prompt = reflection_prompt.format(
-                source_lang=source_lang,
-                target_lang=target_lang,
-                tagged_text=tagged_text,
-                chunk_to_translate=source_text_chunks[i],
-                translation_1_chunk=translation_1_chunks[i],
-            )
-
-        reflection = get_completion(prompt, system_message=system_message)
-        reflection_chunks.append(reflection)
+    if country != "":
+        prompt = reflection_prompt.format(
+            source_lang=source_lang,
+            target_lang=target_lang,
+            tagged_text=tagged_text,
+            chunk_to_translate=chunk,
+            translation_1_chunk=translation_1_chunk,
+            country=country,
+        )
+    else:
+        prompt = reflection_prompt.format(
+            source_lang=source_lang,
+            target_lang=target_lang,
+            tagged_text=tagged_text,
+            chunk_to_translate=chunk,
+            translation_1_chunk=translation_1_chunk,
+        )
 
-    return reflection_chunks
+    if structured:
+        prompt = verdict_prompt(prompt)
+    return system_message, prompt
 
 
 def multichunk_improve_translation(
@@ -480,6 +1515,9 @@ def multichunk_improve_translation(
     source_text_chunks: List[str],
     translation_1_chunks: List[str],
     reflection_chunks: List[str],
+    tagged_texts: Optional[List[str]] = None,
+    layout: str = "tagged",
+    routing: Optional[ModelRouting] = None,
 ) -> List[str]:
     """
     Improves the translation of a text from source language to target language by considering expert suggestions.
@@ -490,10 +1528,100 @@ def multichunk_improve_translation(
         source_text_chunks (List[str]): The source text divided into chunks.
         translation_1_chunks (List[str]): The initial translation of each chunk.
         reflection_chunks (List[str]): Expert suggestions for improving each translated chunk.
+        tagged_texts (Optional[List[str]]): The tagged context of each chunk, as built by
+            build_tagged_texts. Defaults to the whole document for every chunk.
+        layout (str): The prompt layout tagged_texts were built for, see
+            ContextPolicy.layout.
+        routing (Optional[ModelRouting]): The model of each stage. Defaults to
+            get_model_routing().
 
     Returns:
         List[str]: The improved translation of each chunk.
     """
+    if routing is None:
+        routing = get_model_routing()
+
+    if tagged_texts is None:
+        tagged_texts = build_tagged_texts(
+            source_text_chunks, ContextPolicy.full(layout)
+        )
+
+    translation_2_chunks = []
+    for i in range(len(source_text_chunks)):
+        # Will translate chunk i
+        system_message, prompt = _multichunk_improve_prompt(
+            source_lang,
+            target_lang,
+            tagged_texts[i],
+            source_text_chunks[i],
+            translation_1_chunks[i],
+            reflection_chunks[i],
+            layout=layout,
+            chunk_index=i,
+        )
+
+        with call_context("improve", i):
+            translation_2 = get_completion(
+                prompt,
+                system_message=system_message,
+                **routing.completion_kwargs("improve"),
+            )
+        translation_2_chunks.append(translation_2)
+
+    return translation_2_chunks
+
+
+def _multichunk_improve_prompt(
+    source_lang: str,
+    target_lang: str,
+    tagged_text: str,
+    chunk: str,
+    translation_1_chunk: str,
+    reflection_chunk: str,
+    layout: str = "tagged",
+    chunk_index: int = 0,
+) -> Tuple[str, str]:
+    """
+    Build the (system_message, prompt) pair improving one chunk.
+
+    In the "prefix" layout, tagged_text is the untouched context and the
+    chunk is named by chunk_index.
+    """
+
+    if layout == "prefix":
+        instructions = f"""Your task is to carefully read, then improve, a translation from {source_lang} to {target_lang} of PART of the source text above, taking into
+account a set of expert suggestions and constructive criticisms. Below, the part, its initial translation, and expert suggestions are provided.
+
+The source text has been split into consecutive parts. Only part {chunk_index + 1}, shown below between <TRANSLATE_THIS> and </TRANSLATE_THIS>, is being translated.
+You can use the rest of the source text as context, but need to provide a translation only of this part.
+
+<TRANSLATE_THIS>
+{chunk}
+</TRANSLATE_THIS>
+
+The translation of the indicated part, delimited below by <TRANSLATION> and </TRANSLATION>, is as follows:
+<TRANSLATION>
+{translation_1_chunk}
+</TRANSLATION>
+
+The expert translations of the indicated part, delimited below by <EXPERT_SUGGESTIONS> and </EXPERT_SUGGESTIONS>, is as follows:
+<EXPERT_SUGGESTIONS>
+{reflection_chunk}
+</EXPERT_SUGGESTIONS>
+
+Taking into account the expert suggestions rewrite the translation to improve it, paying attention
+to whether there are ways to improve the translation's
+
+(i) accuracy (by correcting errors of addition, mistranslation, omission, or untranslated text),
+(ii) fluency (by applying {target_lang} grammar, spelling and punctuation rules and ensuring there are no unnecessary repetitions),
+(iii) style (by ensuring the translations reflect the style of the source text)
+(iv) terminology (inappropriate for context, inconsistent use), or
+(v) other errors.
+
+Output only the new translation of the indicated part and nothing else."""
+        return _prefix_prompt(
+            source_lang, target_lang, tagged_text, instructions
+        )
 
     system_message = f"You are an expert linguist, specializing in translation editing from {source_lang} to {target_lang}."
 
@@ -534,34 +1662,27 @@ to whether there are ways to improve the translation's
 
 Output only the new translation of the indicated part and nothing else."""
 
-    translation_2_chunks = []
-    for i in range(len(source_text_chunks)):
-        # Will translate chunk i
-        tagged_text = (
-            "".join(source_text_chunks[0:i])
-            + "<TRANSLATE_THIS>"
-            + source_text_chunks[i]
-            + "</TRANSLATE_THIS>"
-            + "".join(source_text_chunks[i + 1 :])
-        )
-
-        prompt = improvement_prompt.format(
-            source_lang=source_lang,
-            target_lang=target_lang,
-            tagged_text=tagged_text,
-            chunk_to_translate=source_text_chunks[i],
-            translation_1_chunk=translation_1_chunks[i],
-            reflection_chunk=reflection_chunks[i],
-        )
-
-        translation_2 = get_completion(prompt, system_message=system_message)
-        translation_2_chunks.append(translation_2)
+    prompt = improvement_prompt.format(
+        source_lang=source_lang,
+        target_lang=target_lang,
+        tagged_text=tagged_text,
+        chunk_to_translate=chunk,
+        translation_1_chunk=translation_1_chunk,
+        reflection_chunk=reflection_chunk,
+    )
 
-    return translation_2_chunks
+    return system_message, prompt
 
 
 def multichunk_translation(
-    source_lang, target_lang, source_text_chunks, country: str = ""
+    source_lang,
+    target_lang,
+    source_text_chunks,
+    country: str = "",
+    context: ContextPolicy = FULL_CONTEXT,
+    structured_reflection: Optional[bool] = None,
+    fused: Optional[bool] = None,
+    routing: Optional[ModelRouting] = None,
 ):
     """
     Improves the translation of multiple text chunks based on the initial translation and reflection.
@@ -573,31 +1694,226 @@ def multichunk_translation(
         translation_1_chunks (List[str]): The list of initial translations for each source text chunk.
         reflection_chunks (List[str]): The list of reflections on the initial translations.
         country (str): Country specified for target language
+        context (ContextPolicy): How much surrounding text to send with each chunk.
+        structured_reflection (Optional[bool]): Skip the improve stage of chunks whose
+            JSON reflection finds no actionable issue. Defaults to STRUCTURED_REFLECTION.
+        fused (Optional[bool]): Reflect and improve each chunk in a single call.
+            Defaults to FUSED_REFLECTION.
+        routing (Optional[ModelRouting]): The model and temperature of each stage,
+            and the escalation model. Defaults to get_model_routing().
     Returns:
         List[str]: The list of improved translations for each source text chunk.
     """
 
-    translation_1_chunks = multichunk_initial_translation(
-        source_lang, target_lang, source_text_chunks
+    return run_sync(
+        multichunk_translation_async(
+            source_lang,
+            target_lang,
+            source_text_chunks,
+            country,
+            context=context,
+            structured_reflection=structured_reflection,
+            fused=fused,
+            routing=routing,
+        )
     )
 
-    reflection_chunks = multichunk_reflect_on_translation(
+
+async def _multichunk_translate_chunk(
+    source_lang: str,
+    target_lang: str,
+    tagged_text: str,
+    chunk: str,
+    country: str,
+    semaphore: asyncio.Semaphore,
+    chunk_index: Optional[int] = None,
+    structured_reflection: Optional[bool] = None,
+    fused: Optional[bool] = None,
+    layout: str = "tagged",
+    routing: Optional[ModelRouting] = None,
+    checkpoint: Optional[DocumentJournal] = None,
+) -> str:
+    """Run the initial/reflect/improve stages for one chunk back to back."""
+    if structured_reflection is None:
+        structured_reflection = STRUCTURED_REFLECTION
+    if fused is None:
+        fused = FUSED_REFLECTION
+    if routing is None:
+        routing = get_model_routing()
+
+    prompt_layout = {"layout": layout, "chunk_index": chunk_index or 0}
+
+    system_message, prompt = _multichunk_initial_prompt(
+        source_lang, target_lang, tagged_text, chunk, **prompt_layout
+    )
+    translation_1 = await _draft_async(
+        semaphore,
+        prompt,
+        system_message,
+        chunk,
+        routing,
+        chunk_index,
+        checkpoint,
+    )
+
+    system_message, prompt = _multichunk_reflect_prompt(
         source_lang,
         target_lang,
-        source_text_chunks,
-        translation_1_chunks,
+        tagged_text,
+        chunk,
+        translation_1,
         country,
+        **prompt_layout,
+    )
+    final_translation, reflection = await _reflect_or_revise(
+        semaphore,
+        system_message,
+        prompt,
+        translation_1,
+        chunk_index,
+        structured=structured_reflection,
+        fused=fused,
+        routing=routing,
+        checkpoint=checkpoint,
     )
+    if final_translation is not None:
+        return final_translation
 
-    translation_2_chunks = multichunk_improve_translation(
+    system_message, prompt = _multichunk_improve_prompt(
         source_lang,
         target_lang,
-        source_text_chunks,
-        translation_1_chunks,
-        reflection_chunks,
+        tagged_text,
+        chunk,
+        translation_1,
+        reflection,
+        **prompt_layout,
+    )
+    translation_2 = await limited_completion(
+        semaphore,
+        prompt,
+        system_message,
+        "improve",
+        chunk_index,
+        routing=routing,
+        checkpoint=checkpoint,
     )
 
-    return translation_2_chunks
+    return translation_2
+
+
+async def multichunk_translation_async(
+    source_lang: str,
+    target_lang: str,
+    source_text_chunks: List[str],
+    country: str = "",
+    max_concurrency: int = MAX_CONCURRENCY,
+    context: ContextPolicy = FULL_CONTEXT,
+    chunk_token_counts: Optional[List[int]] = None,
+    structured_reflection: Optional[bool] = None,
+    fused: Optional[bool] = None,
+    routing: Optional[ModelRouting] = None,
+) -> List[str]:
+    """
+    Translate multiple text chunks concurrently.
+
+    Each chunk runs its own initial -> reflect -> improve pipeline, so chunk i
+    moves on to reflection as soon as its own initial translation is back
+    instead of waiting for every other chunk. At most max_concurrency LLM
+    calls are in flight at once.
+
+    Args:
+        source_lang (str): The source language of the text chunks.
+        target_lang (str): The target language for translation.
+        source_text_chunks (List[str]): The list of source text chunks to be translated.
+        country (str): Country specified for target language
+        max_concurrency (int): Maximum number of LLM calls in flight.
+        context (ContextPolicy): How much surrounding text to send with each chunk.
+        chunk_token_counts (Optional[List[int]]): Token count of each chunk, if already known.
+        structured_reflection (Optional[bool]): Skip the improve stage of chunks whose
+            JSON reflection finds no actionable issue. Defaults to STRUCTURED_REFLECTION.
+        fused (Optional[bool]): Reflect and improve each chunk in a single call.
+            Defaults to FUSED_REFLECTION.
+        routing (Optional[ModelRouting]): The model and temperature of each stage,
+            and the escalation model. Defaults to get_model_routing().
+    Returns:
+        List[str]: The list of improved translations for each source text chunk.
+    """
+
+    translation_2_chunks = await asyncio.gather(
+        *_multichunk_tasks(
+            source_lang,
+            target_lang,
+            source_text_chunks,
+            country,
+            max_concurrency,
+            context,
+            chunk_token_counts,
+            structured_reflection,
+            fused,
+            routing,
+        )
+    )
+
+    return list(translation_2_chunks)
+
+
+async def _unchanged(text: str) -> str:
+    return text
+
+
+def _multichunk_tasks(
+    source_lang: str,
+    target_lang: str,
+    source_text_chunks: List[str],
+    country: str,
+    max_concurrency: int,
+    context: ContextPolicy,
+    chunk_token_counts: Optional[List[int]],
+    structured_reflection: Optional[bool],
+    fused: Optional[bool],
+    routing: Optional[ModelRouting] = None,
+    checkpoint: Optional[DocumentJournal] = None,
+) -> List[asyncio.Task]:
+    """
+    Start the pipeline of every chunk, returning one task per chunk.
+
+    Chunks the pre-filter finds nothing to translate in are returned
+    unchanged, but are still sent as context for the other chunks.
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+    # Built once per chunk and shared by all three stages.
+    tagged_texts = _chunk_tagged_texts(
+        source_text_chunks, context, chunk_token_counts
+    )
+    reasons: List[Optional[str]] = [None] * len(source_text_chunks)
+    if prefilter.PREFILTER:
+        reasons, skipped = prefilter.skipped_segments(
+            source_text_chunks, source_lang, target_lang
+        )
+        if skipped:
+            logger.debug("Chunks passed through unchanged: %s", skipped)
+
+    return [
+        asyncio.ensure_future(
+            _unchanged(source_text_chunks[i])
+            if reasons[i] is not None
+            else _multichunk_translate_chunk(
+                source_lang,
+                target_lang,
+                tagged_texts[i],
+                source_text_chunks[i],
+                country,
+                semaphore,
+                chunk_index=i,
+                structured_reflection=structured_reflection,
+                fused=fused,
+                layout=context.layout,
+                routing=routing,
+                checkpoint=checkpoint,
+            )
+        )
+        for i in range(len(source_text_chunks))
+    ]
 
 
 def calculate_chunk_size(token_count: int, token_limit: int) -> int:
@@ -641,47 +1957,567 @@ def calculate_chunk_size(token_count: int, token_limit: int) -> int:
     return chunk_size
 
 
-def translate(
+async def _adapt_memory_match(
+    source_lang: str,
+    target_lang: str,
+    source_text: str,
+    match: MemoryMatch,
+    routing: Optional[ModelRouting] = None,
+    checkpoint: Optional[DocumentJournal] = None,
+) -> str:
+    """
+    Turn a fuzzy translation memory match into a translation of source_text.
+
+    The stored translation is treated as the initial translation and only
+    the improve stage runs, with the matched segment as the suggestion.
+    """
+    reflection = f"""This draft is the approved translation of a similar, but not identical, source text:
+{match.source}
+
+Keep the approved wording where the two source texts agree, and change only what is needed so the translation matches the source text exactly."""
+
+    system_message, prompt = _one_chunk_improve_prompt(
+        source_lang, target_lang, source_text, match.translation, reflection
+    )
+    return await limited_completion(
+        asyncio.Semaphore(1),
+        prompt,
+        system_message,
+        "adapt",
+        routing=routing,
+        checkpoint=checkpoint,
+    )
+
+
+async def translate_stream_async(
     source_lang,
     target_lang,
     source_text,
     country,
     max_tokens=MAX_TOKENS_PER_CHUNK,
+    max_concurrency=MAX_CONCURRENCY,
+    context=FULL_CONTEXT,
+    memory=None,
+    structured_reflection=None,
+    fused=None,
+    routing=None,
+    journal=None,
 ):
-    """Translate the source_text from source_lang to target_lang."""
+    """Translate source_text like translate_async, one chunk at a time.
 
-    num_tokens_in_text = num_tokens_in_string(source_text)
+    The chunks are translated concurrently, as by translate_async, and each
+    final chunk translation is yielded, in document order, as soon as it and
+    every chunk before it are ready. Joining the yielded strings gives the
+    return value of translate_async. Closing the generator early cancels
+    the chunks still in flight.
+    """
+    if routing is None:
+        routing = get_model_routing()
+    if structured_reflection is None:
+        structured_reflection = STRUCTURED_REFLECTION
+    if fused is None:
+        fused = FUSED_REFLECTION
+
+    if prefilter.PREFILTER:
+        (reason,), _ = prefilter.skipped_segments(
+            [source_text], source_lang, target_lang
+        )
+        if reason is not None:
+            logger.debug("Passing source text through unchanged (%s)", reason)
+            yield source_text
+            return
+
+    if memory is None:
+        memory = translation_memory
+    settings = (
+        country,
+        max_tokens,
+        max_concurrency,
+        context,
+        structured_reflection,
+        fused,
+        routing,
+        journal,
+    )
 
-    ic(num_tokens_in_text)
+    # Segments marked with their ids are keyed in the memory without the
+    # markers, so the same paragraph matches wherever it appears.
+    ids = find_ids(source_text)
+    if memory is not None and not ids:
+        match = memory.lookup(source_text, source_lang, target_lang)
+        if match is not None and match.exact:
+            logger.debug("Translation memory exact match")
+            yield match.translation
+            return
+        if match is not None:
+            logger.debug(
+                "Translation memory fuzzy match (similarity %.2f)",
+                match.similarity,
+            )
+            final_translation = await _adapt_memory_match(
+                source_lang,
+                target_lang,
+                source_text,
+                match,
+                routing,
+                _document_checkpoint(
+                    source_lang, target_lang, source_text, *settings
+                ),
+            )
+            memory.add(
+                source_text, final_translation, source_lang, target_lang
+            )
+            yield final_translation
+            return
+
+    # A block of paragraphs rarely repeats as a whole, but its paragraphs
+    # do: look each one up, and only translate the ones the memory lacks.
+    # Paragraphs are the marked segments, or else the non-blank lines.
+    lines = source_text.split("\n")
+    if ids:
+        paragraphs: Dict[Union[str, int], str] = dict(
+            split_by_ids(source_text, ids)
+        )
+    else:
+        paragraphs = {i: line for i, line in enumerate(lines) if line.strip()}
+    found: Dict[Union[str, int], str] = {}
+    if memory is not None and (ids or len(paragraphs) > 1):
+        for key, paragraph in paragraphs.items():
+            match = memory.lookup(paragraph, source_lang, target_lang)
+            if match is not None and match.exact:
+                found[key] = match.translation
+
+    if not found:
+        final_translation = ""
+        chunks = _translate_chunks(
+            source_lang, target_lang, source_text, *settings
+        )
+        try:
+            async for chunk in chunks:
+                final_translation += chunk
+                yield chunk
+        finally:
+            # Closing this generator early cancels the chunks in flight.
+            await chunks.aclose()
+        if memory is not None:
+            _remember(
+                memory,
+                source_lang,
+                target_lang,
+                source_text,
+                final_translation,
+                paragraphs,
+                bool(ids),
+            )
+        return
+
+    logger.debug(
+        "Translation memory has %d of %d paragraphs",
+        len(found),
+        len(paragraphs),
+    )
+    # The paragraphs the memory lacks are translated in runs of neighbours,
+    # each put back where it was, so the document keeps its order even
+    # when a run's translation does not come back one line per paragraph.
+    runs: List[List[Union[str, int]]] = [[]]
+    for key in paragraphs:
+        if key in found:
+            runs.append([])
+        else:
+            runs[-1].append(key)
+    runs = [run for run in runs if run]
+    if ids:
+        run_texts = [
+            join_with_ids(run, [paragraphs[key] for key in run])
+            for run in runs
+        ]
+    else:
+        run_texts = ["\n".join(lines[run[0] : run[-1] + 1]) for run in runs]
+    tasks = [
+        asyncio.ensure_future(
+            _translate_text(source_lang, target_lang, run_text, *settings)
+        )
+        for run_text in run_texts
+    ]
+
+    async def translated_run(k: int) -> List[str]:
+        translation = await tasks[k]
+        translated = _remember(
+            memory,
+            source_lang,
+            target_lang,
+            run_texts[k],
+            translation,
+            {key: paragraphs[key] for key in runs[k]},
+            bool(ids),
+        )
+        if not ids:
+            return [translation.strip("\n")]
+        # Segments whose marker the model dropped are left out, so the
+        # caller sees them as untranslated.
+        return [
+            join_with_ids([key], [translated[key]])
+            for key in runs[k]
+            if key in translated
+        ]
+
+    # Memory hits are yielded at once, and each run as soon as it and the
+    # runs before it are translated.
+    positions = list(paragraphs) if ids else list(range(len(lines)))
+    index = {position: n for n, position in enumerate(positions)}
+    run_at = {run[0]: k for k, run in enumerate(runs)}
+    pieces: List[str] = []
+    separator = ""
+    n = 0
+    try:
+        while n < len(positions):
+            position = positions[n]
+            if position not in run_at:
+                if ids:
+                    pieces.append(join_with_ids([position], [found[position]]))
+                else:
+                    pieces.append(found.get(position, lines[position]))
+                n += 1
+                continue
+            if pieces:
+                yield separator + "\n".join(pieces)
+                separator, pieces = "\n", []
+            k = run_at[position]
+            pieces.extend(await translated_run(k))
+            n = index[runs[k][-1]] + 1
+        if pieces:
+            yield separator + "\n".join(pieces)
+    finally:
+        # Closing this generator early cancels the runs in flight.
+        for task in tasks:
+            task.cancel()
+
+
+async def _translate_text(
+    source_lang: str,
+    target_lang: str,
+    source_text: str,
+    *settings,
+) -> str:
+    """Run the workflow on source_text and return the whole translation."""
+    return "".join(
+        [
+            chunk
+            async for chunk in _translate_chunks(
+                source_lang, target_lang, source_text, *settings
+            )
+        ]
+    )
 
-    if num_tokens_in_text < max_tokens:
-        ic("Translating text as single chunk")
 
-        final_translation = one_chunk_translate_text(
-            source_lang, target_lang, source_text, country
+def _document_checkpoint(
+    source_lang: str,
+    target_lang: str,
+    source_text: str,
+    country: str,
+    max_tokens: int,
+    max_concurrency: int,
+    context: ContextPolicy,
+    structured_reflection: bool,
+    fused: bool,
+    routing: ModelRouting,
+    journal: Optional[Journal],
+) -> Optional[DocumentJournal]:
+    """The journal records of source_text translated with these settings."""
+    if journal is None:
+        return None
+    return journal.document(
+        document_key(
+            source_lang,
+            target_lang,
+            source_text,
+            country,
+            max_tokens,
+            context,
+            structured_reflection,
+            fused,
+            routing,
         )
+    )
 
-        return final_translation
 
+def _remember(
+    memory: TranslationMemory,
+    source_lang: str,
+    target_lang: str,
+    source_text: str,
+    translation: str,
+    paragraphs: Dict[Union[str, int], str],
+    by_ids: bool,
+) -> Optional[Dict[Union[str, int], str]]:
+    """
+    Write a new translation back to the memory, paragraph by paragraph.
+
+    Args:
+        paragraphs (Dict[Union[str, int], str]): The paragraphs of
+            source_text, by segment id if by_ids, else by line.
+        by_ids (bool): Whether the paragraphs are marked with their ids,
+            and the translation is matched back by marker rather than line.
+
+    Returns:
+        Optional[Dict[Union[str, int], str]]: The translation of each
+            paragraph found in the translation, or None if unmarked
+            paragraphs cannot be matched to its lines, in which case only
+            the whole text is stored.
+    """
+    if by_ids:
+        translated: Optional[Dict[Union[str, int], str]] = dict(
+            split_by_ids(translation, list(paragraphs))
+        )
+    elif len(paragraphs) <= 1:
+        translated = dict.fromkeys(paragraphs, translation)
     else:
-        ic("Translating text as multiple chunks")
+        lines = [line for line in translation.split("\n") if line.strip()]
+        translated = None
+        if len(lines) == len(paragraphs):
+            translated = dict(zip(paragraphs, lines))
+    if translated is None:
+        memory.add(source_text, translation, source_lang, target_lang)
+        return None
+    for key, translated_paragraph in translated.items():
+        memory.add(
+            paragraphs[key], translated_paragraph, source_lang, target_lang
+        )
+    return translated
+
+
+async def _translate_chunks(
+    source_lang: str,
+    target_lang: str,
+    source_text: str,
+    country: str,
+    max_tokens: int,
+    max_concurrency: int,
+    context: ContextPolicy,
+    structured_reflection: bool,
+    fused: bool,
+    routing: ModelRouting,
+    journal: Optional[Journal],
+) -> AsyncIterator[str]:
+    """Run the workflow on source_text, yielding each final chunk in order."""
+    checkpoint = _document_checkpoint(
+        source_lang,
+        target_lang,
+        source_text,
+        country,
+        max_tokens,
+        max_concurrency,
+        context,
+        structured_reflection,
+        fused,
+        routing,
+        journal,
+    )
+
+    # Encoded once: the same token ids are used to count and to chunk.
+    tokenized_text = TokenizedText(source_text)
+    num_tokens_in_text = len(tokenized_text)
+
+    logger.debug("Source text has %d tokens", num_tokens_in_text)
 
-        token_size = calculate_chunk_size(
-            token_count=num_tokens_in_text, token_limit=max_tokens
+    if num_tokens_in_text < max_tokens:
+        logger.debug("Translating text as single chunk")
+
+        yield await one_chunk_translate_text_async(
+            source_lang,
+            target_lang,
+            source_text,
+            country,
+            max_concurrency,
+            structured_reflection,
+            fused,
+            routing,
+            checkpoint,
         )
 
-        ic(token_size)
+    else:
+        logger.debug("Translating text as multiple chunks")
+
+        chunk_spans = split_into_chunks(tokenized_text, max_tokens)
+
+        logger.debug(
+            "Chunk token counts: %s",
+            [span.num_tokens for span in chunk_spans],
+        )
 
-        text_splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
-            model_name="gpt-4",
-            chunk_size=token_size,
-            chunk_overlap=0,
+        source_text_chunks = [
+            source_text[span.start : span.end] for span in chunk_spans
+        ]
+
+        tasks = _multichunk_tasks(
+            source_lang,
+            target_lang,
+            source_text_chunks,
+            country,
+            max_concurrency,
+            context,
+            [span.num_tokens for span in chunk_spans],
+            structured_reflection,
+            fused,
+            routing,
+            checkpoint,
         )
+        try:
+            for task in tasks:
+                yield await task
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def translate_async(
+    source_lang,
+    target_lang,
+    source_text,
+    country,
+    max_tokens=MAX_TOKENS_PER_CHUNK,
+    max_concurrency=MAX_CONCURRENCY,
+    context=FULL_CONTEXT,
+    memory=None,
+    structured_reflection=None,
+    fused=None,
+    routing=None,
+    journal=None,
+):
+    """Translate the source_text like translate, without blocking the loop.
+
+    Takes the same arguments as translate, which documents them.
+    """
 
-        source_text_chunks = text_splitter.split_text(source_text)
+    return "".join(
+        [
+            chunk
+            async for chunk in translate_stream_async(
+                source_lang,
+                target_lang,
+                source_text,
+                country,
+                max_tokens=max_tokens,
+                max_concurrency=max_concurrency,
+                context=context,
+                memory=memory,
+                structured_reflection=structured_reflection,
+                fused=fused,
+                routing=routing,
+                journal=journal,
+            )
+        ]
+    )
+
+
+def translate(
+    source_lang,
+    target_lang,
+    source_text,
+    country,
+    max_tokens=MAX_TOKENS_PER_CHUNK,
+    max_concurrency=MAX_CONCURRENCY,
+    context=FULL_CONTEXT,
+    memory=None,
+    structured_reflection=None,
+    fused=None,
+    routing=None,
+    journal=None,
+):
+    """Translate the source_text from source_lang to target_lang.
+
+    `context` is a ContextPolicy choosing how much of the document is sent
+    as context with each chunk: the full text (default), k neighbouring
+    chunks, or a token budget around the chunk.
+
+    `memory` is a TranslationMemory consulted before any LLM call (defaults
+    to the one configured by TRANSLATION_MEMORY_PATH). Exact matches are
+    returned as is, fuzzy matches only go through the improve stage, and
+    every new final translation is written back. A text of several
+    paragraphs (lines) is also looked up paragraph by paragraph, only the
+    paragraphs without an exact match are translated, and the translation
+    is written back per paragraph when it has one line per paragraph.
+
+    `structured_reflection` asks the reflection stage for a JSON list of
+    issues and keeps the initial translation of any chunk without an
+    actionable issue, saving its improve call (defaults to
+    TRANSLATION_STRUCTURED_REFLECTION).
+
+    `fused` reflects and improves each chunk in a single JSON-mode call, two
+    calls per chunk instead of three (defaults to
+    TRANSLATION_FUSED_REFLECTION). Critiques reach the call handlers'
+    on_critique in both modes.
+
+    Source texts and chunks with nothing to translate (numbers, dates,
+    codes, URLs, or text already in the target script) are returned
+    unchanged without any LLM call, unless TRANSLATION_PREFILTER is "false".
+
+    `routing` is a ModelRouting choosing the model and temperature of each
+    stage, e.g. ModelRouting.tiered("gpt-4o-mini", "gpt-4-turbo") drafts and
+    reflects with the small model and improves with the large one. A draft
+    failing draft_issues() (empty, wrong line count, leftover tags, ...) is
+    redone with the escalation model. Defaults to get_model_routing(), set
+    by the TRANSLATION_<STAGE>_MODEL and _TEMPERATURE variables.
+
+    `journal` is a Journal every LLM reply is appended to as it arrives,
+    keyed by the source text and the settings above. Replies an earlier,
+    interrupted run recorded in a resumed journal are replayed without LLM
+    calls, so the translation carries on from the first missing stage.
+    """
 
-        translation_2_chunks = multichunk_translation(
-            source_lang, target_lang, source_text_chunks, country
+    return run_sync(
+        translate_async(
+            source_lang,
+            target_lang,
+            source_text,
+            country,
+            max_tokens=max_tokens,
+            max_concurrency=max_concurrency,
+            context=context,
+            memory=memory,
+            structured_reflection=structured_reflection,
+            fused=fused,
+            routing=routing,
+            journal=journal,
         )
+    )
+
+
+def translate_stream(
+    source_lang,
+    target_lang,
+    source_text,
+    country,
+    max_tokens=MAX_TOKENS_PER_CHUNK,
+    max_concurrency=MAX_CONCURRENCY,
+    context=FULL_CONTEXT,
+    memory=None,
+    structured_reflection=None,
+    fused=None,
+    routing=None,
+    journal=None,
+):
+    """Translate source_text like translate, one chunk at a time.
+
+    A generator yielding each final chunk translation in document order as
+    soon as it is ready (see translate_stream_async), so callers can show a
+    long translation while the rest is still being translated.
+    """
 
-        return "".join(translation_2_chunks)
+    return _iterate_sync(
+        translate_stream_async(
+            source_lang,
+            target_lang,
+            source_text,
+            country,
+            max_tokens=max_tokens,
+            max_concurrency=max_concurrency,
+            context=context,
+            memory=memory,
+            structured_reflection=structured_reflection,
+            fused=fused,
+            routing=routing,
+            journal=journal,
+        )
+    )
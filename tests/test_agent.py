@@ -1,3 +1,4 @@
+import asyncio
 import json
 import os
 from unittest.mock import patch
@@ -8,11 +9,13 @@ from dotenv import load_dotenv
 
 # from translation_agent.utils import find_sentence_starts
 from translation_agent.utils import get_completion
+from translation_agent.utils import multichunk_translation_async
 from translation_agent.utils import num_tokens_in_string
 from translation_agent.utils import one_chunk_improve_translation
 from translation_agent.utils import one_chunk_initial_translation
 from translation_agent.utils import one_chunk_reflect_on_translation
 from translation_agent.utils import one_chunk_translate_text
+from translation_agent.utils import translate
 
 
 load_dotenv()
@@ -287,3 +290,84 @@ def test_num_tokens_in_string():
     assert (
         num_tokens_in_string("Hello, world!", encoding_name="p50k_base") == 4
     )
+
+
+def _stage_of(prompt):
+    if "then improve" in prompt or "then edit" in prompt:
+        return "improve"
+    if "constructive criticism" in prompt:
+        return "reflect"
+    return "initial"
+
+
+def test_multichunk_translation_async_pipelines_chunks(mocker):
+    source_text_chunks = ["chunk-0 ", "chunk-1 ", "chunk-2"]
+    events = []
+
+    async def fake_completion(prompt, system_message=None, **kwargs):
+        stage = _stage_of(prompt)
+        chunk = prompt.split("<TRANSLATE_THIS>\n")[1].split("\n")[0]
+        events.append(("start", stage, chunk))
+        # chunk-1 is slow to translate; the others should not wait for it
+        if stage == "initial" and chunk == "chunk-1 ":
+            await asyncio.sleep(0.05)
+        events.append(("end", stage, chunk))
+        return f"{stage}:{chunk}"
+
+    mocker.patch(
+        "translation_agent.utils.get_completion_async",
+        side_effect=fake_completion,
+    )
+
+    result = asyncio.run(
+        multichunk_translation_async(
+            "English", "Spanish", source_text_chunks, "Mexico"
+        )
+    )
+
+    assert result == [f"improve:{chunk}" for chunk in source_text_chunks]
+    assert len(events) == 2 * 3 * len(source_text_chunks)
+    # chunk-0 is fully improved before chunk-1's initial translation returns
+    assert events.index(("end", "improve", "chunk-0 ")) < events.index(
+        ("end", "initial", "chunk-1 ")
+    )
+
+
+def test_multichunk_translation_async_respects_concurrency(mocker):
+    in_flight = 0
+    peak = 0
+
+    async def fake_completion(prompt, system_message=None, **kwargs):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return "translated"
+
+    mock_completion = mocker.patch(
+        "translation_agent.utils.get_completion_async",
+        side_effect=fake_completion,
+    )
+
+    result = asyncio.run(
+        multichunk_translation_async(
+            "English", "Spanish", ["a"] * 10, max_concurrency=3
+        )
+    )
+
+    assert result == ["translated"] * 10
+    assert mock_completion.call_count == 30
+    assert peak == 3
+
+
+def test_translate_is_sync_wrapper(mocker):
+    async def fake_completion(prompt, system_message=None, **kwargs):
+        return _stage_of(prompt)
+
+    mocker.patch(
+        "translation_agent.utils.get_completion_async",
+        side_effect=fake_completion,
+    )
+
+    assert translate("English", "Spanish", "Hello", "Mexico") == "improve"
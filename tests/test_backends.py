@@ -0,0 +1,130 @@
+import os
+import subprocess
+import sys
+
+import openai
+import pytest
+import translation_agent.utils as utils
+from translation_agent.backends import Completion
+from translation_agent.backends import OpenAIBackend
+from translation_agent.backends import get_backend
+from translation_agent.backends import set_backend
+from translation_agent.fake_server import FakeBackend
+from translation_agent.fake_server import FakeServer
+from translation_agent.ratelimit import RateLimiter
+from translation_agent.ratelimit import get_rate_limiter
+from translation_agent.retry import RetryPolicy
+
+
+@pytest.fixture
+def fake_backend(mocker):
+    backend = FakeBackend()
+    mocker.patch("translation_agent.backends._backend", backend)
+    mocker.patch.object(utils, "completion_cache", None)
+    mocker.patch("translation_agent.ratelimit._rate_limiter", RateLimiter())
+    return backend
+
+
+def test_import_needs_no_api_key():
+    env = {k: v for k, v in os.environ.items() if k != "OPENAI_API_KEY"}
+    result = subprocess.run(
+        [sys.executable, "-c", "import translation_agent"],
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+
+    assert result.returncode == 0, result.stderr
+
+
+def test_default_backend_is_openai(mocker):
+    mocker.patch("translation_agent.backends._backend", None)
+
+    assert isinstance(get_backend(), OpenAIBackend)
+    assert get_backend() is get_backend()
+
+
+def test_completion_total_tokens():
+    assert Completion("text", 10, 5).total_tokens == 15
+    assert Completion("text").total_tokens is None
+
+
+def test_get_completion_dispatches_to_the_backend(fake_backend):
+    text = utils.get_completion("Hello", system_message="System")
+
+    expected = fake_backend.llm.reply(
+        [
+            {"role": "system", "content": "System"},
+            {"role": "user", "content": "Hello"},
+        ],
+        "gpt-4-turbo",
+    )
+    assert text == expected.text
+    assert fake_backend.llm.stats()["completed"] == 1
+
+
+def test_throttled_requests_are_retried(mocker, fake_backend):
+    fake_backend.llm.throttle_rate = 0.5
+    mocker.patch(
+        "translation_agent.retry.retry_policy",
+        RetryPolicy(max_attempts=20, base_delay=0.001, max_delay=0.001),
+    )
+
+    for i in range(10):
+        utils.get_completion(f"Hello {i}")
+
+    stats = fake_backend.llm.stats()
+    assert stats["completed"] == 10
+    assert stats["throttled"] > 0
+    limiter_stats = get_rate_limiter().stats()["gpt-4-turbo"]
+    assert limiter_stats["throttled"] == stats["throttled"]
+
+
+def test_translate_runs_offline(fake_backend):
+    source_text = "A sentence to translate.\n" * 40
+
+    translation = utils.translate(
+        "English", "Spanish", source_text, "Mexico", max_tokens=300
+    )
+
+    assert translation
+    assert fake_backend.llm.stats()["completed"] % 3 == 0
+
+
+def test_openai_backend_against_fake_server(mocker):
+    mocker.patch.object(utils, "completion_cache", None)
+    with FakeServer() as server:
+        set_backend(OpenAIBackend(api_key="fake", base_url=server.base_url))
+        try:
+            text = utils.get_completion("Hello")
+            async_text = utils.run_sync(utils.get_completion_async("Hello"))
+        finally:
+            set_backend(None)
+
+    assert text == async_text
+    assert server.llm.stats()["completed"] == 2
+
+
+def test_sync_calls_close_their_async_client(mocker):
+    mocker.patch.object(utils, "completion_cache", None)
+    closed = mocker.spy(openai.AsyncOpenAI, "close")
+    with FakeServer() as server:
+        set_backend(OpenAIBackend(api_key="fake", base_url=server.base_url))
+        try:
+            for _ in range(2):
+                utils.run_sync(utils.get_completion_async("Hello"))
+        finally:
+            set_backend(None)
+
+    assert closed.call_count == 2
+
+
+def test_openai_backend_reports_cached_tokens():
+    prompt = "A sentence to translate. " * 300
+    with FakeServer() as server:
+        backend = OpenAIBackend(api_key="fake", base_url=server.base_url)
+        first = backend.complete(prompt, "System", "gpt-4-turbo", 0.3)
+        second = backend.complete(prompt, "System", "gpt-4-turbo", 0.3)
+
+    assert first.cached_tokens == 0
+    assert second.cached_tokens >= 1024
@@ -0,0 +1,112 @@
+import pytest
+import translation_agent.utils as utils
+from translation_agent.batch import BatchItem
+from translation_agent.batch import BatchTranslator
+from translation_agent.cache import CompletionCache
+from translation_agent.fake_server import FakeLLM
+from translation_agent.fake_server import FakeServer
+
+
+@pytest.fixture
+def batch_server():
+    with FakeServer() as server:
+        yield server, server.client()
+
+
+def fake_completion(system_message, prompt):
+    messages = [
+        {"role": "system", "content": system_message},
+        {"role": "user", "content": prompt},
+    ]
+    return FakeLLM().reply(messages, "gpt-4-turbo").text
+
+
+def expected_one_chunk(item):
+    system_message, prompt = utils._one_chunk_initial_prompt(
+        item.source_lang, item.target_lang, item.source_text
+    )
+    translation_1 = fake_completion(system_message, prompt)
+    system_message, prompt = utils._one_chunk_reflect_prompt(
+        item.source_lang,
+        item.target_lang,
+        item.source_text,
+        translation_1,
+        item.country,
+    )
+    reflection = fake_completion(system_message, prompt)
+    system_message, prompt = utils._one_chunk_improve_prompt(
+        item.source_lang,
+        item.target_lang,
+        item.source_text,
+        translation_1,
+        reflection,
+    )
+    return fake_completion(system_message, prompt)
+
+
+def test_three_stages_run_as_three_batches(batch_server, mocker):
+    server, client = batch_server
+    mocker.patch.object(utils, "completion_cache", None)
+    items = [
+        BatchItem("English", "Spanish", "Hello, how are you?", "Mexico"),
+        BatchItem("English", "Chinese", "Good morning.", "China"),
+    ]
+
+    translations = BatchTranslator(client, poll_interval=0).translate(items)
+
+    assert translations == [expected_one_chunk(item) for item in items]
+    assert len(server.batches) == 3
+    assert len(server.batch_requests) == 3 * len(items)
+
+
+def test_long_texts_are_chunked(batch_server, mocker):
+    server, client = batch_server
+    mocker.patch.object(utils, "completion_cache", None)
+    source_text = "A sentence to translate.\n" * 200
+    items = [BatchItem("English", "Spanish", source_text)]
+
+    translations = BatchTranslator(
+        client, max_tokens=300, poll_interval=0
+    ).translate(items)
+
+    improve_requests = server.batch_requests[
+        -len(server.batch_requests) // 3 :
+    ]
+    assert len(improve_requests) > 1
+    assert translations[0] == "".join(
+        fake_completion(*(m["content"] for m in request["body"]["messages"]))
+        for request in improve_requests
+    )
+
+
+def test_failed_lines_fall_back_to_get_completion(mocker):
+    mocker.patch.object(utils, "completion_cache", None)
+    get_completion = mocker.patch.object(
+        utils, "get_completion", return_value="interactive"
+    )
+    items = [BatchItem("English", "Spanish", "Hello, how are you?")]
+
+    with FakeServer(error_rate=1.0) as server:
+        translations = BatchTranslator(
+            server.client(), poll_interval=0
+        ).translate(items)
+
+    assert translations == ["interactive"]
+    assert get_completion.call_count == 3
+
+
+def test_cached_requests_are_not_resubmitted(batch_server, mocker, tmp_path):
+    server, client = batch_server
+    mocker.patch.object(
+        utils,
+        "completion_cache",
+        CompletionCache(str(tmp_path / "cache.sqlite3")),
+    )
+    items = [BatchItem("English", "Spanish", "Hello, how are you?")]
+    translator = BatchTranslator(client, poll_interval=0)
+
+    first = translator.translate(items)
+    second = translator.translate(items)
+
+    assert first == second
+    assert len(server.batches) == 3
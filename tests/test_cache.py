@@ -0,0 +1,116 @@
+import multiprocessing
+import time
+
+import pytest
+
+import translation_agent.utils as utils
+from translation_agent.backends import OpenAIBackend
+from translation_agent.cache import CompletionCache
+from translation_agent.cache import completion_key
+
+
+@pytest.fixture
+def cache_path(tmp_path):
+    return str(tmp_path / "completions.sqlite3")
+
+
+def test_completion_key_covers_every_request_field():
+    base = completion_key("prompt", "system", "gpt-4-turbo", 0.3, False)
+
+    assert base == completion_key("prompt", "system", "gpt-4-turbo", 0.3, False)
+    assert base != completion_key("prompt!", "system", "gpt-4-turbo", 0.3, False)
+    assert base != completion_key("prompt", "system!", "gpt-4-turbo", 0.3, False)
+    assert base != completion_key("prompt", "system", "gpt-4o", 0.3, False)
+    assert base != completion_key("prompt", "system", "gpt-4-turbo", 0.0, False)
+    assert base != completion_key("prompt", "system", "gpt-4-turbo", 0.3, True)
+
+
+def test_get_put_and_counters(cache_path):
+    cache = CompletionCache(cache_path)
+
+    assert cache.get("k") is None
+    cache.put("k", "Hola")
+    assert cache.get("k") == "Hola"
+
+    stats = cache.stats()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["entries"] == 1
+    assert stats["bytes"] == len("Hola")
+
+
+def test_max_age_expires_entries(cache_path):
+    cache = CompletionCache(cache_path, max_age=0.05)
+    cache.put("k", "Hola")
+    time.sleep(0.1)
+
+    assert cache.get("k") is None
+    assert cache.evict() == 1
+    assert cache.stats()["entries"] == 0
+
+
+def test_max_bytes_evicts_least_recently_used(cache_path):
+    cache = CompletionCache(cache_path, max_bytes=10)
+    cache.put("old", "aaaaa")
+    time.sleep(0.01)
+    cache.put("new", "bbbbb")
+    time.sleep(0.01)
+    cache.get("old")  # touch "old" so "new" is now least recently used
+    cache.put("newest", "ccccc")
+
+    assert cache.evict() == 1
+    assert cache.get("new") is None
+    assert cache.get("old") == "aaaaa"
+    assert cache.get("newest") == "ccccc"
+
+
+def test_read_only_mode_never_writes(cache_path):
+    assert CompletionCache(cache_path, read_only=True).get("k") is None
+
+    CompletionCache(cache_path).put("k", "Hola")
+    read_only = CompletionCache(cache_path, read_only=True)
+    read_only.put("other", "Adios")
+
+    assert read_only.get("k") == "Hola"
+    assert read_only.get("other") is None
+
+
+def _write_entries(path, prefix):
+    cache = CompletionCache(path)
+    for i in range(50):
+        cache.put(f"{prefix}-{i}", f"value-{i}")
+
+
+def test_cache_is_shared_between_processes(cache_path):
+    CompletionCache(cache_path)
+    workers = [
+        multiprocessing.Process(target=_write_entries, args=(cache_path, p))
+        for p in ("a", "b", "c")
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+
+    assert all(worker.exitcode == 0 for worker in workers)
+    cache = CompletionCache(cache_path)
+    assert cache.stats()["entries"] == 150
+    assert cache.get("b-49") == "value-49"
+
+
+def test_get_completion_serves_repeated_requests_from_cache(
+    mocker, cache_path
+):
+    mocker.patch.object(utils, "completion_cache", CompletionCache(cache_path))
+    # A backend of its own, so the test needs no OPENAI_API_KEY.
+    mocker.patch(
+        "translation_agent.backends._backend", OpenAIBackend(api_key="sk-test")
+    )
+    mock_create = mocker.patch.object(utils.client.chat.completions, "create")
+    mock_create.return_value.choices[0].message.content = "Paris"
+
+    assert utils.get_completion("Capital of France?") == "Paris"
+    assert utils.get_completion("Capital of France?") == "Paris"
+
+    mock_create.assert_called_once()
+    assert utils.completion_cache.stats()["hits"] == 1
@@ -0,0 +1,79 @@
+import os
+
+from translation_agent.chunking import PARAGRAPH
+from translation_agent.chunking import SENTENCE
+from translation_agent.chunking import boundary_ranks
+from translation_agent.chunking import split_into_chunks
+from translation_agent.tokenizer import TokenizedText
+from translation_agent.tokenizer import count_tokens
+
+
+SAMPLE_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "examples",
+    "sample-texts",
+    "sample-long1.txt",
+)
+
+
+def _sample_text():
+    with open(SAMPLE_PATH, encoding="utf-8") as file:
+        return file.read()
+
+
+def test_chunks_cover_text_and_respect_max_tokens():
+    text = _sample_text()
+    tokenized = TokenizedText(text)
+
+    for max_tokens in (100, 250, 500, 1000):
+        spans = split_into_chunks(tokenized, max_tokens)
+
+        assert "".join(text[s.start : s.end] for s in spans) == text
+        assert spans[0].start_token == 0
+        assert spans[-1].end_token == len(tokenized)
+        assert all(s.num_tokens <= max_tokens for s in spans)
+
+
+def test_chunks_are_balanced():
+    tokenized = TokenizedText(_sample_text())
+    spans = split_into_chunks(tokenized, 300)
+    target = len(tokenized) / len(spans)
+
+    assert all(abs(s.num_tokens - target) <= target / 5 for s in spans)
+
+
+def test_cuts_prefer_paragraphs_then_sentences():
+    paragraph = "One short sentence here. Another one follows it. " * 6
+    text = "\n".join([paragraph.strip()] * 8)
+    tokenized = TokenizedText(text)
+
+    # room for four chunks of two paragraphs each
+    spans = split_into_chunks(tokenized, int(len(tokenized) / 4 * 1.3))
+
+    assert len(spans) == 4
+    assert all(text[s.start : s.end].endswith("\n") for s in spans[:-1])
+
+
+def test_sentence_boundaries_without_paragraphs():
+    text = "Sentence number one is here. " * 60
+    ranks = boundary_ranks(TokenizedText(text))
+
+    spans = split_into_chunks(TokenizedText(text), 200)
+
+    assert SENTENCE in ranks and PARAGRAPH not in ranks[:-1]
+    assert all(
+        text[s.start : s.end].rstrip().endswith(".") for s in spans[:-1]
+    )
+
+
+def test_spans_match_token_counts():
+    tokenized = TokenizedText(_sample_text())
+
+    for span in split_into_chunks(tokenized, 400):
+        chunk = tokenized.text[span.start : span.end]
+        # re-encoding a chunk may merge tokens across the cut differently
+        assert abs(count_tokens(chunk) - span.num_tokens) <= 2
+
+
+def test_empty_text():
+    assert split_into_chunks(TokenizedText(""), 100) == []
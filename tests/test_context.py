@@ -0,0 +1,146 @@
+import asyncio
+
+import pytest
+import translation_agent.utils as utils
+from translation_agent.context import ContextPolicy
+from translation_agent.context import build_tagged_texts
+from translation_agent.fake_server import FakeBackend
+from translation_agent.instrumentation import MetricsCollector
+from translation_agent.instrumentation import instrument
+from translation_agent.ratelimit import RateLimiter
+from translation_agent.tokenizer import count_tokens
+from translation_agent.utils import multichunk_translation_async
+
+
+CHUNKS = ["A ", "B ", "C ", "D ", "E"]
+
+
+def test_full_context_matches_whole_document():
+    tagged_texts = build_tagged_texts(CHUNKS)
+
+    assert tagged_texts[0] == "<TRANSLATE_THIS>A </TRANSLATE_THIS>B C D E"
+    assert tagged_texts[2] == "A B <TRANSLATE_THIS>C </TRANSLATE_THIS>D E"
+    assert tagged_texts[4] == "A B C D <TRANSLATE_THIS>E</TRANSLATE_THIS>"
+
+
+def test_neighbouring_context():
+    tagged_texts = build_tagged_texts(CHUNKS, ContextPolicy.neighbouring(1))
+
+    assert tagged_texts[0] == "<TRANSLATE_THIS>A </TRANSLATE_THIS>B "
+    assert tagged_texts[2] == "B <TRANSLATE_THIS>C </TRANSLATE_THIS>D "
+    assert tagged_texts[4] == "D <TRANSLATE_THIS>E</TRANSLATE_THIS>"
+
+    no_context = build_tagged_texts(CHUNKS, ContextPolicy.neighbouring(0))
+    assert no_context[1] == "<TRANSLATE_THIS>B </TRANSLATE_THIS>"
+
+
+def test_token_budget_context():
+    counts = [10, 50, 10, 10, 10]
+    policy = ContextPolicy.token_budget(35)
+
+    tagged_texts = build_tagged_texts(CHUNKS, policy, counts)
+
+    # chunk 2 takes D and E on the right; B does not fit on the left
+    assert tagged_texts[2] == "<TRANSLATE_THIS>C </TRANSLATE_THIS>D E"
+    # the chunk itself is always sent, even if it is over budget
+    assert tagged_texts[1] == "<TRANSLATE_THIS>B </TRANSLATE_THIS>"
+    assert tagged_texts[4] == "C D <TRANSLATE_THIS>E</TRANSLATE_THIS>"
+
+
+def test_invalid_policies_are_rejected():
+    with pytest.raises(ValueError):
+        ContextPolicy(mode="sideways")
+    with pytest.raises(ValueError):
+        ContextPolicy.neighbouring(-1)
+    with pytest.raises(ValueError):
+        ContextPolicy(layout="middle")
+    with pytest.raises(ValueError):
+        build_tagged_texts(CHUNKS, ContextPolicy.token_budget(100))
+
+
+def test_tagged_context_is_shared_by_all_stages(mocker):
+    prompts = []
+
+    async def fake_completion(prompt, system_message=None, **kwargs):
+        prompts.append(prompt)
+        return "translated"
+
+    mocker.patch(
+        "translation_agent.utils.get_completion_async",
+        side_effect=fake_completion,
+    )
+    tagged_texts = build_tagged_texts(CHUNKS, ContextPolicy.neighbouring(1))
+
+    asyncio.run(
+        multichunk_translation_async(
+            "English",
+            "Spanish",
+            CHUNKS,
+            context=ContextPolicy.neighbouring(1),
+        )
+    )
+
+    assert len(prompts) == 3 * len(CHUNKS)
+    for tagged_text in tagged_texts:
+        with_context = [p for p in prompts if f"\n{tagged_text}\n" in p]
+        assert len(with_context) == 3
+
+
+def test_prefix_layout_sends_the_context_untouched():
+    assert build_tagged_texts(CHUNKS, ContextPolicy.full("prefix")) == [
+        "A B C D E"
+    ] * len(CHUNKS)
+    neighbours = build_tagged_texts(
+        CHUNKS, ContextPolicy.neighbouring(1, "prefix")
+    )
+    assert neighbours[0] == "A B "
+    assert neighbours[2] == "B C D "
+
+
+def _translate_with_layout(mocker, layout):
+    backend = FakeBackend()
+    mocker.patch("translation_agent.backends._backend", backend)
+    mocker.patch.object(utils, "completion_cache", None)
+    mocker.patch.object(utils, "translation_memory", None)
+    mocker.patch("translation_agent.ratelimit._rate_limiter", RateLimiter())
+    messages = []
+    responder = backend.llm.responder
+
+    def recording_responder(request, model, json_mode):
+        messages.append(request)
+        return responder(request, model, json_mode)
+
+    backend.llm.responder = recording_responder
+    metrics = MetricsCollector()
+    text = "".join(f"Sentence number {i} to translate.\n" for i in range(170))
+
+    with instrument(metrics):
+        utils.translate(
+            "English",
+            "Spanish",
+            text,
+            "Mexico",
+            max_tokens=count_tokens(text) // 3 + 1,
+            context=ContextPolicy.full(layout),
+        )
+
+    return text, messages, metrics.summary()
+
+
+def test_prefix_layout_shares_the_prompt_prefix(mocker):
+    text, messages, summary = _translate_with_layout(mocker, "prefix")
+
+    assert len(messages) > 3 and len(messages) % 3 == 0
+    assert len({m[0]["content"] for m in messages}) == 1
+    source = f"<SOURCE_TEXT>\n{text}\n</SOURCE_TEXT>"
+    assert all(source in m[1]["content"] for m in messages)
+    assert len({m[1]["content"].split(source)[0] for m in messages}) == 1
+    assert any("Translate only part 3," in m[1]["content"] for m in messages)
+
+    _, _, tagged_summary = _translate_with_layout(mocker, "tagged")
+    # Past the first call, every prompt reuses the cached source text.
+    for stage in ("initial", "reflect", "improve"):
+        assert summary[stage]["cached_tokens"] > 0
+        assert summary[stage]["cached_rate"] > (
+            2 * tagged_summary[stage]["cached_rate"]
+        )
@@ -0,0 +1,110 @@
+import pytest
+
+
+docx = pytest.importorskip("docx")
+
+from translation_agent.docx_pipeline import DocumentPipeline
+from translation_agent.docx_pipeline import Segment
+
+
+@pytest.fixture
+def document(tmp_path):
+    doc = docx.Document()
+    doc.add_paragraph("First paragraph.")
+    doc.add_paragraph("")
+    doc.add_paragraph("Second paragraph.").runs[0].bold = True
+    table = doc.add_table(rows=1, cols=3)
+    table.cell(0, 0).text = "Name"
+    table.cell(0, 1).text = "--"
+    table.cell(0, 2).text = "Total"
+    path = tmp_path / "input.docx"
+    doc.save(path)
+    return path
+
+
+def test_texts_to_translate(document):
+    pipeline = DocumentPipeline(str(document))
+
+    assert pipeline.paragraph_texts() == [
+        "First paragraph.",
+        "Second paragraph.",
+    ]
+    assert pipeline.cell_texts() == ["Name", "Total"]
+
+
+def test_segment_ids(document):
+    pipeline = DocumentPipeline(str(document))
+
+    assert pipeline.segments() == [
+        Segment("p0", "paragraph", "First paragraph."),
+        Segment("p2", "paragraph", "Second paragraph."),
+    ]
+    assert [s.id for s in pipeline.segments("cell")] == ["t0.0.0", "t0.0.2"]
+
+
+def test_merged_cell_is_one_segment(tmp_path):
+    doc = docx.Document()
+    table = doc.add_table(rows=2, cols=2)
+    table.cell(0, 0).merge(table.cell(0, 1)).text = "Header"
+    table.cell(1, 1).text = "Value"
+    path = tmp_path / "merged.docx"
+    doc.save(path)
+
+    cells = DocumentPipeline(str(path)).segments("cell")
+
+    assert [(s.id, s.text) for s in cells] == [
+        ("t0.0.0", "Header"),
+        ("t0.1.1", "Value"),
+    ]
+
+
+def test_replace_by_id(document, tmp_path):
+    output = tmp_path / "output.docx"
+    pipeline = DocumentPipeline(str(document), str(output))
+
+    pipeline.replace_all({"p2": "Segundo.", "t0.0.2": "Suma", "p0": "Uno"})
+    with pytest.raises(KeyError):
+        pipeline.replace("p1", "Vacío")
+    pipeline.save()
+
+    saved = docx.Document(output)
+    assert [p.text for p in saved.paragraphs] == ["Uno", "", "Segundo."]
+    assert saved.tables[0].cell(0, 2).text == "Suma"
+
+
+def test_edits_are_saved_once(document, tmp_path):
+    output = tmp_path / "output.docx"
+    pipeline = DocumentPipeline(str(document), str(output))
+
+    pipeline.replace_paragraphs(["Primero."])
+    pipeline.replace_paragraphs(["Segundo."], start=1)
+    pipeline.replace_cells(["Nombre", "Total"])
+    assert not output.exists()
+    pipeline.save()
+
+    saved = docx.Document(output)
+    assert [p.text for p in saved.paragraphs] == ["Primero.", "", "Segundo."]
+    assert saved.paragraphs[2].runs[-1].bold
+    assert [c.text for c in saved.tables[0].rows[0].cells] == [
+        "Nombre",
+        "--",
+        "Total",
+    ]
+    assert pipeline.saves == 1
+
+
+def test_checkpoint_saves(document, tmp_path):
+    output = tmp_path / "output.docx"
+    pipeline = DocumentPipeline(str(document), str(output), checkpoint_every=2)
+
+    pipeline.replace_paragraphs(["Primero."])
+    assert not output.exists()
+    pipeline.replace_paragraphs(["Segundo."], start=1)
+
+    assert pipeline.saves == 1
+    assert docx.Document(output).paragraphs[2].text == "Segundo."
+
+
+def test_save_needs_output_path(document):
+    with pytest.raises(ValueError):
+        DocumentPipeline(str(document)).save()
@@ -0,0 +1,121 @@
+import asyncio
+import random
+
+import openai
+import pytest
+from translation_agent.fake_server import FakeBackend
+from translation_agent.fake_server import FakeLLM
+from translation_agent.fake_server import FakeServer
+from translation_agent.fake_server import LatencyModel
+
+
+MESSAGES = [
+    {"role": "system", "content": "You are a helpful assistant."},
+    {"role": "user", "content": "Translate this sentence into Spanish."},
+]
+
+
+def test_latency_models():
+    rng = random.Random(0)
+
+    assert LatencyModel.parse("0.25").sample(rng) == 0.25
+    assert 0.1 <= LatencyModel.parse("uniform:0.1,0.2").sample(rng) <= 0.2
+    assert LatencyModel.parse("lognormal:0.5,0.3").sample(rng) > 0
+    assert LatencyModel.parse("constant:0", per_token=0.01).sample(
+        rng, 100
+    ) == pytest.approx(1.0)
+    with pytest.raises(ValueError):
+        LatencyModel.parse("bimodal:1,2")
+
+
+def test_replies_are_deterministic():
+    llm = FakeLLM()
+
+    first = llm.reply(MESSAGES, "gpt-4-turbo")
+    assert first == llm.reply(MESSAGES, "gpt-4-turbo")
+    assert first != llm.reply(MESSAGES, "gpt-4o")
+    assert first.prompt_tokens > 0
+    assert first.completion_tokens > 0
+
+
+def test_chat_completion_over_http():
+    with FakeServer() as server:
+        response = server.client().chat.completions.create(
+            model="gpt-4-turbo", messages=MESSAGES
+        )
+
+    expected = server.llm.reply(MESSAGES, "gpt-4-turbo")
+    assert response.choices[0].message.content == expected.text
+    assert response.usage.total_tokens == expected.total_tokens
+
+
+def test_long_prompt_prefixes_are_cached():
+    llm = FakeLLM()
+    system = {"role": "system", "content": "You are a translator."}
+    source = {"role": "user", "content": "A sentence to translate. " * 300}
+    other = {"role": "user", "content": "Another sentence. " * 300}
+
+    first = llm.reply([system, source], "gpt-4-turbo")
+    second = llm.reply([system, source], "gpt-4-turbo")
+
+    assert first.cached_tokens == 0
+    assert second.cached_tokens >= 1024
+    assert second.cached_tokens % 128 == 0
+    assert second.cached_tokens <= second.prompt_tokens
+    assert llm.reply([system, other], "gpt-4-turbo").cached_tokens == 0
+    assert llm.reply([system, source], "gpt-4o").cached_tokens == 0
+    assert llm.reply(MESSAGES, "gpt-4-turbo").cached_tokens == 0
+    assert (
+        FakeLLM(prompt_cache=False).reply(MESSAGES, "gpt-4o").cached_tokens
+        is None
+    )
+
+
+def test_rate_limits_answer_429_with_retry_after():
+    with FakeServer(rpm=1) as server:
+        client = server.client()
+        client.chat.completions.create(model="gpt-4-turbo", messages=MESSAGES)
+        with pytest.raises(openai.RateLimitError) as exc_info:
+            client.chat.completions.create(
+                model="gpt-4-turbo", messages=MESSAGES
+            )
+
+    assert float(exc_info.value.response.headers["retry-after"]) > 0
+    assert server.llm.stats()["throttled"] == 1
+
+
+def test_injected_errors_raise_sdk_exceptions():
+    backend = FakeBackend(throttle_rate=0.5, error_rate=0.5)
+    raised = set()
+    for _ in range(20):
+        try:
+            backend.complete("Hello", "System", "gpt-4-turbo", 0.3)
+        except openai.APIStatusError as exc:
+            raised.add(exc.status_code)
+
+    assert raised == {429, 500}
+
+
+def test_timeout_raises_api_timeout_error():
+    backend = FakeBackend(latency="1.0")
+
+    with pytest.raises(openai.APITimeoutError):
+        backend.complete("Hello", "System", "gpt-4-turbo", 0.3, timeout=0.01)
+
+
+def test_concurrency_cap_queues_requests():
+    backend = FakeBackend(latency="0.02", max_concurrency=2)
+
+    async def main():
+        await asyncio.gather(
+            *(
+                backend.complete_async(f"Hello {i}", "System", "gpt-4", 0.3)
+                for i in range(6)
+            )
+        )
+
+    asyncio.run(main())
+
+    stats = backend.llm.stats()
+    assert stats["peak_in_flight"] == 2
+    assert stats["completed"] == 6
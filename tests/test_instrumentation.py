@@ -0,0 +1,180 @@
+import logging
+
+import openai
+import pytest
+import translation_agent.utils as utils
+from translation_agent.cache import CompletionCache
+from translation_agent.fake_server import FakeBackend
+from translation_agent.instrumentation import CallbackHandler
+from translation_agent.instrumentation import LoggingHandler
+from translation_agent.instrumentation import MetricsCollector
+from translation_agent.instrumentation import add_handler
+from translation_agent.instrumentation import call_context
+from translation_agent.instrumentation import instrument
+from translation_agent.instrumentation import remove_handler
+from translation_agent.ratelimit import RateLimiter
+from translation_agent.retry import RetryPolicy
+
+
+class RecordingHandler(CallbackHandler):
+    def __init__(self):
+        self.started = []
+        self.ended = []
+
+    def on_call_start(self, event):
+        self.started.append(event.call_id)
+
+    def on_call_end(self, event):
+        self.ended.append(event)
+
+
+@pytest.fixture
+def fake_backend(mocker):
+    backend = FakeBackend()
+    mocker.patch("translation_agent.backends._backend", backend)
+    mocker.patch.object(utils, "completion_cache", None)
+    mocker.patch("translation_agent.ratelimit._rate_limiter", RateLimiter())
+    return backend
+
+
+def test_events_carry_stage_chunk_and_usage(fake_backend):
+    handler = RecordingHandler()
+
+    with instrument(handler), call_context("reflect", 3):
+        utils.get_completion("Hello", system_message="System")
+
+    (event,) = handler.ended
+    assert handler.started == [event.call_id]
+    assert (event.stage, event.chunk_index) == ("reflect", 3)
+    assert event.model == "gpt-4-turbo"
+    expected = fake_backend.llm.reply(
+        [
+            {"role": "system", "content": "System"},
+            {"role": "user", "content": "Hello"},
+        ],
+        "gpt-4-turbo",
+    )
+    assert event.prompt_tokens == expected.prompt_tokens
+    assert event.completion_tokens == expected.completion_tokens
+    assert event.latency >= 0
+    assert not event.cache_hit
+
+
+def test_cache_hits_are_reported(mocker, fake_backend, tmp_path):
+    mocker.patch.object(
+        utils, "completion_cache", CompletionCache(str(tmp_path / "c.db"))
+    )
+    handler = RecordingHandler()
+
+    with instrument(handler):
+        utils.get_completion("Hello")
+        utils.get_completion("Hello")
+
+    assert [event.cache_hit for event in handler.ended] == [False, True]
+    assert handler.ended[1].prompt_tokens is None
+
+
+def test_errors_are_reported(mocker, fake_backend):
+    fake_backend.llm.error_rate = 1.0
+    mocker.patch(
+        "translation_agent.retry.retry_policy",
+        RetryPolicy(max_attempts=1),
+    )
+    handler = RecordingHandler()
+
+    with instrument(handler), pytest.raises(openai.InternalServerError):
+        utils.get_completion("Hello")
+
+    assert isinstance(handler.ended[0].error, openai.InternalServerError)
+
+
+def test_translate_reports_every_stage(fake_backend):
+    metrics = MetricsCollector()
+    source_text = "A sentence to translate.\n" * 40
+
+    with instrument(metrics):
+        utils.translate(
+            "English", "Spanish", source_text, "Mexico", max_tokens=300
+        )
+
+    summary = metrics.summary()
+    assert set(summary) == {"initial", "reflect", "improve"}
+    calls = fake_backend.llm.stats()["completed"]
+    assert sum(stage["calls"] for stage in summary.values()) == calls
+    assert summary["initial"]["calls"] == calls // 3
+    assert summary["improve"]["prompt_tokens"] > 0
+    assert summary["reflect"]["latency_p95"] is not None
+
+
+def test_chunk_indexes_in_multichunk_translation(fake_backend):
+    handler = RecordingHandler()
+
+    with instrument(handler):
+        utils.multichunk_translation(
+            "English", "Spanish", ["One.", "Two.", "Three."]
+        )
+
+    indexes = {(e.stage, e.chunk_index) for e in handler.ended}
+    assert indexes == {
+        (stage, i)
+        for stage in ("initial", "reflect", "improve")
+        for i in range(3)
+    }
+
+
+def test_sync_stage_functions_are_labelled(mocker):
+    mocker.patch.object(utils, "completion_cache", None)
+    mocker.patch(
+        "translation_agent.backends._backend",
+        FakeBackend(),
+    )
+    mocker.patch("translation_agent.ratelimit._rate_limiter", RateLimiter())
+    handler = RecordingHandler()
+
+    with instrument(handler):
+        utils.multichunk_reflect_on_translation(
+            "English", "Spanish", ["One.", "Two."], ["Uno.", "Dos."]
+        )
+
+    assert [(e.stage, e.chunk_index) for e in handler.ended] == [
+        ("reflect", 0),
+        ("reflect", 1),
+    ]
+
+
+def test_global_handlers_and_failing_handlers(fake_backend, caplog):
+    class Broken(CallbackHandler):
+        def on_call_end(self, event):
+            raise RuntimeError("boom")
+
+    handler, broken = RecordingHandler(), Broken()
+    add_handler(broken)
+    add_handler(handler)
+    try:
+        assert utils.get_completion("Hello")
+    finally:
+        remove_handler(broken)
+        remove_handler(handler)
+
+    assert len(handler.ended) == 1
+    assert "Call handler" in caplog.text
+
+
+def test_logging_handler_emits_structured_records(fake_backend, caplog):
+    with caplog.at_level(logging.INFO, logger="translation_agent.calls"):
+        with instrument(LoggingHandler()), call_context("initial", 0):
+            utils.get_completion("Hello")
+
+    (record,) = caplog.records
+    assert record.llm_call["stage"] == "initial"
+    assert record.llm_call["chunk_index"] == 0
+    assert record.llm_call["prompt_tokens"] > 0
+    assert "stage=initial" in record.getMessage()
+
+
+def test_opentelemetry_handler(fake_backend):
+    pytest.importorskip("opentelemetry")
+    from translation_agent.instrumentation import OpenTelemetryHandler
+
+    with instrument(OpenTelemetryHandler()), call_context("initial"):
+        assert utils.get_completion("Hello")
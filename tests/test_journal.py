@@ -0,0 +1,132 @@
+import threading
+
+import pytest
+import translation_agent.utils as utils
+from translation_agent.fake_server import FakeBackend
+from translation_agent.journal import Journal
+from translation_agent.journal import document_key
+from translation_agent.ratelimit import RateLimiter
+from translation_agent.segments import translate_segments
+
+
+TEXT = "One sentence to translate. " * 20
+
+
+@pytest.fixture
+def fake_backend(mocker):
+    backend = FakeBackend()
+    mocker.patch("translation_agent.backends._backend", backend)
+    mocker.patch.object(utils, "completion_cache", None)
+    mocker.patch.object(utils, "translation_memory", None)
+    mocker.patch("translation_agent.ratelimit._rate_limiter", RateLimiter())
+    return backend
+
+
+def calls(backend):
+    return backend.llm.stats().get("completed", 0)
+
+
+def translate(journal):
+    return utils.translate(
+        "English",
+        "Spanish",
+        TEXT,
+        "Mexico",
+        max_tokens=150,
+        structured_reflection=False,
+        fused=False,
+        journal=journal,
+    )
+
+
+def test_records_are_read_back_on_resume(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    journal = Journal(path)
+    journal.record_reply("doc", "initial", 0, "Hola")
+    journal.record_reply("doc", "reflect", None, "Bien")
+    journal.record_file("file", "out.docx")
+
+    resumed = Journal(path, resume=True)
+
+    assert resumed.document("doc").get("initial", 0) == "Hola"
+    assert resumed.document("doc").get("reflect", None) == "Bien"
+    assert resumed.document("doc").get("improve", 0) is None
+    assert resumed.finished_file("file") == "out.docx"
+    assert resumed.replayed == 2
+    assert Journal(path).document("doc").get("initial", 0) is None
+
+
+def test_torn_last_record_is_ignored(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    Journal(str(path)).record_reply("doc", "initial", 0, "Hola")
+    with open(path, "a") as f:
+        f.write('{"doc": "doc", "chunk": 1, "stage": "ini')
+
+    journal = Journal(str(path), resume=True)
+    journal.record_reply("doc", "initial", 1, "Adios")
+    resumed = Journal(str(path), resume=True)
+
+    assert resumed.document("doc").get("initial", 0) == "Hola"
+    assert resumed.document("doc").get("initial", 1) == "Adios"
+
+
+def test_document_key_depends_on_settings():
+    key = document_key("English", "Spanish", TEXT, "Mexico", 150)
+
+    assert key == document_key("English", "Spanish", TEXT, "Mexico", 150)
+    assert key != document_key("English", "Spanish", TEXT, "Mexico", 200)
+    assert key != document_key("English", "Spanish", TEXT + ".", "Mexico", 150)
+
+
+def test_resumed_translation_makes_no_calls(fake_backend, tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    translation = translate(Journal(path))
+    made = calls(fake_backend)
+
+    journal = Journal(path, resume=True)
+
+    assert translate(journal) == translation
+    assert calls(fake_backend) == made
+    assert journal.replayed == made
+
+
+def test_interrupted_translation_continues(fake_backend, tmp_path):
+    path = tmp_path / "journal.jsonl"
+    translation = translate(Journal(str(path)))
+    made = calls(fake_backend)
+    # Keep the first five replies, as if the run had died after them.
+    lines = path.read_text().splitlines(keepends=True)
+    path.write_text("".join(lines[:5]))
+
+    assert translate(Journal(str(path), resume=True)) == translation
+    assert calls(fake_backend) == 2 * made - 5
+    assert len(path.read_text().splitlines()) == made
+
+
+def test_segments_are_replayed(fake_backend, tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    cells = ["Name", "Total", "Price"]
+    translations = translate_segments(
+        "English", "Spanish", cells, journal=Journal(path)
+    )
+    made = calls(fake_backend)
+
+    resumed = translate_segments(
+        "English", "Spanish", cells, journal=Journal(path, resume=True)
+    )
+
+    assert resumed == translations
+    assert calls(fake_backend) == made
+
+
+def test_replies_are_written_off_the_event_loop(
+    fake_backend, mocker, tmp_path
+):
+    fsync = mocker.patch("translation_agent.journal.os.fsync")
+    writers = set()
+    fsync.side_effect = lambda fd: writers.add(threading.get_ident())
+
+    translate(Journal(str(tmp_path / "journal.jsonl")))
+
+    assert fsync.call_count == calls(fake_backend)
+    assert threading.get_ident() not in writers
@@ -0,0 +1,185 @@
+import pytest
+
+from translation_agent.memory import TranslationMemory
+from translation_agent.utils import translate
+from translation_agent.utils import translate_stream
+
+
+DISCLAIMER = (
+    "This document is provided for information purposes only and does not "
+    "constitute an offer or solicitation to buy or sell any product."
+)
+
+
+@pytest.fixture
+def memory(tmp_path):
+    return TranslationMemory(str(tmp_path / "tm.sqlite3"))
+
+
+def test_exact_match_ignores_whitespace(memory):
+    memory.add(DISCLAIMER, "Este documento...", "English", "Spanish")
+
+    match = memory.lookup(f"  {DISCLAIMER}\n", "English", "Spanish")
+
+    assert match.exact
+    assert match.similarity == 1.0
+    assert match.translation == "Este documento..."
+    assert len(memory) == 1
+
+
+def test_language_pairs_are_kept_apart(memory):
+    memory.add(DISCLAIMER, "Este documento...", "English", "Spanish")
+
+    assert memory.lookup(DISCLAIMER, "English", "French") is None
+
+
+def test_fuzzy_match_above_threshold(memory):
+    memory.add(DISCLAIMER, "Este documento...", "English", "Spanish")
+    memory.add("Yes", "Sí", "English", "Spanish")
+
+    match = memory.lookup(
+        DISCLAIMER.replace("any product", "any products"), "English", "Spanish"
+    )
+
+    assert match is not None
+    assert not match.exact
+    assert 0.8 <= match.similarity < 1.0
+    assert match.translation == "Este documento..."
+
+
+def test_no_match_for_unrelated_text(memory):
+    memory.add(DISCLAIMER, "Este documento...", "English", "Spanish")
+
+    assert memory.lookup("Quarterly revenue grew by 4%.", "English", "Spanish") is None
+
+
+def test_add_replaces_existing_translation(memory):
+    memory.add("Header", "Encabezado", "English", "Spanish")
+    memory.add("Header", "Cabecera", "English", "Spanish")
+
+    assert memory.lookup("Header", "English", "Spanish").translation == "Cabecera"
+    assert len(memory) == 1
+
+
+def test_translate_uses_memory_before_the_llm(mocker, memory):
+    memory.add(DISCLAIMER, "Este documento...", "English", "Spanish")
+    mock_completion = mocker.patch(
+        "translation_agent.utils.get_completion_async"
+    )
+
+    result = translate("English", "Spanish", DISCLAIMER, "Mexico", memory=memory)
+
+    assert result == "Este documento..."
+    mock_completion.assert_not_called()
+
+
+def test_fuzzy_match_only_runs_improve_stage(mocker, memory):
+    memory.add(DISCLAIMER, "Este documento...", "English", "Spanish")
+    mock_completion = mocker.patch(
+        "translation_agent.utils.get_completion_async",
+        return_value="Estos documentos...",
+    )
+    similar = DISCLAIMER.replace("any product", "any products")
+
+    result = translate("English", "Spanish", similar, "Mexico", memory=memory)
+
+    assert result == "Estos documentos..."
+    mock_completion.assert_called_once()
+    prompt = mock_completion.call_args.args[0]
+    assert "<TRANSLATION>\nEste documento...\n</TRANSLATION>" in prompt
+    assert memory.lookup(similar, "English", "Spanish").exact
+
+
+def test_new_translations_are_written_back(mocker, memory):
+    mocker.patch(
+        "translation_agent.utils.get_completion_async",
+        return_value="Hola",
+    )
+
+    translate("English", "Spanish", "Hello", "Mexico", memory=memory)
+
+    assert memory.lookup("Hello", "English", "Spanish").translation == "Hola"
+
+
+def test_paragraphs_are_looked_up_one_by_one(mocker, memory):
+    memory.add("Hello.", "Hola.", "English", "Spanish")
+    mock_completion = mocker.patch(
+        "translation_agent.utils.get_completion_async",
+        return_value="Adiós.",
+    )
+
+    result = translate(
+        "English", "Spanish", "Hello.\n\nGoodbye.", "Mexico", memory=memory
+    )
+
+    assert result == "Hola.\n\nAdiós."
+    prompts = [call.args[0] for call in mock_completion.call_args_list]
+    assert all("Hello." not in prompt for prompt in prompts)
+    assert memory.lookup("Goodbye.", "English", "Spanish").translation == (
+        "Adiós."
+    )
+
+
+def test_block_translations_are_stored_per_paragraph(mocker, memory):
+    mocker.patch(
+        "translation_agent.utils.get_completion_async",
+        return_value="Uno.\nDos.",
+    )
+
+    translate("English", "Spanish", "One.\nTwo.", "Mexico", memory=memory)
+    mock_completion = mocker.patch(
+        "translation_agent.utils.get_completion_async"
+    )
+    result = translate(
+        "English", "Spanish", "Two.\nOne.", "Mexico", memory=memory
+    )
+
+    assert result == "Dos.\nUno."
+    mock_completion.assert_not_called()
+
+
+def test_unaligned_translations_keep_their_place(mocker, memory):
+    memory.add("Beta.", "BETA.", "English", "Spanish")
+
+    async def merge_lines(prompt, *args, **kwargs):
+        # The run of Gamma and Delta comes back as a single line.
+        return "ALPHA." if "Alpha." in prompt else "GAMMA DELTA."
+
+    mocker.patch(
+        "translation_agent.utils.get_completion_async",
+        side_effect=merge_lines,
+    )
+
+    result = translate(
+        "English",
+        "Spanish",
+        "Alpha.\n\nBeta.\n\nGamma.\nDelta.",
+        "Mexico",
+        memory=memory,
+    )
+
+    assert result == "ALPHA.\n\nBETA.\n\nGAMMA DELTA."
+    assert memory.lookup("Gamma.\nDelta.", "English", "Spanish").exact
+
+
+def test_stream_yields_memory_hits_with_each_run(mocker, memory):
+    memory.add("Beta.", "BETA.", "English", "Spanish")
+
+    async def upper(prompt, *args, **kwargs):
+        return "ALPHA." if "Alpha." in prompt else "GAMMA."
+
+    mocker.patch(
+        "translation_agent.utils.get_completion_async", side_effect=upper
+    )
+
+    chunks = list(
+        translate_stream(
+            "English",
+            "Spanish",
+            "Alpha.\nBeta.\nGamma.",
+            "Mexico",
+            memory=memory,
+        )
+    )
+
+    assert chunks == ["ALPHA.\nBETA.", "\nGAMMA."]
@@ -0,0 +1,161 @@
+import pytest
+import translation_agent.utils as utils
+from translation_agent.context import ContextPolicy
+from translation_agent.fake_server import FakeBackend
+from translation_agent.instrumentation import MetricsCollector
+from translation_agent.instrumentation import instrument
+from translation_agent.planner import FileTexts
+from translation_agent.planner import plan
+from translation_agent.ratelimit import ModelLimits
+from translation_agent.ratelimit import RateLimiter
+from translation_agent.segments import translate_segments
+
+
+@pytest.fixture
+def fake_backend(mocker):
+    backend = FakeBackend()
+    mocker.patch("translation_agent.backends._backend", backend)
+    mocker.patch.object(utils, "completion_cache", None)
+    mocker.patch.object(utils, "translation_memory", None)
+    mocker.patch("translation_agent.ratelimit._rate_limiter", RateLimiter())
+    return backend
+
+
+@pytest.mark.parametrize(
+    "context",
+    [
+        ContextPolicy.full(),
+        ContextPolicy.neighbouring(1),
+        ContextPolicy.full("prefix"),
+    ],
+)
+def test_plan_matches_a_real_run(fake_backend, context):
+    texts = ["A short text.", "A sentence to translate.\n" * 60]
+    metrics = MetricsCollector()
+
+    with instrument(metrics):
+        for text in texts:
+            utils.translate(
+                "English",
+                "Spanish",
+                text,
+                "Mexico",
+                max_tokens=300,
+                context=context,
+            )
+    result = plan(
+        texts, "English", "Spanish", "Mexico", max_tokens=300, context=context
+    )
+
+    actual = metrics.summary()
+    assert result.texts == 2
+    assert result.calls == fake_backend.llm.stats()["completed"]
+    for stage, stage_plan in result.stages.items():
+        assert stage_plan.calls == actual[stage]["calls"]
+    # The initial prompts hold no model output, so they can be exact up to
+    # BPE merges across the context boundaries.
+    assert result.stages["initial"].prompt_tokens == pytest.approx(
+        actual["initial"]["prompt_tokens"], rel=0.01
+    )
+
+
+def test_context_is_counted_in_every_stage():
+    text = "A sentence to translate.\n" * 60
+
+    full = plan([text], "English", "Spanish", max_tokens=100)
+    narrow = plan(
+        [text],
+        "English",
+        "Spanish",
+        max_tokens=100,
+        context=ContextPolicy.neighbouring(0),
+    )
+
+    assert full.chunks == narrow.chunks > 1
+    for stage in ("initial", "reflect", "improve"):
+        extra = (
+            full.stages[stage].prompt_tokens
+            - narrow.stages[stage].prompt_tokens
+        )
+        assert extra >= full.chunks * (full.chunks - 1) * 50
+
+
+def test_wall_time_bounds():
+    texts = ["A sentence to translate.\n" * 60] * 3
+    unlimited = ModelLimits(rpm=10**9, tpm=10**12)
+
+    serial = plan(
+        texts, "English", "Spanish", max_concurrency=1, limits=unlimited
+    )
+    parallel = plan(texts, "English", "Spanish", limits=unlimited)
+    throttled = plan(texts, "English", "Spanish", limits=ModelLimits(tpm=100))
+
+    assert serial.bottleneck == parallel.bottleneck == "latency"
+    assert parallel.wall_time <= serial.wall_time
+    assert throttled.bottleneck == "tpm"
+    total_tokens = throttled.prompt_tokens + throttled.completion_tokens
+    assert throttled.wall_time == pytest.approx(60 * total_tokens / 100)
+    assert "bound by tpm" in throttled.report()
+
+
+def test_segment_groups_are_planned_as_packs(fake_backend):
+    cells = [f"Item {i}" for i in range(40)] + ["Item 0", "42", "Total"]
+    metrics = MetricsCollector()
+
+    with instrument(metrics):
+        translate_segments(
+            "English", "Spanish", cells, "Mexico", max_pack_tokens=60
+        )
+    result = plan(
+        [],
+        "English",
+        "Spanish",
+        "Mexico",
+        segment_groups=[cells],
+        max_pack_tokens=60,
+    )
+
+    actual = metrics.summary()
+    assert result.segments == len(cells)
+    assert result.packs > 1
+    assert result.calls == fake_backend.llm.stats()["completed"]
+    for stage, stage_plan in result.stages.items():
+        assert stage_plan.calls == actual[stage]["calls"]
+    assert result.stages["initial"].prompt_tokens == pytest.approx(
+        actual["initial"]["prompt_tokens"], rel=0.01
+    )
+    # One translate() call per distinct cell would cost far more.
+    per_cell = plan(list(dict.fromkeys(cells)), "English", "Spanish", "Mexico")
+    assert result.calls < per_cell.calls / 5
+
+
+def test_files_run_max_files_at_a_time():
+    text = "A sentence to translate.\n" * 60
+    cells = ["Name", "Price", "Total"]
+    files = [FileTexts([text, "A short text."], [cells])] * 4
+    unlimited = ModelLimits(rpm=10**9, tpm=10**12)
+
+    one_file = plan(
+        [], "English", "Spanish", files=files[:1], limits=unlimited
+    )
+    serial = plan([], "English", "Spanish", files=files, limits=unlimited)
+    two = plan(
+        [], "English", "Spanish", files=files, max_files=2, limits=unlimited
+    )
+    four = plan(
+        [], "English", "Spanish", files=files, max_files=4, limits=unlimited
+    )
+
+    assert serial.calls == two.calls == four.calls == 4 * one_file.calls
+    assert serial.wall_time == pytest.approx(4 * one_file.wall_time)
+    assert two.wall_time == pytest.approx(2 * one_file.wall_time)
+    assert four.wall_time == pytest.approx(one_file.wall_time)
+    # A file's texts and cells run at once, not one after another.
+    sequential = plan(
+        [text, "A short text."],
+        "English",
+        "Spanish",
+        segment_groups=[cells],
+        limits=unlimited,
+    )
+    assert one_file.wall_time < sequential.wall_time
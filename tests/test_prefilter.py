@@ -0,0 +1,147 @@
+import pytest
+import translation_agent.utils as utils
+from translation_agent import prefilter
+from translation_agent.fake_server import FakeBackend
+from translation_agent.planner import plan
+from translation_agent.prefilter import PrefilterStats
+from translation_agent.prefilter import classify
+from translation_agent.prefilter import classify_batch
+from translation_agent.prefilter import language_scripts
+from translation_agent.prefilter import skipped_segments
+from translation_agent.ratelimit import RateLimiter
+from translation_agent.segments import translate_segments
+
+
+@pytest.fixture
+def fake_backend(mocker):
+    backend = FakeBackend()
+    mocker.patch("translation_agent.backends._backend", backend)
+    mocker.patch.object(utils, "completion_cache", None)
+    mocker.patch.object(utils, "translation_memory", None)
+    mocker.patch("translation_agent.ratelimit._rate_limiter", RateLimiter())
+    mocker.patch.object(prefilter, "PREFILTER", True)
+    mocker.patch.object(prefilter, "prefilter_stats", PrefilterStats())
+    return backend
+
+
+@pytest.mark.parametrize(
+    "segment, reason",
+    [
+        ("--", "empty"),
+        ("2024-01-31", "date"),
+        ("31/01/2024 14:30", "date"),
+        ("1,234.50", "number"),
+        ("€ 12", "number"),
+        ("45%", "number"),
+        ("https://example.com/spec", "url"),
+        ("www.example.com", "url"),
+        ("sales@example.com", "email"),
+        ("AB-1234", "code"),
+        ("SKU#5521", "code"),
+        ("价格", "target_script"),
+        ("第3章", "target_script"),
+        ("Price", None),
+        ("N/A", None),
+        ("Chapter 3", None),
+        ("iPhone 15 价格", None),
+    ],
+)
+def test_classify_english_to_chinese(segment, reason):
+    assert classify(segment, "English", "Chinese") == reason
+
+
+def test_target_script_needs_a_script_the_source_lacks():
+    assert language_scripts("Simplified Chinese") == {"Han"}
+    assert language_scripts("Klingon") == frozenset()
+    # Kana only occurs in Japanese, Han in both.
+    assert classify("価格です", "Chinese", "Japanese") == "target_script"
+    assert classify("价格", "Chinese", "Japanese") is None
+    assert classify("Hola", "English", "Spanish") is None
+    assert classify("Привет", "English", "Klingon") is None
+
+
+def test_every_sentence_of_a_chunk_must_be_in_the_target_script():
+    translated = (
+        "这是文件的第一句话。\n第二句和第三句也都已经翻译成了中文。"
+        "第四句说的是这个产品的价格和发货日期。第五句是最后一句。"
+    )
+    untranslated = translated + "\nSee the list."
+
+    assert classify(translated, "English", "Chinese") == "target_script"
+    # Over 80% of its letters are Han, but one sentence is still English.
+    assert classify(untranslated, "English", "Chinese") is None
+    assert classify("苹果公司的iOS操作系统和价格表", "English", "Chinese") == (
+        "target_script"
+    )
+
+
+def test_classify_batch_matches_classify():
+    segments = ["42", "Price", "42", "价格"]
+
+    assert classify_batch(segments, "English", "Chinese") == [
+        classify(segment, "English", "Chinese") for segment in segments
+    ]
+
+
+def test_skipped_segments_are_counted(fake_backend):
+    reasons, counts = skipped_segments(
+        ["42", "7", "Price", "价格"], "English", "Chinese"
+    )
+
+    assert reasons == ["number", "number", None, "target_script"]
+    assert counts == {"number": 2, "target_script": 1}
+    assert prefilter.prefilter_stats.counts() == counts
+
+
+def test_segments_pass_through_without_calls(fake_backend):
+    cells = ["1,200", "2024-01-31", "价格", "Name", "Total"]
+
+    result = translate_segments("English", "Chinese", cells)
+
+    assert result[:3] == cells[:3]
+    assert result[3:] != cells[3:]
+    # One pack of two segments: three calls.
+    assert fake_backend.llm.stats()["completed"] == 3
+    assert prefilter.prefilter_stats.counts() == {
+        "number": 1,
+        "date": 1,
+        "target_script": 1,
+    }
+
+
+def test_translate_passes_target_language_text_through(fake_backend):
+    text = "这份文件已经是中文了。"
+
+    assert utils.translate("English", "Chinese", text, "China") == text
+    assert fake_backend.llm.stats().get("completed", 0) == 0
+
+
+def test_numeric_chunks_pass_through(fake_backend):
+    text = "A sentence to translate. " * 8 + "\n" + "1234 5678 " * 16
+
+    translation = utils.translate(
+        "English", "Spanish", text, "Mexico", max_tokens=100
+    )
+
+    assert translation.endswith("1234 5678 " * 8)
+    assert prefilter.prefilter_stats.counts()["number"] >= 1
+
+
+def test_prefilter_can_be_disabled(fake_backend, mocker):
+    mocker.patch.object(prefilter, "PREFILTER", False)
+
+    result = translate_segments("English", "Chinese", ["1,200", "价格"])
+
+    assert result != ["1,200", "价格"]
+    assert prefilter.prefilter_stats.counts() == {}
+
+
+def test_plan_skips_prefiltered_texts(fake_backend):
+    texts = ["A sentence to translate.", "2024-01-31", "42"]
+
+    result = plan(texts, "English", "Chinese")
+
+    assert result.texts == 3
+    assert result.skipped == 2
+    assert result.calls == 3
+    assert "2 passed through" in result.report()
@@ -0,0 +1,149 @@
+import asyncio
+import threading
+
+import pytest
+from translation_agent.ratelimit import INITIAL_CONCURRENCY
+from translation_agent.ratelimit import ModelLimits
+from translation_agent.ratelimit import ModelState
+from translation_agent.ratelimit import RateLimiter
+from translation_agent.ratelimit import get_rate_limiter
+
+
+class ThrottledError(Exception):
+    status_code = 429
+
+
+class ServerError(Exception):
+    status_code = 503
+
+
+def test_requests_per_minute_bucket():
+    state = ModelState(ModelLimits(rpm=2, tpm=10_000), now=0.0)
+
+    assert state.try_acquire(10, now=0.0) == 0
+    assert state.try_acquire(10, now=0.0) == 0
+    assert state.try_acquire(10, now=0.0) == pytest.approx(30.0)
+    assert state.try_acquire(10, now=30.0) == 0
+
+
+def test_tokens_per_minute_bucket():
+    state = ModelState(ModelLimits(rpm=100, tpm=600), now=0.0)
+
+    assert state.try_acquire(500, now=0.0) == 0
+    # 100 tokens left, refilled at 10 tokens per second
+    assert state.try_acquire(300, now=0.0) == pytest.approx(20.0)
+    # a request larger than the whole budget waits for a full bucket
+    assert state.try_acquire(1000, now=20.0) == pytest.approx(30.0)
+    assert state.try_acquire(1000, now=50.0) == 0
+
+
+def test_usage_settles_the_estimate():
+    state = ModelState(ModelLimits(rpm=100, tpm=1000), now=0.0)
+    state.try_acquire(800, now=0.0)
+
+    state.release(800, used_tokens=300, latency=1.0, throttled=False)
+
+    assert state.tokens.level == pytest.approx(700)
+
+
+def test_aimd_concurrency():
+    state = ModelState(ModelLimits(), now=0.0)
+    for _ in range(INITIAL_CONCURRENCY):
+        state.try_acquire(1, now=0.0)
+        state.release(1, None, latency=1.0, throttled=False)
+    assert state.concurrency == pytest.approx(INITIAL_CONCURRENCY + 1, 0.1)
+
+    state.try_acquire(1, now=0.0)
+    state.release(1, None, latency=1.0, throttled=True)
+    assert state.concurrency == pytest.approx(
+        (INITIAL_CONCURRENCY + 1) / 2, 0.1
+    )
+
+    before = state.concurrency
+    state.try_acquire(1, now=0.0)
+    state.release(1, None, latency=10.0, throttled=False)
+    assert state.concurrency < before
+
+
+def test_concurrency_limit_blocks_new_requests():
+    state = ModelState(ModelLimits(), now=0.0)
+    for _ in range(INITIAL_CONCURRENCY):
+        assert state.try_acquire(1, now=0.0) == 0
+
+    assert state.try_acquire(1, now=0.0) > 0
+
+
+def test_slot_reports_throttling():
+    limiter = RateLimiter()
+
+    with pytest.raises(ThrottledError):
+        with limiter.slot("gpt-4-turbo", 10):
+            raise ThrottledError()
+    with limiter.slot("gpt-4-turbo", 10) as permit:
+        permit.used_tokens = 5
+
+    stats = limiter.stats()["gpt-4-turbo"]
+    assert stats["throttled"] == 1
+    assert stats["completed"] == 1
+    assert stats["in_flight"] == 0
+    assert stats["concurrency"] < INITIAL_CONCURRENCY
+
+
+def test_failed_calls_do_not_grow_concurrency():
+    limiter = RateLimiter(default_limits=ModelLimits(tpm=1000))
+
+    for _ in range(2 * INITIAL_CONCURRENCY):
+        with pytest.raises(ServerError):
+            with limiter.slot("gpt-4-turbo", 100):
+                raise ServerError()
+
+    async def cancelled():
+        async with limiter.slot_async("gpt-4-turbo", 100):
+            raise asyncio.CancelledError()
+
+    with pytest.raises(asyncio.CancelledError):
+        asyncio.run(cancelled())
+
+    stats = limiter.stats()["gpt-4-turbo"]
+    assert stats["concurrency"] == INITIAL_CONCURRENCY
+    assert stats["completed"] == 0
+    assert stats["failed"] == 2 * INITIAL_CONCURRENCY + 1
+    assert stats["in_flight"] == 0
+    # The estimates of the failed calls were refunded.
+    assert limiter._try_acquire("gpt-4-turbo", 1000) == 0
+
+
+def test_slot_async_waits_for_a_free_slot():
+    limiter = RateLimiter()
+    limiter._state("gpt-4-turbo").concurrency = 1
+    in_flight = 0
+    peak = 0
+
+    async def call():
+        nonlocal in_flight, peak
+        async with limiter.slot_async("gpt-4-turbo", 10):
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+
+    async def main():
+        await asyncio.gather(call(), call())
+
+    asyncio.run(main())
+
+    assert peak == 1
+
+
+def test_one_limiter_per_process():
+    limiters = []
+    threads = [
+        threading.Thread(target=lambda: limiters.append(get_rate_limiter()))
+        for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert all(limiter is limiters[0] for limiter in limiters)
@@ -0,0 +1,259 @@
+import json
+
+import pytest
+import translation_agent.utils as utils
+from translation_agent.context import ContextPolicy
+from translation_agent.fake_server import FakeBackend
+from translation_agent.instrumentation import CallbackHandler
+from translation_agent.instrumentation import MetricsCollector
+from translation_agent.instrumentation import instrument
+from translation_agent.ratelimit import RateLimiter
+from translation_agent.reflection import Issue
+from translation_agent.reflection import Reflection
+from translation_agent.reflection import Revision
+from translation_agent.reflection import parse_reflection
+from translation_agent.reflection import parse_revision
+from translation_agent.reflection import verdict_prompt
+
+
+CLEAN = json.dumps(
+    {"issues": [{"severity": "cosmetic", "issue": "Could be shorter."}]}
+)
+DIRTY = json.dumps(
+    {
+        "issues": [
+            {
+                "severity": "major",
+                "category": "accuracy",
+                "issue": "'gato' is a mistranslation.",
+                "suggestion": "Use 'perro'.",
+            }
+        ]
+    }
+)
+
+
+@pytest.fixture
+def fake_backend(mocker):
+    backend = FakeBackend()
+    mocker.patch("translation_agent.backends._backend", backend)
+    mocker.patch.object(utils, "completion_cache", None)
+    mocker.patch.object(utils, "translation_memory", None)
+    mocker.patch("translation_agent.ratelimit._rate_limiter", RateLimiter())
+    return backend
+
+
+def test_parse_reflection():
+    assert parse_reflection('{"issues": []}') == Reflection([])
+    assert parse_reflection("Looks good to me.") is None
+    assert parse_reflection('{"reply": "ok"}') is None
+
+    reflection = parse_reflection(DIRTY)
+    assert reflection.issues == [
+        Issue(
+            "major",
+            "accuracy",
+            "'gato' is a mistranslation.",
+            "Use 'perro'.",
+        )
+    ]
+    assert reflection.actionable()
+    assert "[major] 'gato' is a mistranslation." in reflection.as_suggestions()
+
+
+def test_actionable_thresholds():
+    assert not parse_reflection(CLEAN).actionable()
+    assert not Reflection([Issue("minor")]).actionable("major")
+    # An unknown severity is never treated as harmless.
+    assert parse_reflection(
+        '{"issues": [{"severity": "severe"}]}'
+    ).actionable()
+
+
+def test_verdict_prompt_replaces_the_instructions():
+    _, prompt = utils._one_chunk_reflect_prompt(
+        "English", "Spanish", "Hello", "Hola", structured=True
+    )
+    _, multichunk_prompt = utils._multichunk_reflect_prompt(
+        "English",
+        "Spanish",
+        "<TRANSLATE_THIS>Hi</TRANSLATE_THIS>",
+        "Hi",
+        "Hola",
+    )
+
+    assert prompt.endswith(
+        'output {"issues": []}.\nOutput only the JSON object and nothing else.'
+    )
+    assert "Output only the suggestions" not in prompt
+    assert "JSON" in verdict_prompt(multichunk_prompt)
+    with pytest.raises(ValueError):
+        verdict_prompt("Translate this.")
+
+
+def _reply(prompt, json_mode, verdicts, default=DIRTY):
+    if "then improve" in prompt or "then edit" in prompt:
+        return "improved"
+    if "constructive criticism" in prompt:
+        assert json_mode
+        chunk = prompt.split("<TRANSLATE_THIS>\n")[-1].split("\n")[0]
+        return verdicts.get(chunk, default)
+    return "initial"
+
+
+def _fake_completion(verdicts, default=DIRTY):
+    async def fake_completion(prompt, system_message=None, json_mode=False):
+        return _reply(prompt, json_mode, verdicts, default)
+
+    return fake_completion
+
+
+def test_clean_chunks_skip_the_improve_stage(fake_backend):
+    def responder(messages, model, json_mode):
+        return _reply(messages[1]["content"], json_mode, {"chunk-1": CLEAN})
+
+    fake_backend.llm.responder = responder
+    metrics = MetricsCollector()
+
+    with instrument(metrics):
+        result = utils.multichunk_translation(
+            "English",
+            "Spanish",
+            ["chunk-0", "chunk-1", "chunk-2"],
+            structured_reflection=True,
+        )
+
+    assert result == ["improved", "initial", "improved"]
+    assert fake_backend.llm.stats()["completed"] == 8
+    improve = metrics.summary()["improve"]
+    assert (improve["calls"], improve["skipped"]) == (2, 1)
+    assert improve["skip_rate"] == pytest.approx(1 / 3)
+
+
+@pytest.mark.parametrize(
+    ("verdict", "expected"), [(CLEAN, "initial"), (DIRTY, "improved")]
+)
+def test_translate_reads_the_default_from_the_env(mocker, verdict, expected):
+    mocker.patch.object(utils, "translation_memory", None)
+    mocker.patch.object(utils, "STRUCTURED_REFLECTION", True)
+    mocker.patch(
+        "translation_agent.utils.get_completion_async",
+        side_effect=_fake_completion({}, default=verdict),
+    )
+
+    assert utils.translate("English", "Spanish", "Hello", "Mexico") == expected
+
+
+def test_sync_one_chunk_translate_text_skips_improve(mocker):
+    mock_completion = mocker.patch(
+        "translation_agent.utils.get_completion",
+        side_effect=["initial", CLEAN],
+    )
+
+    result = utils.one_chunk_translate_text(
+        "English", "Spanish", "Hello", structured_reflection=True
+    )
+
+    assert result == "initial"
+    assert mock_completion.call_count == 2
+    assert mock_completion.call_args.kwargs["json_mode"] is True
+
+
+def test_unparseable_verdict_still_improves(mocker):
+    mocker.patch(
+        "translation_agent.utils.get_completion",
+        side_effect=["initial", "Use a more formal register.", "improved"],
+    )
+
+    result = utils.one_chunk_translate_text(
+        "English", "Spanish", "Hello", structured_reflection=True
+    )
+
+    assert result == "improved"
+
+
+class CritiqueRecorder(CallbackHandler):
+    def __init__(self):
+        self.critiques = []
+
+    def on_critique(self, event):
+        self.critiques.append((event.stage, event.chunk_index))
+
+
+def test_parse_revision():
+    revision = parse_revision(
+        json.dumps({"critique": "Too literal.", "translation": "Hola"})
+    )
+
+    assert revision == Revision("Too literal.", "Hola")
+    assert parse_revision('{"critique": ["a"], "translation": "Hola"}') == (
+        Revision('["a"]', "Hola")
+    )
+    assert parse_revision('{"critique": "Fine."}') is None
+    assert parse_revision("Hola") is None
+
+
+def test_fused_translation_makes_two_calls_per_chunk(fake_backend):
+    metrics, recorder = MetricsCollector(), CritiqueRecorder()
+    prompts = []
+    responder = fake_backend.llm.responder
+
+    def recording_responder(messages, model, json_mode):
+        prompts.append(messages[1]["content"])
+        return responder(messages, model, json_mode)
+
+    fake_backend.llm.responder = recording_responder
+
+    with instrument(metrics, recorder):
+        result = utils.multichunk_translation(
+            "English",
+            "Spanish",
+            ["chunk-0 ", "chunk-1 ", "chunk-2"],
+            context=ContextPolicy.neighbouring(0),
+            fused=True,
+        )
+
+    assert len(result) == 3
+    assert fake_backend.llm.stats()["completed"] == 6
+    assert set(metrics.summary()) == {"initial", "fused"}
+    assert sorted(recorder.critiques) == [("fused", i) for i in range(3)]
+    fused_prompts = [p for p in prompts if '"translation":' in p]
+    assert len(fused_prompts) == 3
+    assert all("<TRANSLATE_THIS>" in p for p in fused_prompts)
+    # Only the chunk itself is sent as context with neighbouring(0).
+    assert not any("chunk-1" in p for p in fused_prompts if "chunk-0" in p)
+
+
+def test_translate_selects_the_mode_per_call(fake_backend):
+    utils.translate("English", "Spanish", "Hello", "Mexico", fused=True)
+    assert fake_backend.llm.stats()["completed"] == 2
+
+    utils.translate("English", "Spanish", "Goodbye", "Mexico")
+    assert fake_backend.llm.stats()["completed"] == 5
+
+
+def test_sync_fused_translation(mocker):
+    mocker.patch(
+        "translation_agent.utils.get_completion",
+        side_effect=[
+            "initial",
+            json.dumps({"critique": "Too literal.", "translation": "revised"}),
+            "initial",
+            "Not JSON at all.",
+            "improved",
+        ],
+    )
+
+    assert (
+        utils.one_chunk_translate_text(
+            "English", "Spanish", "Hello", fused=True
+        )
+        == "revised"
+    )
+    # An unparseable reply is used as the reflection of an improve call.
+    assert (
+        utils.one_chunk_translate_text(
+            "English", "Spanish", "Hello", fused=True
+        )
+        == "improved"
+    )
@@ -0,0 +1,262 @@
+import asyncio
+import concurrent.futures
+import threading
+import time
+
+import httpx
+import openai
+import pytest
+import translation_agent.retry as retry
+import translation_agent.utils as utils
+from translation_agent.backends import OpenAIBackend
+from translation_agent.retry import LatencyTracker
+from translation_agent.retry import RetryPolicy
+from translation_agent.retry import backoff_delay
+from translation_agent.retry import call_with_retry
+from translation_agent.retry import call_with_retry_async
+from translation_agent.retry import is_retryable
+
+
+REQUEST = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+FAST = RetryPolicy(base_delay=0.001, max_delay=0.01)
+
+
+class StatusError(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+        self.response = httpx.Response(
+            status_code, headers=headers or {}, request=REQUEST
+        )
+
+
+@pytest.fixture(autouse=True)
+def tracker(mocker):
+    tracker = LatencyTracker()
+    mocker.patch.object(retry, "latency_tracker", tracker)
+    return tracker
+
+
+def test_is_retryable():
+    assert is_retryable(openai.APITimeoutError(request=REQUEST))
+    assert is_retryable(openai.APIConnectionError(request=REQUEST))
+    assert is_retryable(TimeoutError())
+    assert is_retryable(asyncio.TimeoutError())
+    assert is_retryable(StatusError(429))
+    assert is_retryable(StatusError(503))
+    assert not is_retryable(StatusError(400))
+    assert not is_retryable(ValueError())
+
+
+def test_backoff_delay_is_jittered_and_capped():
+    policy = RetryPolicy(base_delay=1.0, max_delay=4.0)
+    delays = [backoff_delay(10, policy) for _ in range(200)]
+
+    assert all(0 <= delay <= 4.0 for delay in delays)
+    assert len(set(delays)) > 100
+    assert (
+        backoff_delay(1, policy, StatusError(429, {"retry-after": "3"})) >= 3
+    )
+
+
+def test_transient_errors_are_retried(tracker):
+    outcomes = [StatusError(503), openai.APITimeoutError(request=REQUEST)]
+    timeouts = []
+
+    def attempt(timeout):
+        timeouts.append(timeout)
+        if outcomes:
+            raise outcomes.pop(0)
+        return "ok"
+
+    assert call_with_retry(attempt, "gpt-4-turbo", FAST) == "ok"
+    assert timeouts == [FAST.timeout] * 3
+    assert tracker.stats() == {"retries": 2, "timeouts": 1}
+
+
+def test_permanent_errors_are_not_retried():
+    attempt_count = 0
+
+    def attempt(timeout):
+        nonlocal attempt_count
+        attempt_count += 1
+        raise StatusError(400)
+
+    with pytest.raises(StatusError):
+        call_with_retry(attempt, "gpt-4-turbo", FAST)
+    assert attempt_count == 1
+
+
+def test_gives_up_after_max_attempts():
+    attempt_count = 0
+
+    def attempt(timeout):
+        nonlocal attempt_count
+        attempt_count += 1
+        raise StatusError(500)
+
+    with pytest.raises(StatusError):
+        call_with_retry(attempt, "gpt-4-turbo", FAST)
+    assert attempt_count == FAST.max_attempts
+
+
+def test_call_deadline_bounds_retries():
+    policy = RetryPolicy(
+        max_attempts=100, base_delay=0.05, max_delay=0.05, deadline=0.1
+    )
+    timeouts = []
+
+    def attempt(timeout):
+        timeouts.append(timeout)
+        raise StatusError(500)
+
+    started = time.monotonic()
+    with pytest.raises(StatusError):
+        call_with_retry(attempt, "gpt-4-turbo", policy)
+
+    assert time.monotonic() - started < 0.15
+    assert all(0 < timeout <= 0.1 for timeout in timeouts)
+    assert timeouts == sorted(timeouts, reverse=True)
+
+
+def test_slow_call_is_hedged(tracker):
+    for _ in range(20):
+        tracker.record("gpt-4-turbo", 0.01)
+    policy = RetryPolicy(hedge=True)
+    first_call = threading.Event()
+
+    def attempt(timeout):
+        if not first_call.is_set():
+            first_call.set()
+            time.sleep(1.0)
+            return "slow"
+        return "fast"
+
+    started = time.monotonic()
+    assert call_with_retry(attempt, "gpt-4-turbo", policy) == "fast"
+    assert time.monotonic() - started < 0.5
+    assert tracker.stats() == {"hedges": 1, "hedge_wins": 1}
+
+
+def test_no_hedging_without_latency_history(tracker):
+    policy = RetryPolicy(hedge=True)
+
+    assert call_with_retry(lambda timeout: "ok", "gpt-4-turbo", policy) == "ok"
+    assert "hedges" not in tracker.stats()
+
+
+def test_async_attempt_deadline_is_retried(tracker):
+    policy = RetryPolicy(base_delay=0.001, timeout=0.05)
+    attempt_count = 0
+
+    async def attempt(timeout):
+        nonlocal attempt_count
+        attempt_count += 1
+        if attempt_count == 1:
+            await asyncio.sleep(1.0)
+        return "ok"
+
+    result = asyncio.run(call_with_retry_async(attempt, "gpt-4-turbo", policy))
+
+    assert result == "ok"
+    assert attempt_count == 2
+    assert tracker.stats()["timeouts"] == 1
+    assert tracker.stats()["retries"] == 1
+
+
+def test_async_hedge_cancels_the_loser(tracker):
+    for _ in range(20):
+        tracker.record("gpt-4-turbo", 0.01)
+    policy = RetryPolicy(hedge=True)
+    cancelled = []
+
+    async def attempt(timeout):
+        if not cancelled:
+            cancelled.append(False)
+            try:
+                await asyncio.sleep(1.0)
+            except asyncio.CancelledError:
+                cancelled[0] = True
+                raise
+            return "slow"
+        return "fast"
+
+    result = asyncio.run(call_with_retry_async(attempt, "gpt-4-turbo", policy))
+
+    assert result == "fast"
+    assert cancelled == [True]
+
+
+def test_hedge_succeeds_when_both_attempts_finish_together(tracker, mocker):
+    for _ in range(20):
+        tracker.record("gpt-4-turbo", 0.01)
+    policy = RetryPolicy(hedge=True, max_attempts=1)
+    hedged = threading.Event()
+    wait = concurrent.futures.wait
+
+    def wait_for_both(futures, timeout=None, return_when=None):
+        # Both attempts come back in the same done set, the failed one
+        # first.
+        done, pending = wait(futures, timeout=timeout)
+        return sorted(done, key=lambda f: f.exception() is None), pending
+
+    mocker.patch("concurrent.futures.wait", side_effect=wait_for_both)
+
+    def attempt(timeout):
+        if not hedged.is_set():
+            hedged.set()
+            time.sleep(0.05)
+            raise StatusError(503)
+        return "ok"
+
+    assert call_with_retry(attempt, "gpt-4-turbo", policy) == "ok"
+    assert tracker.stats() == {"hedges": 1, "hedge_wins": 1}
+
+
+def test_async_hedge_succeeds_when_both_attempts_finish_together(
+    tracker, mocker
+):
+    for _ in range(20):
+        tracker.record("gpt-4-turbo", 0.01)
+    policy = RetryPolicy(hedge=True, max_attempts=1)
+    attempts = []
+    wait = asyncio.wait
+
+    async def wait_for_both(futures, timeout=None, return_when=None):
+        done, pending = await wait(futures, timeout=timeout)
+        return sorted(done, key=lambda f: f.exception() is None), pending
+
+    mocker.patch("asyncio.wait", side_effect=wait_for_both)
+
+    async def attempt(timeout):
+        attempt_number = len(attempts)
+        attempts.append(attempt_number)
+        await asyncio.sleep(0.05)
+        if attempt_number == 0:
+            raise StatusError(503)
+        return "ok"
+
+    result = asyncio.run(call_with_retry_async(attempt, "gpt-4-turbo", policy))
+
+    assert result == "ok"
+    assert tracker.stats() == {"hedges": 1, "hedge_wins": 1}
+
+
+def test_get_completion_retries_transient_errors(mocker):
+    mocker.patch.object(utils, "completion_cache", None)
+    mocker.patch.object(retry, "retry_policy", FAST)
+    # A backend of its own, so the test needs no OPENAI_API_KEY.
+    mocker.patch(
+        "translation_agent.backends._backend", OpenAIBackend(api_key="sk-test")
+    )
+    response = mocker.MagicMock()
+    response.choices[0].message.content = "Paris"
+    mock_create = mocker.patch.object(
+        utils.client.chat.completions,
+        "create",
+        side_effect=[openai.APITimeoutError(request=REQUEST), response],
+    )
+
+    assert utils.get_completion("Capital of France?") == "Paris"
+    assert mock_create.call_count == 2
+    assert mock_create.call_args.kwargs["timeout"] == FAST.timeout
@@ -0,0 +1,162 @@
+import pytest
+import translation_agent.utils as utils
+from translation_agent import routing
+from translation_agent.fake_server import FakeBackend
+from translation_agent.fake_server import default_reply
+from translation_agent.ratelimit import RateLimiter
+from translation_agent.routing import ModelRouting
+from translation_agent.routing import StageModel
+from translation_agent.routing import draft_issues
+from translation_agent.routing import get_model_routing
+from translation_agent.routing import set_model_routing
+
+
+TEXT = "A short sentence to translate."
+
+
+@pytest.fixture
+def models(mocker):
+    """Route calls to a fake backend and record the model of each call."""
+    seen = []
+
+    def responder(messages, model, json_mode):
+        seen.append(model)
+        # The cheap model drafts nothing, the others answer as usual.
+        if model == "cheap":
+            return ""
+        return default_reply(messages, model, json_mode)
+
+    backend = FakeBackend(responder=responder)
+    mocker.patch("translation_agent.backends._backend", backend)
+    mocker.patch.object(utils, "completion_cache", None)
+    mocker.patch.object(utils, "translation_memory", None)
+    mocker.patch("translation_agent.ratelimit._rate_limiter", RateLimiter())
+    mocker.patch.object(routing, "_model_routing", ModelRouting())
+    return seen
+
+
+@pytest.mark.parametrize(
+    "source, draft, issues",
+    [
+        ("Hello there, friend.", "Hola, amigo.", []),
+        ("Hello there, friend.", "   ", ["empty"]),
+        ("Hello.", "<TRANSLATION>Hola.</TRANSLATION>", ["tags"]),
+        ("One line.\nTwo lines.", "Una linea.", ["lines"]),
+        ("A sentence long enough to check.", "Una", ["length"]),
+        ("Keep this one as is.", "Keep this one as is.", ["untranslated"]),
+        ("", "", []),
+    ],
+)
+def test_draft_issues(source, draft, issues):
+    assert draft_issues(source, draft) == issues
+
+
+def test_tiered_routing():
+    tiered = ModelRouting.tiered("cheap", "strong")
+
+    assert tiered.completion_kwargs("initial") == {"model": "cheap"}
+    assert tiered.completion_kwargs("reflect") == {"model": "cheap"}
+    assert tiered.completion_kwargs("fused") == {"model": "strong"}
+    assert tiered.completion_kwargs("escalate") == {"model": "strong"}
+    assert tiered.escalates
+    assert not ModelRouting.tiered("cheap", "strong", escalate=False).escalates
+    assert ModelRouting().completion_kwargs("improve") == {}
+    assert ModelRouting().model("improve") == routing.DEFAULT_MODEL
+
+
+def test_routing_from_environment(models, monkeypatch):
+    monkeypatch.setenv("TRANSLATION_REFLECT_MODEL", "critic")
+    monkeypatch.setenv("TRANSLATION_REFLECT_TEMPERATURE", "0.7")
+
+    set_model_routing(None)
+
+    assert get_model_routing().reflect == StageModel("critic", 0.7)
+    assert get_model_routing().initial == StageModel()
+
+
+def test_translate_routes_each_stage(models):
+    tiered = ModelRouting.tiered("draft", "strong")
+
+    utils.translate(
+        "English",
+        "Spanish",
+        TEXT,
+        "Mexico",
+        structured_reflection=False,
+        fused=False,
+        routing=tiered,
+    )
+
+    assert models == ["draft", "draft", "strong"]
+
+
+def test_broken_draft_is_escalated(models):
+    tiered = ModelRouting.tiered("cheap", "strong")
+
+    translation = utils.translate(
+        "English",
+        "Spanish",
+        TEXT,
+        "Mexico",
+        structured_reflection=False,
+        fused=False,
+        routing=tiered,
+    )
+
+    assert translation
+    assert models == ["cheap", "strong", "cheap", "strong"]
+
+
+def test_no_escalation_without_escalation_model(models):
+    set_model_routing(ModelRouting.tiered("cheap", "strong", escalate=False))
+
+    utils.translate(
+        "English",
+        "Spanish",
+        TEXT,
+        "Mexico",
+        structured_reflection=False,
+        fused=False,
+    )
+
+    assert models == ["cheap", "cheap", "strong"]
+
+
+def test_multichunk_initial_translation_escalates(models):
+    tiered = ModelRouting.tiered("cheap", "strong")
+    chunks = ["First chunk to translate. ", "Second chunk to translate."]
+
+    translations = utils.multichunk_initial_translation(
+        "English", "Spanish", chunks, routing=tiered
+    )
+
+    assert all(translations)
+    assert models == ["cheap", "strong", "cheap", "strong"]
+
+
+def test_one_chunk_stages_pass_model_and_temperature(models, mocker):
+    spy = mocker.spy(utils, "get_completion")
+    custom = ModelRouting(
+        initial=StageModel("draft", 0.2),
+        reflect=StageModel("draft"),
+        improve=StageModel("strong", 0.0),
+    )
+
+    utils.one_chunk_translate_text(
+        "English",
+        "Spanish",
+        TEXT,
+        structured_reflection=False,
+        fused=False,
+        routing=custom,
+    )
+
+    kwargs = [
+        {k: v for k, v in call.kwargs.items() if k != "system_message"}
+        for call in spy.call_args_list
+    ]
+    assert kwargs == [
+        {"model": "draft", "temperature": 0.2},
+        {"model": "draft"},
+        {"model": "strong", "temperature": 0.0},
+    ]
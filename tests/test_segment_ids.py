@@ -0,0 +1,126 @@
+import re
+
+import pytest
+import translation_agent.utils as utils
+from translation_agent.fake_server import FakeBackend
+from translation_agent.memory import TranslationMemory
+from translation_agent.ratelimit import RateLimiter
+from translation_agent.segment_ids import ID_INSTRUCTIONS
+from translation_agent.segment_ids import find_ids
+from translation_agent.segment_ids import join_with_ids
+from translation_agent.segment_ids import split_by_ids
+from translation_agent.segment_ids import strip_ids
+
+
+SPANISH = {
+    "One.": "Uno.",
+    "Two.": "Dos.",
+    "Three.": "Tres.",
+    "Four.": "Cuatro.",
+}
+
+
+@pytest.fixture
+def prompts(mocker):
+    """Translate marked lines word for word, and record every prompt."""
+    seen = []
+
+    def responder(messages, model, json_mode):
+        prompt = messages[1]["content"]
+        seen.append(prompt)
+        if ID_INSTRUCTIONS not in prompt:
+            return "Fine as it is."
+        # The source comes first in every prompt, so the first line of
+        # each id is its source text.
+        lines = {}
+        for id_, text in re.findall(r"\[\[([\w.]+)\]\] (.*)", prompt):
+            lines.setdefault(id_, text)
+        return join_with_ids(
+            list(lines), [SPANISH.get(text, text) for text in lines.values()]
+        )
+
+    backend = FakeBackend(responder=responder)
+    mocker.patch("translation_agent.backends._backend", backend)
+    mocker.patch.object(utils, "completion_cache", None)
+    mocker.patch.object(utils, "translation_memory", None)
+    mocker.patch("translation_agent.ratelimit._rate_limiter", RateLimiter())
+    return seen
+
+
+def translate(source_text, memory=None):
+    return utils.translate(
+        "English",
+        "Spanish",
+        source_text,
+        "Mexico",
+        memory=memory,
+        structured_reflection=False,
+        fused=False,
+    )
+
+
+def test_split_by_ids():
+    ids = ["p0", "p2", "p3"]
+    source = join_with_ids(ids, ["One.", "Two.", "Three."])
+    translation = (
+        "<TRANSLATION>\n[[p3]] Tres.\n[[p0]] Uno,\ncontinuado.\n"
+        "[[p9]] Otro.\n[[p0]] Repetido.\n</TRANSLATION>"
+    )
+
+    assert source == "[[p0]] One.\n[[p2]] Two.\n[[p3]] Three."
+    assert find_ids(source) == ids
+    assert split_by_ids(translation, ids) == {
+        "p3": "Tres.",
+        "p0": "Uno,\ncontinuado.",
+    }
+    assert strip_ids(source) == "One.\nTwo.\nThree."
+
+
+def test_split_by_ids_without_markers():
+    ids = ["p0", "p1"]
+
+    assert split_by_ids("Uno.\n\nDos.", ids) == {"p0": "Uno.", "p1": "Dos."}
+    assert split_by_ids("Uno y dos.", ids) == {}
+
+
+def test_merged_marker_leaves_its_segment_untranslated():
+    ids = ["p0", "p2", "p5"]
+
+    translation = "[[p0]] Uno y dos.\n[[p5]] Tres."
+
+    assert split_by_ids(translation, ids) == {
+        "p0": "Uno y dos.",
+        "p5": "Tres.",
+    }
+
+
+def test_prompts_ask_to_keep_the_markers(prompts):
+    source = join_with_ids(["p0", "p2"], ["One.", "Two."])
+
+    translation = translate(source)
+
+    assert split_by_ids(translation, ["p0", "p2"]) == {
+        "p0": "Uno.",
+        "p2": "Dos.",
+    }
+    # Initial and improve prompts carry the instruction, reflect does not.
+    assert [ID_INSTRUCTIONS in prompt for prompt in prompts] == [
+        True,
+        False,
+        True,
+    ]
+
+
+def test_memory_keys_segments_without_markers(prompts, tmp_path):
+    memory = TranslationMemory(str(tmp_path / "tm.sqlite3"))
+    translate(join_with_ids(["p0", "p1"], ["One.", "Two."]), memory)
+
+    assert memory.lookup("Two.", "English", "Spanish").translation == "Dos."
+    prompts.clear()
+
+    translation = translate(
+        join_with_ids(["p7", "p9"], ["Two.", "Four."]), memory
+    )
+
+    assert translation == "[[p7]] Dos.\n[[p9]] Cuatro."
+    assert all("Two." not in prompt for prompt in prompts)
@@ -0,0 +1,260 @@
+import json
+
+import pytest
+import translation_agent.utils as utils
+from translation_agent.fake_server import FakeBackend
+from translation_agent.instrumentation import MetricsCollector
+from translation_agent.instrumentation import instrument
+from translation_agent.memory import TranslationMemory
+from translation_agent.ratelimit import RateLimiter
+from translation_agent.segments import deduplicate
+from translation_agent.segments import normalize_segment
+from translation_agent.segments import pack_segments
+from translation_agent.segments import parse_translations
+from translation_agent.segments import translate_segments
+
+
+@pytest.fixture
+def fake_backend(mocker):
+    backend = FakeBackend()
+    mocker.patch("translation_agent.backends._backend", backend)
+    mocker.patch.object(utils, "completion_cache", None)
+    mocker.patch.object(utils, "translation_memory", None)
+    mocker.patch("translation_agent.ratelimit._rate_limiter", RateLimiter())
+    return backend
+
+
+def _segments(prompt):
+    block = prompt.split("<SEGMENTS>")[1].split("</SEGMENTS>")[0]
+    return json.loads(block)
+
+
+def test_pack_segments():
+    assert pack_segments([5, 5, 5], max_tokens=10) == [[0, 1], [2]]
+    # An oversized segment gets a pack of its own.
+    assert pack_segments([3, 20, 3], max_tokens=10) == [[0], [1], [2]]
+    assert pack_segments([1] * 5, max_segments=2) == [[0, 1], [2, 3], [4]]
+    assert pack_segments([]) == []
+
+
+def test_normalize_segment():
+    assert normalize_segment("  Net\u00a0 total\n") == "Net total"
+    # Composed and decomposed accents compare equal, case does not.
+    assert normalize_segment("Cafe\u0301") == normalize_segment("Caf\u00e9")
+    assert normalize_segment("Yes") != normalize_segment("YES")
+
+
+def test_deduplicate():
+    deduplicated = deduplicate(["N/A", "Yes", " N/A ", "No", "Yes"])
+
+    assert deduplicated.unique == ["N/A", "Yes", "No"]
+    assert deduplicated.index == [0, 1, 0, 2, 1]
+    assert deduplicated.ratio == pytest.approx(0.4)
+    assert deduplicated.expand(["n/d", "sí", "no"]) == [
+        "n/d",
+        "sí",
+        "n/d",
+        "no",
+        "sí",
+    ]
+    assert deduplicated.first == [0, 1, 3]
+    assert deduplicate([]).ratio == 0.0
+
+
+def test_parse_translations():
+    reply = json.dumps(
+        {
+            "translations": [
+                {"id": "1", "text": "uno"},
+                {"id": 0, "text": "cero"},
+                {"id": "7", "text": "out of range"},
+                {"id": "x", "text": "bad id"},
+                {"id": "2"},
+            ]
+        }
+    )
+
+    assert parse_translations(reply, 3) == {0: "cero", 1: "uno"}
+    assert parse_translations('{"translations": {"0": "cero"}}', 1) == {
+        0: "cero"
+    }
+    assert parse_translations("cero, uno", 2) == {}
+    assert parse_translations('{"reply": "cero"}', 1) == {}
+
+
+def test_segments_are_packed_into_three_calls(fake_backend):
+    cells = [f"Cell {i}" for i in range(40)] + ["", "--", "Total"]
+    metrics = MetricsCollector()
+
+    with instrument(metrics):
+        result = translate_segments("English", "Spanish", cells, "Mexico")
+
+    assert len(result) == len(cells)
+    assert result[40:42] == ["", "--"]
+    assert all(result[i] != cells[i] for i in range(40))
+    assert fake_backend.llm.stats()["completed"] == 3
+    assert {stage: s["calls"] for stage, s in metrics.summary().items()} == {
+        "initial": 1,
+        "reflect": 1,
+        "improve": 1,
+    }
+
+
+def test_translations_are_unpacked_by_id(fake_backend):
+    def responder(messages, model, json_mode):
+        prompt = messages[1]["content"]
+        if not json_mode:
+            return "Keep it short."
+        segments = _segments(prompt)
+        field = "translation" if "then edit" in prompt else "text"
+        # Reply out of order to check the ids are honoured.
+        translations = [
+            {"id": s["id"], "text": s[field].upper()}
+            for s in reversed(segments)
+        ]
+        return json.dumps({"translations": translations})
+
+    fake_backend.llm.responder = responder
+
+    result = translate_segments("English", "Spanish", ["Name", "Total"])
+
+    assert result == ["NAME", "TOTAL"]
+
+
+def test_missing_segments_fall_back_to_translate(fake_backend):
+    def responder(messages, model, json_mode):
+        prompt = messages[1]["content"]
+        if "<SEGMENTS>" not in prompt:
+            # A single-text translate() call.
+            return "fallback"
+        if not json_mode:
+            return "Keep it short."
+        if "then edit" in prompt:
+            return "Not JSON."
+        segments = [s for s in _segments(prompt) if s["text"] != "Price"]
+        return json.dumps(
+            {
+                "translations": [
+                    {"id": s["id"], "text": "packed"} for s in segments
+                ]
+            }
+        )
+
+    fake_backend.llm.responder = responder
+
+    result = translate_segments("English", "Spanish", ["Name", "Price", "Qty"])
+
+    # The unparseable improve reply keeps the initial translations.
+    assert result == ["packed", "fallback", "packed"]
+    assert fake_backend.llm.stats()["completed"] == 3 + 3
+
+
+def test_unparseable_pack_falls_back_per_segment(fake_backend):
+    def responder(messages, model, json_mode):
+        if "<SEGMENTS>" in messages[1]["content"]:
+            return "Sorry, I cannot do that."
+        return "fallback"
+
+    fake_backend.llm.responder = responder
+
+    result = translate_segments("English", "Spanish", ["Name", "Price"])
+
+    assert result == ["fallback", "fallback"]
+    assert fake_backend.llm.stats()["completed"] == 1 + 2 * 3
+
+
+def test_lone_and_oversized_segments_use_translate(fake_backend):
+    long_cell = "A sentence to translate. " * 20
+
+    translate_segments(
+        "English", "Spanish", ["Name", long_cell], max_pack_tokens=50
+    )
+
+    # Each segment ends up in a pack of its own.
+    assert fake_backend.llm.stats()["completed"] == 2 * 3
+
+
+def test_repeated_segments_are_translated_once(fake_backend):
+    packed = []
+
+    def responder(messages, model, json_mode):
+        prompt = messages[1]["content"]
+        if not json_mode:
+            return "Keep it short."
+        field = "translation" if "then edit" in prompt else "text"
+        segments = _segments(prompt)
+        packed.append([s[field] for s in segments])
+        translations = [
+            {"id": s["id"], "text": s[field].upper()} for s in segments
+        ]
+        return json.dumps({"translations": translations})
+
+    fake_backend.llm.responder = responder
+    cells = ["Yes", "N/A", "Yes ", "No", "N/A", "Yes"]
+
+    result = translate_segments("English", "Spanish", cells)
+
+    assert packed[0] == ["Yes", "N/A", "No"]
+    assert result == ["YES", "N/A", "YES", "NO", "N/A", "YES"]
+
+
+def test_translation_memory_serves_segments(fake_backend, tmp_path):
+    memory = TranslationMemory(str(tmp_path / "tm.sqlite3"))
+    memory.add("Name", "Nombre", "English", "Spanish")
+    packed = []
+
+    def responder(messages, model, json_mode):
+        prompt = messages[1]["content"]
+        if not json_mode:
+            return "Keep it short."
+        field = "translation" if "then edit" in prompt else "text"
+        segments = _segments(prompt)
+        packed.append([s[field] for s in segments])
+        translations = [
+            {"id": s["id"], "text": s[field].upper()} for s in segments
+        ]
+        return json.dumps({"translations": translations})
+
+    fake_backend.llm.responder = responder
+    cells = ["Name", "Total", "Price"]
+
+    result = translate_segments("English", "Spanish", cells, memory=memory)
+
+    assert result == ["Nombre", "TOTAL", "PRICE"]
+    assert packed[0] == ["Total", "Price"]
+    assert memory.lookup("Price", "English", "Spanish").translation == "PRICE"
+
+    calls = fake_backend.llm.stats()["completed"]
+    assert translate_segments("English", "Spanish", cells, memory=memory) == (
+        result
+    )
+    assert fake_backend.llm.stats()["completed"] == calls
+
+
+def test_translations_mentioning_translation_are_kept(fake_backend):
+    def responder(messages, model, json_mode):
+        prompt = messages[1]["content"]
+        if "<SEGMENTS>" not in prompt:
+            # A lone segment's reply, echoing the prompt's tags.
+            return "<TRANSLATION>\nTRANSLATION: Total\n</TRANSLATION>"
+        if not json_mode:
+            return "Keep it short."
+        if "then edit" in prompt:
+            translations = [
+                {"id": s["id"], "text": s["translation"]}
+                for s in _segments(prompt)
+            ]
+        else:
+            translations = [
+                {"id": s["id"], "text": f"TRANSLATION: {s['text']}"}
+                for s in _segments(prompt)
+            ]
+        return json.dumps({"translations": translations})
+
+    fake_backend.llm.responder = responder
+
+    packed = translate_segments("English", "Spanish", ["Name", "Price"])
+    lone = translate_segments("English", "Spanish", ["Total"])
+
+    assert packed == ["TRANSLATION: Name", "TRANSLATION: Price"]
+    assert lone == ["TRANSLATION: Total"]
@@ -0,0 +1,101 @@
+import time
+
+import pytest
+import translation_agent.utils as utils
+from translation_agent.backends import OpenAIBackend
+from translation_agent.cache import CompletionCache
+from translation_agent.fake_server import FakeBackend
+from translation_agent.fake_server import FakeServer
+from translation_agent.instrumentation import MetricsCollector
+from translation_agent.instrumentation import instrument
+from translation_agent.ratelimit import RateLimiter
+from translation_agent.ratelimit import get_rate_limiter
+
+
+TEXT = "One sentence to translate. " * 20
+
+
+@pytest.fixture
+def fake_backend(mocker):
+    backend = FakeBackend()
+    mocker.patch("translation_agent.backends._backend", backend)
+    mocker.patch.object(utils, "completion_cache", None)
+    mocker.patch.object(utils, "translation_memory", None)
+    mocker.patch("translation_agent.ratelimit._rate_limiter", RateLimiter())
+    return backend
+
+
+def test_streamed_completion_matches_the_whole_completion(fake_backend):
+    metrics = MetricsCollector()
+
+    with instrument(metrics):
+        deltas = list(utils.get_completion("Hello there", stream=True))
+    text = utils.get_completion("Hello there")
+
+    assert "".join(deltas) == text
+    (summary,) = metrics.summary().values()
+    assert summary["calls"] == 1
+    assert summary["prompt_tokens"] > 0
+    assert summary["completion_tokens"] > 0
+    assert get_rate_limiter().stats()["gpt-4-turbo"]["in_flight"] == 0
+
+
+def test_streamed_completion_is_cached(fake_backend, tmp_path, mocker):
+    mocker.patch.object(
+        utils,
+        "completion_cache",
+        CompletionCache(str(tmp_path / "cache.sqlite3")),
+    )
+
+    first = "".join(utils.get_completion("Hello there", stream=True))
+    second = list(utils.get_completion("Hello there", stream=True))
+
+    assert second == [first]
+    assert fake_backend.llm.stats()["completed"] == 1
+
+
+def test_openai_backend_streams_from_fake_server(mocker):
+    with FakeServer() as server:
+        backend = OpenAIBackend(api_key="fake", base_url=server.base_url)
+        deltas = list(backend.stream("Hello there", "System", "gpt-4", 0.3))
+        whole = backend.complete("Hello there", "System", "gpt-4", 0.3)
+
+    assert "".join(delta.text for delta in deltas) == whole.text
+    assert deltas[-1].text == ""
+    assert deltas[-1].prompt_tokens == whole.prompt_tokens
+    assert deltas[-1].completion_tokens == whole.completion_tokens
+
+
+def test_translate_stream_yields_chunks_in_order(fake_backend):
+    chunks = list(
+        utils.translate_stream(
+            "English", "Spanish", TEXT, "Mexico", max_tokens=150
+        )
+    )
+
+    assert len(chunks) > 1
+    assert "".join(chunks) == utils.translate(
+        "English", "Spanish", TEXT, "Mexico", max_tokens=150
+    )
+
+
+def test_closing_translate_stream_cancels_the_rest(mocker):
+    backend = FakeBackend(latency="0.02")
+    mocker.patch("translation_agent.backends._backend", backend)
+    mocker.patch.object(utils, "completion_cache", None)
+    mocker.patch.object(utils, "translation_memory", None)
+    mocker.patch("translation_agent.ratelimit._rate_limiter", RateLimiter())
+    stream = utils.translate_stream(
+        "English", "Spanish", TEXT, "Mexico", max_tokens=150, max_concurrency=1
+    )
+
+    first = next(stream)
+    stream.close()
+    completed = backend.llm.stats()["completed"]
+    time.sleep(0.1)
+
+    assert first
+    assert backend.llm.stats()["completed"] == completed
+    assert get_rate_limiter().stats()["gpt-4-turbo"]["in_flight"] == 0
+    # Four chunks of three calls each, and the first chunk needs only three.
+    assert completed < 12
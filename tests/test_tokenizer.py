@@ -0,0 +1,50 @@
+import translation_agent.tokenizer as tokenizer
+from translation_agent.tokenizer import TokenizedText
+from translation_agent.tokenizer import count_tokens
+from translation_agent.tokenizer import encode
+from translation_agent.tokenizer import encode_batch
+from translation_agent.tokenizer import get_encoding
+from translation_agent.utils import translate
+
+
+def test_get_encoding_is_cached():
+    assert get_encoding("cl100k_base") is get_encoding("cl100k_base")
+
+
+def test_special_token_text_does_not_raise():
+    assert count_tokens("before <|endoftext|> after") > 3
+
+
+def test_encode_batch_matches_single_encodes():
+    cells = ["N/A", "Yes", "Part no. 12-345", "", "Héllò, wörld! 你好"] * 20
+
+    assert encode_batch(cells, num_threads=4) == [encode(c) for c in cells]
+
+
+def test_tokenized_text_offsets_cover_the_text():
+    text = "Héllò, wörld! 你好，世界！\nSecond line."
+    tokenized = TokenizedText(text)
+
+    assert len(tokenized) == count_tokens(text)
+    assert tokenized.slice(0, len(tokenized)) == text
+    pieces = [
+        tokenized.slice(i, i + 1) for i in range(len(tokenized))
+    ]
+    assert "".join(pieces) == text
+
+
+def test_translate_encodes_the_source_text_once(mocker):
+    encode_spy = mocker.spy(tokenizer, "encode")
+
+    async def fake_completion(prompt, system_message=None, **kwargs):
+        return "translated"
+
+    mocker.patch(
+        "translation_agent.utils.get_completion_async",
+        side_effect=fake_completion,
+    )
+    source_text = "A sentence to translate.\n" * 200
+
+    translate("English", "Spanish", source_text, "Mexico", max_tokens=300)
+
+    assert encode_spy.call_count == 1
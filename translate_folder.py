@@ -1,158 +1,352 @@
+import argparse
+import asyncio
 import os
 import sys
-from docx import Document
-import re
+import time
+from concurrent.futures import ProcessPoolExecutor
 
 # Assuming the translation_agent module is in the src/translation_agent directory
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 import src.translation_agent.utils as ta
+from src.translation_agent.batch import BatchItem, BatchTranslator
+from src.translation_agent.docx_pipeline import DocumentPipeline
+from src.translation_agent.instrumentation import MetricsCollector, instrument
+from src.translation_agent.journal import Journal, file_key
+from src.translation_agent.planner import FileTexts, plan
+from src.translation_agent.prefilter import prefilter_stats
+from src.translation_agent.ratelimit import ModelLimits, get_rate_limiter
+from src.translation_agent.routing import get_model_routing
+from src.translation_agent.segment_ids import join_with_ids, split_by_ids
+from src.translation_agent.segments import deduplicate, translate_segments, translate_segments_async
 
-def read_word_file(file_path):
-    doc = Document(file_path)
-    text_paragraphs = [para for para in doc.paragraphs if para.text.strip()]
-    return text_paragraphs
-
-def translate_table(input_file_path, output_file_path):
-    # Load the input document
-    doc = Document(input_file_path)
-    
-    # Loop through every table in the document
-    for table in doc.tables:
-        # Loop through every row in the table
-        for row in table.rows:
-            # Loop through every cell in the row
-            for cell in row.cells:
-                if cell.text.strip():  # Skip empty or whitespace-only cells
-                    if re.search(r'\w', cell.text):  # Check if cell contains words
-                        source_lang, target_lang, country = "English", "Chinese", "China"
-                        translated_text = ta.translate(
-                            source_lang=source_lang,
-                            target_lang=target_lang,
-                            source_text=cell.text,
-                            country=country,
-                        )
-
-                        translated_contents = translated_text.split('\n')
-                        translated_contents = [text for text in translated_contents if "TRANSLATION" not in text and "TRANSLATE" not in text]
-                        translated_text = '\n'.join(translated_contents)
-
-                    # Directly replace the cell text with the translated text
-                    cell.text = translated_text
-
-    doc.save(output_file_path)
-
-def preserve_format_and_replace_text(file_path, translated_paragraphs, start_paragraph_num, chunk_size):
-    # Open the original document
-    doc = Document(file_path)
-    
-    original_paragraphs = doc.paragraphs
-    translated_index = 0  # Index for the translated paragraphs array
-
-    # Define the end paragraph number for the chunk
-    end_paragraph_num = start_paragraph_num + chunk_size
-
-    for i in range(start_paragraph_num, min(end_paragraph_num, len(original_paragraphs))):
-        original_paragraph = original_paragraphs[i]
-
-        # Skip the original paragraph if it's empty
-        if not original_paragraph.text.strip():
-            continue
-
-        # Find the next non-empty translated paragraph
-        while (translated_index < len(translated_paragraphs) and not translated_paragraphs[translated_index].strip()):
-            translated_index += 1
-        
-        # If there are no more translated paragraphs, break the loop
-        if translated_index >= len(translated_paragraphs):
-            break
-        
-        translated_paragraph_text = translated_paragraphs[translated_index]
-
-        # If the original paragraph has no runs, we need to add a dummy run to capture formatting
-        if not original_paragraph.runs:
-            original_paragraph.add_run("")
-
-        # Extract formatting from the first run of the original paragraph
-        first_run_format = original_paragraph.runs[0]
-
-        # Clear the original paragraph's text while keeping the existing runs
-        for run in original_paragraph.runs:
-            run.text = ""
-
-        # Add new translated text into the original paragraph while preserving formatting
-        for run in translated_paragraph_text.split('\n'):
-            new_run = original_paragraph.add_run(run)
-            new_run.bold = first_run_format.bold
-            new_run.italic = first_run_format.italic
-            new_run.underline = first_run_format.underline
-            if first_run_format.font.size:
-                new_run.font.size = first_run_format.font.size
-            if first_run_format.font.name:
-                new_run.font.name = first_run_format.font.name
-
-        # Move to the next translated paragraph
-        translated_index += 1
-
-    # Save the modified document
-    doc.save(file_path)
-
-def process_file(file_path, output_folder):
-    doc = Document(file_path)
+SOURCE_LANG, TARGET_LANG, COUNTRY = "English", "Chinese", "China"
+CHUNK_SIZE = 25     # Number of paragraphs per translation
+JOURNAL_NAME = ".translation_journal.jsonl"     # Kept in the output folder for --resume
+MAX_FILES = 4       # Files translated at the same time
+REPORT_INTERVAL = 10.0      # Seconds between throughput reports
+
+def translate_text(source_text, journal=None):
+    return ta.translate(
+        source_lang=SOURCE_LANG,
+        target_lang=TARGET_LANG,
+        source_text=source_text,
+        country=COUNTRY,
+        journal=journal,
+    )
+
+def translate_cells(texts, journal=None):
+    return translate_segments(
+        source_lang=SOURCE_LANG,
+        target_lang=TARGET_LANG,
+        segments=texts,
+        country=COUNTRY,
+        journal=journal,
+    )
+
+def translate_table(pipeline, translate_cells_fn=translate_cells):
+    # Translate each distinct cell once, many cells per request, and fan the
+    # translations back out to every cell
+    cells = pipeline.segments("cell")
+    deduplicated = deduplicate([cell.text for cell in cells])
+    print(f"{len(cells)} table cells, {len(deduplicated.unique)} distinct (dedup ratio {deduplicated.ratio:.0%})")
+    translations = deduplicated.expand(translate_cells_fn(deduplicated.unique))
+
+    # Directly replace the cell text with the translated text, by cell id
+    pipeline.replace_all({
+        cell.id: translated_text
+        for cell, translated_text in zip(cells, translations)
+    })
+
+def extract_document(file_path):
+    # Also runs in a worker process: parse the document once and return its
+    # paragraph segments, which of them are distinct, and its distinct cells
+    pipeline = DocumentPipeline(file_path)
+    paragraphs = pipeline.segments("paragraph")
+    deduplicated = deduplicate([paragraph.text for paragraph in paragraphs])
+    return paragraphs, deduplicated, deduplicate(pipeline.cell_texts())
+
+def paragraph_chunks(paragraphs, deduplicated):
+    # The distinct paragraphs in chunks, each sent behind its segment ids
+    unique_paragraphs = [paragraphs[i] for i in deduplicated.first]
+    chunks = [unique_paragraphs[i:i + CHUNK_SIZE] for i in range(0, len(unique_paragraphs), CHUNK_SIZE)]
+    return [
+        ([paragraph.id for paragraph in chunk], join_with_ids([paragraph.id for paragraph in chunk], [paragraph.text for paragraph in chunk]))
+        for chunk in chunks
+    ]
+
+def expand_translations(paragraphs, deduplicated, translated):
+    # The translation of every paragraph by id, from the translations of the
+    # distinct paragraphs; paragraphs without one keep their original text
+    first_ids = [paragraphs[i].id for i in deduplicated.first]
+    missing = len(first_ids) - len(translated)
+    if missing:
+        print(f"{missing} paragraphs kept their original text")
+    return {
+        paragraph.id: translated[first_ids[i]]
+        for paragraph, i in zip(paragraphs, deduplicated.index)
+        if first_ids[i] in translated
+    }
+
+def collect_source_texts(file_path):
+    # Every text process_file would translate, in the same segmentation
+    paragraphs, deduplicated, cells = extract_document(file_path)
+    texts = [source_text for _, source_text in paragraph_chunks(paragraphs, deduplicated)]
+    texts.extend(cells.unique)
+    return texts
+
+def process_file(file_path, output_folder, translate_fn=translate_text, translate_cells_fn=translate_cells, journal=None):
     file_name = os.path.basename(file_path).rsplit('.', 1)[0]
     output_file_path = os.path.join(output_folder, f"{file_name}_translated.docx")
-    doc.save(output_file_path)
-    
+
+    # Files a resumed journal records as finished are not translated again
+    key = file_key(file_path, SOURCE_LANG, TARGET_LANG, COUNTRY, CHUNK_SIZE) if journal is not None else None
+    if key is not None and journal.finished_file(key) == output_file_path and os.path.isfile(output_file_path):
+        print(f"Already translated: {output_file_path}")
+        return
+
     try:
-        paragraphs = read_word_file(file_path)  # Function should be defined elsewhere
-        total_paragraphs = len(paragraphs)
-        chunk_size = 25     # Number of paragraphs per translation
-
-        for i in range(0, total_paragraphs, chunk_size):
-            translated_paragraphs = []
-            chunk = [para.text for para in paragraphs[i:min(i + chunk_size, total_paragraphs)]]
-            source_text = "\n".join(chunk)
-            print(f"Processing paragraphs {i} to {i + chunk_size}...")
-
-            source_lang, target_lang, country = "English", "Chinese", "China"
-            translation = ta.translate(
-                source_lang=source_lang,
-                target_lang=target_lang,
-                source_text=source_text,
-                country=country
-            )
-            # Add the translated text to the list and filter out unwanted strings
-            translated_paragraphs.extend(
-                para for para in translation.split("\n") if "TRANSLATION" not in para and "TRANSLATE" not in para
-            )
-
-            # Replace the original text with translated text from line i to i+chunk_size
-            preserve_format_and_replace_text(output_file_path, translated_paragraphs, i, chunk_size)  # Function should be defined elsewhere
+        # Parse the document once; every edit is made in memory and the
+        # translated document is saved once at the end
+        pipeline = DocumentPipeline(file_path, output_file_path)
+        paragraphs = pipeline.segments("paragraph")
+
+        # Translate each distinct paragraph once; repeats get the same translation
+        deduplicated = deduplicate([paragraph.text for paragraph in paragraphs])
+        print(f"{len(paragraphs)} paragraphs, {len(deduplicated.unique)} distinct (dedup ratio {deduplicated.ratio:.0%})")
+
+        translated = {}
+        for n, (ids, source_text) in enumerate(paragraph_chunks(paragraphs, deduplicated)):
+            print(f"Processing paragraphs {n * CHUNK_SIZE} to {(n + 1) * CHUNK_SIZE}...")
+            translated.update(split_by_ids(translate_fn(source_text), ids))
+
+        # Replace the text of every paragraph with its translation, by id
+        pipeline.replace_all(expand_translations(paragraphs, deduplicated, translated))
 
         # Translate tables in the document
-        translate_table(output_file_path, output_file_path)  # Function should be defined elsewhere
+        translate_table(pipeline, translate_cells_fn)
+        pipeline.save()
 
+        if key is not None:
+            journal.record_file(key, output_file_path)
         print(f"The translated document has been saved as: {output_file_path}")
 
     except Exception as e:
         print(f"An error occurred while processing {file_path}: {e}")
 
+def write_document(file_path, output_file_path, paragraph_translations, cell_translations):
+    # Runs in a worker process: write the translated paragraphs, by id, and cells
+    pipeline = DocumentPipeline(file_path, output_file_path)
+    pipeline.replace_all(paragraph_translations)
+    translate_table(pipeline, lambda texts: [cell_translations[text] for text in texts])
+    pipeline.save()
+
+async def translate_file_async(file_path, output_folder, pool, journal=None):
+    loop = asyncio.get_running_loop()
+    file_name = os.path.basename(file_path).rsplit('.', 1)[0]
+    output_file_path = os.path.join(output_folder, f"{file_name}_translated.docx")
+
+    key = file_key(file_path, SOURCE_LANG, TARGET_LANG, COUNTRY, CHUNK_SIZE) if journal is not None else None
+    if key is not None and journal.finished_file(key) == output_file_path and os.path.isfile(output_file_path):
+        print(f"Already translated: {output_file_path}")
+        return
+
+    # Parsing and writing are CPU-bound and run in the process pool; the
+    # LLM calls of every file share this event loop and the rate limiter
+    paragraphs, deduplicated, cells = await loop.run_in_executor(pool, extract_document, file_path)
+    chunks = paragraph_chunks(paragraphs, deduplicated)
+    translations, cell_translations = await asyncio.gather(
+        asyncio.gather(*(
+            ta.translate_async(SOURCE_LANG, TARGET_LANG, source_text, COUNTRY, journal=journal)
+            for _, source_text in chunks
+        )),
+        translate_segments_async(SOURCE_LANG, TARGET_LANG, cells.unique, COUNTRY, journal=journal),
+    )
+    translated = {}
+    for (ids, _), translation in zip(chunks, translations):
+        translated.update(split_by_ids(translation, ids))
+    await loop.run_in_executor(
+        pool,
+        write_document,
+        file_path,
+        output_file_path,
+        expand_translations(paragraphs, deduplicated, translated),
+        dict(zip(cells.unique, cell_translations)),
+    )
+
+    if key is not None:
+        await asyncio.to_thread(journal.record_file, key, output_file_path)
+    print(f"The translated document has been saved as: {output_file_path}")
+
+def throughput_report(done, failed, total, metrics, started):
+    elapsed = max(time.monotonic() - started, 1e-9)
+    tokens = sum(stage["prompt_tokens"] + stage["completion_tokens"] for stage in metrics.summary().values())
+    return (
+        f"{done}/{total} files, {failed} failed, "
+        f"{done / elapsed * 60:.1f} files/min, {tokens / elapsed:.0f} tokens/s"
+    )
+
+async def process_folder_async(file_paths, output_folder, max_files=MAX_FILES, workers=None, journal=None, report_interval=REPORT_INTERVAL):
+    # Translate up to max_files files at a time. Returns the files that
+    # failed, with their errors; a failure never stops the other files.
+    metrics = MetricsCollector()
+    started = time.monotonic()
+    files = asyncio.Semaphore(max_files)
+    failures = {}
+    done = 0
+
+    async def run(file_path):
+        nonlocal done
+        async with files:
+            try:
+                await translate_file_async(file_path, output_folder, pool, journal)
+            except Exception as e:
+                failures[file_path] = e
+                print(f"An error occurred while processing {file_path}: {e}")
+            else:
+                done += 1
+
+    async def report():
+        while True:
+            await asyncio.sleep(report_interval)
+            print(throughput_report(done, len(failures), len(file_paths), metrics, started))
+
+    with ProcessPoolExecutor(max_workers=workers) as pool, instrument(metrics):
+        reporter = asyncio.ensure_future(report())
+        try:
+            await asyncio.gather(*(run(file_path) for file_path in file_paths))
+        finally:
+            reporter.cancel()
+    print(throughput_report(done, len(failures), len(file_paths), metrics, started))
+    return failures
+
+def process_folder_batch(file_paths, output_folder, poll_interval=60.0):
+    # Translate every document with three OpenAI Batch API round trips, then
+    # write the outputs through the same path as interactive mode.
+    texts_per_file = [collect_source_texts(file_path) for file_path in file_paths]
+    unique_texts = list(dict.fromkeys(text for texts in texts_per_file for text in texts))
+    print(f"Submitting {len(unique_texts)} texts from {len(file_paths)} files as batches...")
+
+    translations = BatchTranslator(poll_interval=poll_interval).translate(
+        [BatchItem(SOURCE_LANG, TARGET_LANG, text, COUNTRY) for text in unique_texts]
+    )
+    translated = dict(zip(unique_texts, translations))
+
+    for file_path in file_paths:
+        process_file(
+            file_path,
+            output_folder,
+            translate_fn=translated.__getitem__,
+            translate_cells_fn=lambda texts: [translated[text] for text in texts],
+        )
+
+def plan_folder(file_paths, batch=False, max_concurrency=ta.MAX_CONCURRENCY, tpm=None, max_files=MAX_FILES):
+    # Estimate calls, tokens and time of translating the folder, without any LLM call
+    if batch:
+        # Batch mode translates every distinct text, cells included, once
+        texts = list(dict.fromkeys(text for file_path in file_paths for text in collect_source_texts(file_path)))
+        files = []
+    else:
+        # max_files files at a time, each with its paragraphs going through
+        # translate() and its cells through packs, all at once
+        texts, files = [], []
+        for file_path in file_paths:
+            paragraphs, deduplicated, cells = extract_document(file_path)
+            files.append(FileTexts(
+                [source_text for _, source_text in paragraph_chunks(paragraphs, deduplicated)],
+                [cells.unique],
+            ))
+    # The rate limits that apply are those of the model routed to draft
+    model = get_model_routing().model("initial")
+    limits = None
+    if tpm is not None:
+        rate_limiter = get_rate_limiter()
+        default_limits = rate_limiter.limits.get(model, rate_limiter.default_limits)
+        limits = ModelLimits(rpm=default_limits.rpm, tpm=tpm)
+    result = plan(
+        texts,
+        SOURCE_LANG,
+        TARGET_LANG,
+        COUNTRY,
+        max_concurrency=max_concurrency,
+        model=model,
+        limits=limits,
+        files=files,
+        max_files=max_files,
+    )
+    print(f"{len(file_paths)} files")
+    print(result.report())
+    if batch:
+        print("Batch API runs finish within 24 hours regardless of the estimate.")
+    return result
+
 if __name__ == "__main__":
-    input_folder_path = input("Enter the input folder path: ")
-    output_folder_path = input("Enter the output folder path: ")
+    parser = argparse.ArgumentParser(description="Translate every .docx file in a folder.")
+    parser.add_argument("input_folder", nargs="?", help="folder with the .docx files to translate")
+    parser.add_argument("output_folder", nargs="?", help="folder for the translated files")
+    parser.add_argument(
+        "--batch",
+        action="store_true",
+        help="use the OpenAI Batch API: cheaper and not rate limited, but may take up to 24 hours",
+    )
+    parser.add_argument("--poll-interval", type=float, default=60.0, help="seconds between batch status checks")
+    parser.add_argument(
+        "--plan",
+        action="store_true",
+        help="only estimate LLM calls, tokens and wall time; nothing is translated",
+    )
+    parser.add_argument(
+        "--max-concurrency", type=int, default=ta.MAX_CONCURRENCY, help="LLM calls in flight assumed by --plan"
+    )
+    parser.add_argument("--tpm", type=int, default=None, help="tokens-per-minute limit assumed by --plan")
+    parser.add_argument("--max-files", type=int, default=MAX_FILES, help="files translated at the same time")
+    parser.add_argument("--workers", type=int, default=None, help="processes parsing and writing documents")
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="skip the files and replay the LLM replies an interrupted run recorded in its journal",
+    )
+    args = parser.parse_args()
+
+    input_folder_path = args.input_folder or input("Enter the input folder path: ")
+    output_folder_path = args.output_folder or (None if args.plan else input("Enter the output folder path: "))
 
     if not os.path.isdir(input_folder_path):
         print("The specified input folder does not exist.")
         sys.exit(1)
 
-    if not os.path.isdir(output_folder_path):
+    if not args.plan and not os.path.isdir(output_folder_path):
         print("The specified output folder does not exist.")
         sys.exit(1)
 
     try:
-        for filename in os.listdir(input_folder_path):
-            if filename.endswith(".docx"):
-                file_path = os.path.join(input_folder_path, filename)
-                process_file(file_path, output_folder_path)
+        file_paths = [
+            os.path.join(input_folder_path, filename)
+            for filename in os.listdir(input_folder_path)
+            if filename.endswith(".docx")
+        ]
+        if args.plan:
+            plan_folder(file_paths, args.batch, args.max_concurrency, args.tpm, args.max_files)
+            sys.exit(0)
+        if args.batch:
+            process_folder_batch(file_paths, output_folder_path, args.poll_interval)
+        else:
+            # Every reply and finished file is journaled, so an interrupted
+            # run can be picked up again with --resume
+            journal = Journal(os.path.join(output_folder_path, JOURNAL_NAME), resume=args.resume)
+            failures = asyncio.run(process_folder_async(
+                file_paths,
+                output_folder_path,
+                max_files=args.max_files,
+                workers=args.workers,
+                journal=journal,
+            ))
+            if journal.replayed:
+                print(f"Replayed {journal.replayed} LLM replies from the journal")
+            if failures:
+                print(f"{len(failures)} files failed: {', '.join(sorted(failures))}")
+                sys.exit(1)
         print("All files processed successfully.")
+        # Report the texts passed through unchanged, without LLM calls
+        print(f"Passed through without translation: {prefilter_stats.counts()}")
     except Exception as e:
-        print(f"An error occurred: {e}")
\ No newline at end of file
+        print(f"An error occurred: {e}")